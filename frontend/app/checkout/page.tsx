@@ -9,6 +9,7 @@ import {
 } from "@stripe/react-stripe-js";
 import { useAuth } from "react-oidc-context";
 import { useRouter } from "next/navigation";
+import { logInteraction } from "../utils/interactions";
 
 const stripePromise = loadStripe(process.env.NEXT_PUBLIC_STRIPE_PUBLISHABLE_KEY!);
 const API_BASE = process.env.NEXT_PUBLIC_API_BASE_URL!;
@@ -132,7 +133,7 @@ function CheckoutForm() {
       } 
       // Fallback: Fetch restaurant location if not available in cart
       else if (cart.restaurantId) {
-        fetch(`${API_BASE}/users/${cart.restaurantId}`)
+        fetch(`${API_BASE}/users/${cart.restaurantId}?fields=location_coordinates`)
           .then(res => res.json())
           .then(data => {
             if (data.location_coordinates) {
@@ -229,11 +230,7 @@ function CheckoutForm() {
           })
         };
 
-        await fetch(`${API_BASE}/interactions`, {
-          method: "POST",
-          headers: { "Content-Type": "application/json" },
-          body: JSON.stringify(interactionPayload)
-        });
+        await logInteraction(interactionPayload, { immediate: true });
       }
     }
     } catch (error) {
@@ -23,7 +23,7 @@ export default function Navbar() {
             setUserDetails(JSON.parse(storedUser));
           } else {
             // Fetch user details from API
-            const response = await fetch(`${process.env.NEXT_PUBLIC_API_BASE_URL}/users/${userId}`);
+            const response = await fetch(`${process.env.NEXT_PUBLIC_API_BASE_URL}/users/${userId}?fields=userId,name,email`);
             
             if (response.ok) {
               const userData = await response.json();
@@ -90,7 +90,8 @@ export default function OrderUpdatesPage() {
         
         heartbeatIntervalRef.current = setInterval(() => {
           if (socket.readyState === WebSocket.OPEN) {
-            console.log("Connection still open");
+            // Refreshes the connection's expiry so the server doesn't sweep it
+            socket.send(JSON.stringify({ action: "heartbeat" }));
           }
         }, HEARTBEAT_INTERVAL);
       };
@@ -108,21 +109,29 @@ export default function OrderUpdatesPage() {
             return;
           }
           
-          if (isValidOrderMessage(msg)) {
+          // Busy periods arrive as one frame carrying several orders
+          const incoming = msg.type === "orders_batch" && Array.isArray(msg.orders)
+            ? msg.orders.filter(isValidOrderMessage)
+            : isValidOrderMessage(msg) ? [msg] : [];
+
+          if (incoming.length > 0) {
             // Set all new orders to PENDING_CONFIRMATION status
-            const newOrder = {
-              ...msg,
+            const receivedAt = new Date().toLocaleTimeString();
+            const newOrders = incoming.map((order: OrderMessage) => ({
+              ...order,
               status: ORDER_STATUS.PENDING_CONFIRMATION,
-              timestamp: new Date().toLocaleTimeString()
-            };
+              timestamp: receivedAt
+            }));
             
             // Check if order already exists to avoid duplicates
             setOrders(prev => {
-              const orderExists = prev.some(order => order.orderId === newOrder.orderId);
-              if (orderExists) {
+              const fresh = newOrders.filter(
+                (newOrder: OrderMessage) => !prev.some(order => order.orderId === newOrder.orderId)
+              );
+              if (fresh.length === 0) {
                 return prev;
               }
-              return [newOrder, ...prev];
+              return [...fresh.reverse(), ...prev];
             });
           } else {
             console.log("Received non-order message:", msg);
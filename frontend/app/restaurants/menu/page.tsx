@@ -3,6 +3,7 @@ import React, { useState, useEffect, Suspense } from 'react';
 import { useSearchParams, useRouter } from 'next/navigation';
 import Image from 'next/image';
 import { useAuth } from 'react-oidc-context';
+import { logInteraction } from '../../utils/interactions';
 
 // Define types for menu items and cart
 interface MenuItem {
@@ -194,14 +195,10 @@ function MenuContent() {
 
       // Log "CLICK" when menu is viewed
       if (auth.user?.profile?.sub && restaurantId) {
-        await fetch(`${API_BASE_URL}/interactions`, {
-          method: "POST",
-          headers: { "Content-Type": "application/json" },
-          body: JSON.stringify({
-            userId: auth.user.profile.sub,
-            itemId: restaurantId,
-            eventType: "CLICK"
-          })
+        logInteraction({
+          userId: auth.user.profile.sub,
+          itemId: restaurantId,
+          eventType: "CLICK"
         });
       }
     }
@@ -295,14 +292,10 @@ function MenuContent() {
   );
   
   if (auth.user?.profile?.sub) {
-    fetch(`${API_BASE_URL}/interactions`, {
-      method: "POST",
-      headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({
-        userId: auth.user.profile.sub,
-        itemId: restaurantId,
-        eventType: "ADD_TO_CART"
-      })
+    logInteraction({
+      userId: auth.user.profile.sub,
+      itemId: restaurantId,
+      eventType: "ADD_TO_CART"
     });
   }
 
@@ -5,6 +5,7 @@ import Image from 'next/image';
 import Link from 'next/link';
 import "../globals.css";
 import { useAuth } from 'react-oidc-context';
+import { logInteraction } from '../utils/interactions';
 
 // Define types for restaurant data
 interface Restaurant {
@@ -93,6 +94,20 @@ function AddressModal({
   );
 }
 
+const toRestaurant = (data: ApiRestaurant): Restaurant => ({
+  userId: data.userId,
+  name: data.name || 'Unknown Restaurant',
+  image: data.menu && data.menu.length > 0 ? data.menu[0].image_url : '/sample-image-1.jpg',
+  cuisine: data.menu && data.menu.length > 0 ? data.menu[0].category : 'Various',
+  rating: data.rating || 0.0,
+  time: '30-45 min',
+  email: data.email,
+  address: data.address,
+  createdAt: data.createdAt
+});
+
+const RESTAURANT_CARD_FIELDS = 'userId,name,rating,email,address,createdAt,menu';
+
 // Service for API calls
 const restaurantService = {
   async getRestaurantById(restaurantId: string): Promise<Restaurant | null> {
@@ -100,23 +115,30 @@ const restaurantService = {
       const response = await fetch(`${API_BASE_URL}/users/${restaurantId}`);
       if (!response.ok) throw new Error(`Error fetching restaurant: ${response.statusText}`);
       const data: ApiRestaurant = await response.json();
-      return {
-        userId: data.userId,
-        name: data.name || 'Unknown Restaurant',
-        image: data.menu && data.menu.length > 0 ? data.menu[0].image_url : '/sample-image-1.jpg',
-        cuisine: data.menu && data.menu.length > 0 ? data.menu[0].category : 'Various',
-        rating: data.rating || 0.0,
-        time: '30-45 min',
-        email: data.email,
-        address: data.address,
-        createdAt: data.createdAt
-      };
+      return toRestaurant(data);
     } catch (error) {
       console.error(`Failed to fetch restaurant with ID ${restaurantId}:`, error);
       return null;
     }
   },
 
+  // One batch request instead of one per id; ids that don't exist are skipped
+  async getRestaurantsByIds(restaurantIds: string[]): Promise<Restaurant[]> {
+    if (restaurantIds.length === 0) return [];
+    try {
+      const ids = restaurantIds.map(encodeURIComponent).join(',');
+      const response = await fetch(`${API_BASE_URL}/users?ids=${ids}&fields=${RESTAURANT_CARD_FIELDS}`);
+      if (!response.ok) throw new Error(`Error fetching restaurants: ${response.statusText}`);
+      const data: { ids: string[]; items: (ApiRestaurant | null)[] } = await response.json();
+      return data.items
+        .map((item, i) => (item ? toRestaurant({ ...item, userId: data.ids[i] }) : null))
+        .filter(r => r !== null) as Restaurant[];
+    } catch (error) {
+      console.error('Failed to fetch restaurants:', error);
+      return [];
+    }
+  },
+
   async searchRestaurants(query: string, location: { lat: number; lng: number } | null): Promise<Restaurant[]> {
     try {
       const lat = location?.lat ?? 40.7057;  // fallback if location is null
@@ -139,17 +161,28 @@ const restaurantService = {
       return [];
     }
   },
+  async suggest(prefix: string, location: { lat: number; lng: number } | null): Promise<string[]> {
+    try {
+      const lat = location?.lat ?? 40.7057;
+      const lon = location?.lng ?? -74.0124;
+      const response = await fetch(`${API_BASE_URL}/users/search/suggest?lat=${lat}&lon=${lon}&q=${encodeURIComponent(prefix)}`);
+      if (!response.ok) return [];
+      const data: { suggestions: { text: string }[] } = await response.json();
+      return data.suggestions.map((s) => s.text);
+    } catch (err) {
+      console.error('Suggest error:', err);
+      return [];
+    }
+  },
   async getTopPicks(userId: string): Promise<Restaurant[]> {
     try {
-      const response = await fetch(`${API_BASE_URL}/users/recommendations?userId=${userId}`);
+      // hydrate=true returns the cards with the ids, so no follow-up lookup is needed
+      const response = await fetch(`${API_BASE_URL}/users/recommendations?userId=${userId}&hydrate=true`);
       if (!response.ok) throw new Error("Failed to fetch recommendations");
-      const { recommendedRestaurantIds } = await response.json();
+      const { recommendedRestaurantIds, restaurants } = await response.json();
 
-      const results = await Promise.all(
-        recommendedRestaurantIds.map((id: string) => restaurantService.getRestaurantById(id))
-      );
-
-      return results.filter(r => r !== null) as Restaurant[];
+      if (restaurants) return (restaurants as ApiRestaurant[]).map(toRestaurant);
+      return await restaurantService.getRestaurantsByIds(recommendedRestaurantIds);
     } catch (err) {
       console.error("Top picks fetch failed:", err);
       return [];
@@ -237,16 +270,12 @@ function RestaurantCard({ restaurant, userId }: { restaurant: Restaurant; userId
         </div>
         <Link
             href={`/restaurants/menu?id=${restaurant.userId}`}
-            onClick={async () => {
+            onClick={() => {
               if (userId) {
-                await fetch(`${API_BASE_URL}/interactions`, {
-                  method: "POST",
-                  headers: { "Content-Type": "application/json" },
-                  body: JSON.stringify({
-                    userId,
-                    itemId: restaurant.userId,
-                    eventType: "CLICK"
-                  })
+                logInteraction({
+                  userId,
+                  itemId: restaurant.userId,
+                  eventType: "CLICK"
                 });
               }
             }}
@@ -275,6 +304,7 @@ export default function Restaurants() {
   const [locationStatus, setLocationStatus] = useState<'none' | 'detected' | 'manual'>('none');
 
   const [searchQuery, setSearchQuery] = useState('');
+  const [suggestions, setSuggestions] = useState<string[]>([]);
   const [newArrivals, setNewArrivals] = useState<Restaurant[]>([]);
 
   // New state to track if search results are being displayed
@@ -409,9 +439,7 @@ export default function Restaurants() {
     setIsLoading(true);
     setIsDisplayingSearchResults(false); // Reset to default view
     try {
-      const fetchPromises = restaurantIds.map(id => restaurantService.getRestaurantById(id));
-      const results = await Promise.all(fetchPromises);
-      const fetchedRestaurants = results.filter(r => r !== null) as Restaurant[];
+      const fetchedRestaurants = await restaurantService.getRestaurantsByIds(restaurantIds);
       const sortedByRating = [...fetchedRestaurants]
         .filter(r => r.rating !== undefined && r.rating !== null)
         .sort((a, b) => b.rating! - a.rating!);
@@ -450,6 +478,23 @@ export default function Restaurants() {
     fetchTopPicks();
   }, [auth.isAuthenticated, auth.user]);
 
+  // Typeahead: debounced so only a pause in typing hits the suggest endpoint
+  useEffect(() => {
+    if (searchQuery.trim().length < 2) {
+      setSuggestions([]);
+      return;
+    }
+    let cancelled = false;
+    const timer = setTimeout(async () => {
+      const texts = await restaurantService.suggest(searchQuery, location);
+      if (!cancelled) setSuggestions(texts);
+    }, 150);
+    return () => {
+      cancelled = true;
+      clearTimeout(timer);
+    };
+  }, [searchQuery, location]);
+
   // Renamed the form submit handler to avoid conflicts if any, and to be more specific
   const handleSearchSubmit = async (event?: React.FormEvent<HTMLFormElement>, searchLocation = location) => {
     if (event) event.preventDefault(); // Prevent default form submission if event is passed
@@ -526,8 +571,14 @@ export default function Restaurants() {
                 }
             }}
             placeholder="Search for restaurants..."
+            list="search-suggestions"
             className="w-full px-5 py-3 border-2 border-orange-200 rounded-xl shadow focus:outline-none focus:border-orange-500 text-lg"
           />
+          <datalist id="search-suggestions">
+            {suggestions.map((text) => (
+              <option key={text} value={text} />
+            ))}
+          </datalist>
         </form>
       </div>
 
@@ -1,7 +1,7 @@
 "use client";
 import React, { useState, useCallback, useEffect, useRef } from "react";
 import { GoogleMap, Marker, DirectionsRenderer } from "@react-google-maps/api";
-import { convertToGoogleLatLng, extractRouteCoordinates } from "../../utils/mapHelpers";
+import { convertToGoogleLatLng, extractRouteCoordinates, decodeLocationBatch } from "../../utils/mapHelpers";
 import { useAuth } from "react-oidc-context"; // Add this import at the top with other imports
 
 interface DeliveryRouteMapProps {
@@ -24,6 +24,8 @@ const DeliveryRouteMap: React.FC<DeliveryRouteMapProps> = ({
   // Add estimated delivery time state
   const [estimatedDeliveryTime, setEstimatedDeliveryTime] = useState<string>('Calculating...');
   const [remainingDistance, setRemainingDistance] = useState<string>('');
+  // ETA pushed by the server with live location updates, preferred over the route-progress estimate
+  const [serverEtaSeconds, setServerEtaSeconds] = useState<number | null>(null);
   
   // Use ref to store delivery partner location to avoid unnecessary re-renders
   const [deliveryPartnerLocation, setDeliveryPartnerLocation] = useState({
@@ -33,6 +35,7 @@ const DeliveryRouteMap: React.FC<DeliveryRouteMapProps> = ({
   
   // Add WebSocket connection reference
   const websocketRef = useRef<WebSocket | null>(null);
+  const heartbeatRef = useRef<NodeJS.Timeout | null>(null);
   const [isLiveTracking, setIsLiveTracking] = useState<boolean>(false);
   const [lastUpdateTime, setLastUpdateTime] = useState<string>('');
   
@@ -186,12 +189,22 @@ const DeliveryRouteMap: React.FC<DeliveryRouteMapProps> = ({
       return;
     }
 
-    // Create a new WebSocket connection with customerId parameter
-    const socket = new WebSocket(`wss://5g5tej9zt6.execute-api.us-east-1.amazonaws.com/production?customerId=${userId}`);
+    // Create a new WebSocket connection with customerId parameter, opting into compact location frames
+    const socket = new WebSocket(`wss://5g5tej9zt6.execute-api.us-east-1.amazonaws.com/production?customerId=${userId}&format=compact`);
     
     socket.onopen = () => {
       console.log('WebSocket connection established');
       setIsLiveTracking(true);
+
+      // Keep the server-side connection record from expiring
+      if (heartbeatRef.current) {
+        clearInterval(heartbeatRef.current);
+      }
+      heartbeatRef.current = setInterval(() => {
+        if (socket.readyState === WebSocket.OPEN) {
+          socket.send(JSON.stringify({ action: 'heartbeat' }));
+        }
+      }, 30000);
       
       // Stop simulation if it's running
       if (simulationRef.current) {
@@ -203,7 +216,19 @@ const DeliveryRouteMap: React.FC<DeliveryRouteMapProps> = ({
     
     socket.onmessage = (event) => {
       try {
-        const data = JSON.parse(event.data);
+        let data = JSON.parse(event.data);
+
+        // Compact frames batch several points; only the latest one moves the marker
+        if (data.type === 'location_batch') {
+          const points = decodeLocationBatch(data);
+          data = points.length
+            ? { type: 'location_update', ...points[points.length - 1], eta_seconds: data.eta_seconds }
+            : {};
+        }
+
+        if (typeof data.eta_seconds === 'number') {
+          setServerEtaSeconds(data.eta_seconds);
+        }
         
         // Check if it's a location update
         if (data.type === 'location_update' && data.lat && data.lng) {
@@ -256,6 +281,10 @@ const DeliveryRouteMap: React.FC<DeliveryRouteMapProps> = ({
     socket.onclose = () => {
       console.log('WebSocket connection closed');
       setIsLiveTracking(false);
+      if (heartbeatRef.current) {
+        clearInterval(heartbeatRef.current);
+        heartbeatRef.current = null;
+      }
     };
     
     websocketRef.current = socket;
@@ -468,7 +497,9 @@ const DeliveryRouteMap: React.FC<DeliveryRouteMapProps> = ({
       const progress = currentPositionIndex / routeCoordinates.length;
       
       // Estimate remaining time (in seconds)
-      const remainingTime = totalDuration * (1 - progress);
+      const remainingTime = isLiveTracking && serverEtaSeconds !== null
+        ? serverEtaSeconds
+        : totalDuration * (1 - progress);
       
       // Estimate remaining distance (in meters)
       const remainingDistanceValue = totalDistance * (1 - progress);
@@ -500,7 +531,7 @@ const DeliveryRouteMap: React.FC<DeliveryRouteMapProps> = ({
       console.error("Error calculating estimated delivery time:", error);
       setEstimatedDeliveryTime("Estimation failed");
     }
-  }, [directions, currentPositionIndex, routeCoordinates.length]);
+  }, [directions, currentPositionIndex, routeCoordinates.length, isLiveTracking, serverEtaSeconds]);
 
   // Update estimated time whenever position changes
   useEffect(() => {
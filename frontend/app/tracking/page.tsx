@@ -57,7 +57,7 @@ function OrderTracker() {
 
   const fetchRestaurantDetails = async (restaurantId: string) => {
     try {
-      const response = await fetch(`${API_BASE}/users/${restaurantId}`);
+      const response = await fetch(`${API_BASE}/users/${restaurantId}?fields=name,location,location_coordinates`);
       
       if (!response.ok) {
         throw new Error(`Error fetching restaurant: ${response.statusText}`);
@@ -0,0 +1,45 @@
+// Batches Personalize interaction events into POST /interactions requests
+const API_BASE_URL = process.env.NEXT_PUBLIC_API_BASE_URL;
+
+const FLUSH_DELAY_MS = 2000;
+const MAX_BATCH = 20;
+
+type Interaction = {
+  userId: string;
+  itemId: string;
+  eventType: string;
+  properties?: string;
+};
+
+let pending: (Interaction & { eventId: string; sentAt: number })[] = [];
+let timer: ReturnType<typeof setTimeout> | null = null;
+
+export const flushInteractions = (): Promise<void> => {
+  if (timer) {
+    clearTimeout(timer);
+    timer = null;
+  }
+  if (pending.length === 0) return Promise.resolve();
+  const events = pending;
+  pending = [];
+  // keepalive lets the request finish when the page is being left
+  return fetch(`${API_BASE_URL}/interactions`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify({ events }),
+    keepalive: true
+  })
+    .then(() => undefined)
+    .catch(error => console.error("Failed to log interactions:", error));
+};
+
+export const logInteraction = (interaction: Interaction, { immediate = false } = {}): Promise<void> => {
+  pending.push({ ...interaction, eventId: crypto.randomUUID(), sentAt: Date.now() });
+  if (immediate || pending.length >= MAX_BATCH) return flushInteractions();
+  if (!timer) timer = setTimeout(flushInteractions, FLUSH_DELAY_MS);
+  return Promise.resolve();
+};
+
+if (typeof window !== "undefined") {
+  window.addEventListener("pagehide", () => { flushInteractions(); });
+}
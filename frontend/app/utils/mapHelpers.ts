@@ -85,4 +85,41 @@ export const extractRouteCoordinates = (
   }
   
   return points;
-};
\ No newline at end of file
+};
+
+// A point from a compact ("location_batch") WebSocket frame
+export interface TimedLatLng extends LatLngLiteral {
+  timestamp: number;
+}
+
+// Decode a compact location frame: polyline-style zigzag/varint deltas of
+// (lat, lng, ms) triples, fixed-point at `e` decimal places, relative to t0.
+export const decodeLocationBatch = (frame: { t0: number; p: string; e?: number }): TimedLatLng[] => {
+  const factor = Math.pow(10, frame.e ?? 5);
+  const values: number[] = [];
+  let index = 0;
+
+  while (index < frame.p.length) {
+    let result = 0;
+    let shift = 0;
+    let byte: number;
+    do {
+      byte = frame.p.charCodeAt(index++) - 63;
+      result += (byte & 0x1f) * Math.pow(2, shift);
+      shift += 5;
+    } while (byte >= 0x20);
+    values.push(result % 2 ? -(result + 1) / 2 : result / 2);
+  }
+
+  const points: TimedLatLng[] = [];
+  let lat = 0;
+  let lng = 0;
+  let timestamp = frame.t0;
+  for (let i = 0; i + 2 < values.length; i += 3) {
+    lat += values[i];
+    lng += values[i + 1];
+    timestamp += values[i + 2];
+    points.push({ lat: lat / factor, lng: lng / factor, timestamp });
+  }
+  return points;
+};
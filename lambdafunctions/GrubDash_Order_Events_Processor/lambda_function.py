@@ -13,6 +13,8 @@ ORDERS_TABLE = os.environ["ORDERS_TABLE"]
 orders_table = dynamodb.Table(ORDERS_TABLE)
 ORDER_BATCHING_QUEUE = os.environ["ORDER_BATCHING_QUEUE_URL"]
 DELIVERY_EVENTS_QUEUE = os.environ["DELIVERY_EVENTS_QUEUE_URL"]
+# When set, restaurant notifications go through SQS so the notifier can batch them
+NOTIFICATIONS_QUEUE = os.environ.get("NOTIFICATIONS_QUEUE_URL")
 
 # Convert floats to Decimal for DynamoDB compatibility
 def normalize_decimals(data):
@@ -110,11 +112,17 @@ def handle_payment_state_update(body, now_utc):
                 ]
             }
             print(f"[NOTIFY] order_notifications payload: {notification_payload}")
-            lambda_client.invoke(
-                FunctionName="Grubdash_Orders_notifications",
-                InvocationType="Event",  # async
-                Payload=json.dumps(notification_payload).encode("utf-8")
-            )
+            if NOTIFICATIONS_QUEUE:
+                sqs.send_message(
+                    QueueUrl=NOTIFICATIONS_QUEUE,
+                    MessageBody=json.dumps(notification_payload)
+                )
+            else:
+                lambda_client.invoke(
+                    FunctionName="Grubdash_Orders_notifications",
+                    InvocationType="Event",  # async
+                    Payload=json.dumps(notification_payload).encode("utf-8")
+                )
             print(f"[NOTIFY] order_notifications triggered for {order_id}")
         except Exception as e:
             print(f"[WARN] Failed to notify restaurant for {order_id}: {e}")
@@ -8,6 +8,8 @@ from datetime import datetime, timezone
 from errors import ClientInputError
 from stripe_utils import create_payment_intent
 from stripe_utils import get_or_create_stripe_customer
+from menu_store import MenuStore
+from payment_gateway import PaymentGatewayError
 
 # Environment variables
 QUEUE_URL = os.environ["QUEUE_URL"]
@@ -21,6 +23,9 @@ dynamodb = boto3.resource("dynamodb")
 orders_table = dynamodb.Table(ORDERS_TABLE)
 users_table = dynamodb.Table(USERS_TABLE)
 
+# Menus are per-item records; snapshots are cached per container by menu version
+menus = MenuStore(users_table)
+
 # Util to convert to Decimal
 def normalize_decimals(obj):
     if isinstance(obj, list):
@@ -84,12 +89,19 @@ def lambda_handler(event, context):
 
             save_card = body.get("save_card", False)
 
-            # 0. Fetch restaurant data from Users table
-            restaurant = users_table.get_item(Key={"userId": restaurant_id}).get("Item")
+            # 0. Fetch restaurant data from Users table, only what pricing and routing need
+            restaurant = users_table.get_item(
+                Key={"userId": restaurant_id},
+                ProjectionExpression="userId, location_coordinates, menuVersion, #menu",
+                ExpressionAttributeNames={"#menu": "menu"}
+            ).get("Item")
             if not restaurant:
                 raise ClientInputError(f"Invalid restaurant ID: {restaurant_id}")
 
-            menu = restaurant.get("menu", [])
+            if "menuVersion" in restaurant:
+                menu = menus.snapshot(restaurant_id, version=int(restaurant["menuVersion"]))["items"]
+            else:
+                menu = restaurant.get("menu", [])
             if not menu or not isinstance(menu, list):
                 raise ClientInputError("Restaurant menu is missing or malformed")
 
@@ -177,6 +189,9 @@ def lambda_handler(event, context):
 
         except ClientInputError as e:
             return respond(400, {"error": str(e)})
+        except PaymentGatewayError as e:
+            # Nothing was enqueued, so the client can safely retry a retryable failure
+            return respond(503 if e.retryable else 502, {"error": "Payment provider error", "details": str(e)})
         except Exception as e:
             return respond(500, {"error": "Internal server error", "details": str(e)})
 
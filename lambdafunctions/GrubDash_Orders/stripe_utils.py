@@ -1,24 +1,22 @@
-import stripe
 import os
 import boto3
 from boto3.dynamodb.conditions import Key
+from payment_gateway import get_gateway
 
-stripe.api_key = os.environ["STRIPE_SECRET_KEY"]
 USERS_TABLE = os.environ["USERS_TABLE"]
 dynamodb = boto3.resource("dynamodb")
 users_table = dynamodb.Table(USERS_TABLE)
+# Stripe, or the offline fake with PAYMENT_GATEWAY=fake
+gateway = get_gateway()
 
-# DOC: https://docs.stripe.com/api/payment_intents
 def create_payment_intent(amount_cents, customer_id, order_id, save_card=False):
-    intent = stripe.PaymentIntent.create(
-        amount=amount_cents,
-        currency="usd",
-        customer=customer_id,
-        setup_future_usage="off_session" if save_card else None,
-        automatic_payment_methods={"enabled": True},
-        metadata={"order_id": order_id}
+    intent = gateway.create_payment_intent(
+        amount_cents=amount_cents,
+        customer_id=customer_id,
+        order_id=order_id,
+        save_card=save_card
     )
-    return intent.client_secret
+    return intent["client_secret"]
 
 def get_or_create_stripe_customer(user_id, user_email=None):
     # Step 1: Try to fetch from DynamoDB
@@ -29,17 +27,15 @@ def get_or_create_stripe_customer(user_id, user_email=None):
         return user["stripe_customer_id"]
 
     # Step 2: Create new Stripe customer
-    customer = stripe.Customer.create(
-        metadata={"user_id": user_id},
-        email=user_email or None
-    )
+    customer_id = gateway.create_customer(user_id, user_email)
 
     # Step 3: Update into DynamoDB
     users_table.update_item(
         Key={"userId": user_id},
-        UpdateExpression="SET stripe_customer_id = :scid",
-        ExpressionAttributeValues={":scid": customer.id}
+        # Every write to a user moves its version (see GrubDash_Users update_user)
+        UpdateExpression="SET stripe_customer_id = :scid ADD version :one",
+        ExpressionAttributeValues={":scid": customer_id, ":one": 1}
     )
 
 
-    return customer.id
+    return customer_id
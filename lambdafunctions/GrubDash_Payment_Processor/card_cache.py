@@ -0,0 +1,210 @@
+"""Saved-card cache for GET /payment/users/{user_id}.
+
+Listing a customer's cards used to page through Stripe on every checkout page
+load. Cards are now cached per Stripe customer:
+
+- younger than CARD_CACHE_TTL_SECONDS: served as is.
+- older, but younger than CARD_CACHE_STALE_SECONDS: served as is while a
+  refresh runs in the background (stale-while-revalidate). Only one refresh
+  per customer is scheduled at a time.
+- missing, invalidated or older than that: fetched from Stripe inline.
+
+payment_method.attached/detached/updated webhooks invalidate the customer's
+entry. A refresh that started before the invalidation doesn't write its
+(now outdated) list back.
+
+The entries live in CARD_CACHE_TABLE when it is set, so an invalidation
+reaches every container and the background refresh (another invocation,
+possibly another container) writes where the reader looks. Without the table
+the entries are kept per container, where neither holds: there is no
+stale-while-revalidate, and entries are refetched inline once they are older
+than CARD_CACHE_MEMORY_TTL_SECONDS, which bounds how long a container that
+missed the webhook can offer a removed card.
+"""
+import json
+import os
+import time
+from decimal import Decimal
+
+CARD_CACHE_TABLE = os.environ.get("CARD_CACHE_TABLE")
+CARD_CACHE_TTL_SECONDS = float(os.environ.get("CARD_CACHE_TTL_SECONDS", "300"))
+CARD_CACHE_STALE_SECONDS = float(os.environ.get("CARD_CACHE_STALE_SECONDS", str(7 * 24 * 3600)))
+CARD_CACHE_MEMORY_TTL_SECONDS = float(os.environ.get("CARD_CACHE_MEMORY_TTL_SECONDS", "30"))
+# How long a scheduled refresh holds the claim before another may be scheduled
+REFRESH_CLAIM_SECONDS = 30
+
+INVALIDATING_EVENTS = {"payment_method.attached", "payment_method.detached", "payment_method.updated"}
+
+
+class CardStore:
+    """Interface for the entry store. Times are epoch seconds."""
+
+    def get(self, customer_id):
+        """{"cards": [...], "cached_at": t} or None."""
+        raise NotImplementedError
+
+    def put(self, customer_id, cards, fetched_at):
+        """Stores the list unless the entry was invalidated after `fetched_at`."""
+        raise NotImplementedError
+
+    def invalidate(self, customer_id, now):
+        raise NotImplementedError
+
+    def claim_refresh(self, customer_id, now):
+        """True for the one caller allowed to schedule a refresh right now."""
+        raise NotImplementedError
+
+
+class MemoryCardStore(CardStore):
+    def __init__(self):
+        self.entries = {}  # customer_id -> {"cards", "cached_at", "invalidated_at", "refreshing_until"}
+
+    def get(self, customer_id):
+        entry = self.entries.get(customer_id) or {}
+        if entry.get("cards") is None:
+            return None
+        return {"cards": entry["cards"], "cached_at": entry["cached_at"]}
+
+    def put(self, customer_id, cards, fetched_at):
+        entry = self.entries.setdefault(customer_id, {})
+        if entry.get("invalidated_at", 0) > fetched_at:
+            return False
+        entry.update(cards=cards, cached_at=fetched_at, refreshing_until=0)
+        return True
+
+    def invalidate(self, customer_id, now):
+        entry = self.entries.setdefault(customer_id, {})
+        entry.update(cards=None, invalidated_at=now)
+
+    def claim_refresh(self, customer_id, now):
+        entry = self.entries.setdefault(customer_id, {})
+        if entry.get("refreshing_until", 0) > now:
+            return False
+        entry["refreshing_until"] = now + REFRESH_CLAIM_SECONDS
+        return True
+
+
+class DynamoCardStore(CardStore):
+    """customerId (hash) table with a DynamoDB TTL attribute named expiresAt."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def get(self, customer_id):
+        item = self.table.get_item(Key={"customerId": customer_id}).get("Item")
+        if not item or "cards" not in item:
+            return None
+        return {"cards": json.loads(item["cards"]), "cached_at": float(item["cachedAt"])}
+
+    def put(self, customer_id, cards, fetched_at):
+        conditional = self.table.meta.client.exceptions.ConditionalCheckFailedException
+        try:
+            self.table.update_item(
+                Key={"customerId": customer_id},
+                UpdateExpression="SET cards = :cards, cachedAt = :at, expiresAt = :exp REMOVE refreshingUntil",
+                ConditionExpression="attribute_not_exists(invalidatedAt) OR invalidatedAt <= :at",
+                ExpressionAttributeValues={
+                    # Stored as JSON so the card numbers come back as ints, not Decimals
+                    ":cards": json.dumps(cards),
+                    ":at": _decimal(fetched_at),
+                    ":exp": int(fetched_at + CARD_CACHE_STALE_SECONDS)
+                }
+            )
+            return True
+        except conditional:
+            return False
+
+    def invalidate(self, customer_id, now):
+        self.table.update_item(
+            Key={"customerId": customer_id},
+            UpdateExpression="SET invalidatedAt = :now, expiresAt = :exp REMOVE cards, cachedAt",
+            ExpressionAttributeValues={":now": _decimal(now), ":exp": int(now + CARD_CACHE_STALE_SECONDS)}
+        )
+
+    def claim_refresh(self, customer_id, now):
+        conditional = self.table.meta.client.exceptions.ConditionalCheckFailedException
+        try:
+            self.table.update_item(
+                Key={"customerId": customer_id},
+                UpdateExpression="SET refreshingUntil = :until",
+                ConditionExpression="attribute_not_exists(refreshingUntil) OR refreshingUntil < :now",
+                ExpressionAttributeValues={":until": _decimal(now + REFRESH_CLAIM_SECONDS), ":now": _decimal(now)}
+            )
+            return True
+        except conditional:
+            return False
+
+
+class CardCache:
+    def __init__(self, store, fetch, schedule_refresh, ttl_seconds=CARD_CACHE_TTL_SECONDS,
+                 stale_seconds=CARD_CACHE_STALE_SECONDS, clock=time.time):
+        self.store = store
+        self.fetch = fetch  # customer_id -> [card]
+        # customer_id -> None, runs refresh() out of band; None refreshes inline past the TTL
+        self.schedule_refresh = schedule_refresh
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.clock = clock
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def get(self, customer_id):
+        """Returns (cards, state) with state "fresh", "stale" or "miss"."""
+        now = self.clock()
+        try:
+            entry = self.store.get(customer_id)
+        except Exception as e:
+            print(f"Card cache read failed for {customer_id}: {e}")
+            entry = None
+
+        age = now - entry["cached_at"] if entry else None
+        if entry and age < self.ttl_seconds:
+            self.hits += 1
+            return entry["cards"], "fresh"
+        if entry and age < self.stale_seconds and self.schedule_refresh:
+            self.stale_hits += 1
+            try:
+                if self.store.claim_refresh(customer_id, now):
+                    self.schedule_refresh(customer_id)
+            except Exception as e:
+                # The stale list is still worth serving; the next read tries again
+                print(f"Card cache refresh scheduling failed for {customer_id}: {e}")
+            return entry["cards"], "stale"
+
+        self.misses += 1
+        return self.refresh(customer_id), "miss"
+
+    def refresh(self, customer_id):
+        fetched_at = self.clock()
+        cards = self.fetch(customer_id)
+        try:
+            if not self.store.put(customer_id, cards, fetched_at):
+                print(f"Card cache for {customer_id} invalidated during refresh; not stored")
+        except Exception as e:
+            print(f"Card cache write failed for {customer_id}: {e}")
+        return cards
+
+    def invalidate(self, customer_id):
+        self.store.invalidate(customer_id, self.clock())
+
+    def stats(self):
+        return {"hits": self.hits, "stale_hits": self.stale_hits, "misses": self.misses}
+
+
+def customer_for_event(stripe_event):
+    """Customer an invalidating payment_method event is about; detach clears it, so it's in previous_attributes."""
+    data = stripe_event["data"]
+    return data["object"].get("customer") or (data.get("previous_attributes") or {}).get("customer")
+
+
+def get_card_cache(fetch, schedule_refresh):
+    if CARD_CACHE_TABLE:
+        import boto3
+        return CardCache(DynamoCardStore(boto3.resource("dynamodb").Table(CARD_CACHE_TABLE)), fetch, schedule_refresh)
+    # A scheduled refresh would land in another container's memory
+    return CardCache(MemoryCardStore(), fetch, None, ttl_seconds=CARD_CACHE_MEMORY_TTL_SECONDS)
+
+
+def _decimal(seconds):
+    return Decimal(str(round(seconds, 3)))
@@ -0,0 +1,129 @@
+"""Load test for the checkout loop against a stack running the fake gateway.
+
+Deploy GrubDash_Orders and GrubDash_Payment_Processor with
+PAYMENT_GATEWAY=fake and the same STRIPE_WEBHOOK_SECRET, then:
+
+    python checkout_benchmark.py --api https://.../prod --restaurant <id> --item <item_id> \\
+        --customer <user_id> --orders 200 --concurrency 20
+
+For each order it plays the browser and Stripe: POST /orders, a signed
+payment_intent webhook to /payment/events (what Stripe sends once the card is
+confirmed), then polls GET /orders/{id} until the order leaves
+payment_pending. It reports latency per leg and for the whole
+payment-to-payment_confirmed loop.
+
+--duplicates resends every webhook, the way Stripe retries, to exercise the
+dedup path.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from payment_gateway import FakeGateway
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[max(0, int(math.ceil(pct / 100.0 * len(ordered))) - 1)], 3)
+
+
+def http(method, url, body=None, timeout=30):
+    data = json.dumps(body).encode("utf-8") if body is not None else None
+    request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"}, method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b"null")
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode("utf-8")
+
+
+def run_checkout(args, gateway, succeed):
+    """One order through the loop; returns {"leg": ms} or {"error": ...}."""
+    result = {}
+    started = time.perf_counter()
+    status, body = http("POST", f"{args.api}/orders", {
+        "customer_id": args.customer,
+        "restaurant_id": args.restaurant,
+        "items": [{"id": args.item, "quantity": 1}]
+    })
+    result["create_order_ms"] = (time.perf_counter() - started) * 1000
+    if status != 200:
+        return {"error": f"POST /orders {status}: {str(body)[:200]}"}
+    order_id = body["order_id"]
+    intent_id = body["clientSecret"].split("_secret")[0]
+
+    event = gateway.payment_event(intent_id, order_id, succeeded=succeed)
+    webhook_started = time.perf_counter()
+    for _ in range(2 if args.duplicates else 1):
+        status, text = gateway.emit(event, url=f"{args.api}/payment/events")
+        if status != 200:
+            return {"error": f"POST /payment/events {status}: {text[:200]}"}
+    result["webhook_ack_ms"] = (time.perf_counter() - webhook_started) * 1000
+
+    expected = "payment_confirmed" if succeed else "payment_failed"
+    deadline = time.perf_counter() + args.timeout
+    while time.perf_counter() < deadline:
+        status, order = http("GET", f"{args.api}/orders/{order_id}")
+        current = order.get("status") if status == 200 and isinstance(order, dict) else None
+        if current and current != "payment_pending":
+            if current != expected and succeed:
+                return {"error": f"Order {order_id} moved to {current}, expected {expected}"}
+            result["webhook_to_status_ms"] = (time.perf_counter() - webhook_started) * 1000
+            result["checkout_total_ms"] = (time.perf_counter() - started) * 1000
+            return result
+        time.sleep(args.poll_interval)
+    return {"error": f"Order {order_id} still not {expected} after {args.timeout}s"}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Checkout loop load test against the fake payment gateway")
+    parser.add_argument("--api", required=True, help="API Gateway base URL")
+    parser.add_argument("--restaurant", required=True)
+    parser.add_argument("--item", required=True, help="menu item id to order")
+    parser.add_argument("--customer", required=True, help="userId placing the orders")
+    parser.add_argument("--orders", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="share of payments that fail")
+    parser.add_argument("--duplicates", action="store_true", help="deliver every webhook twice")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--poll-interval", type=float, default=0.1)
+    parser.add_argument("--webhook-secret", default=os.environ.get("STRIPE_WEBHOOK_SECRET"))
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+    args.api = args.api.rstrip("/")
+
+    rng = random.Random(args.seed)
+    gateway = FakeGateway(webhook_secret=args.webhook_secret, seed=args.seed)
+    outcomes = [rng.random() >= args.fail_rate for _ in range(args.orders)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda succeed: run_checkout(args, gateway, succeed), outcomes))
+    elapsed = time.perf_counter() - started
+
+    errors = [r["error"] for r in results if "error" in r]
+    report = {
+        "orders": args.orders,
+        "concurrency": args.concurrency,
+        "completed": args.orders - len(errors),
+        "errors": len(errors),
+        "orders_per_sec": round(args.orders / elapsed, 2)
+    }
+    for leg in ("create_order_ms", "webhook_ack_ms", "webhook_to_status_ms", "checkout_total_ms"):
+        values = [r[leg] for r in results if leg in r]
+        report[f"{leg}_p50"] = percentile(values, 50)
+        report[f"{leg}_p99"] = percentile(values, 99)
+    print(json.dumps(report))
+    for error in errors[:10]:
+        print(error)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Seen-set of Stripe webhook event ids.
+
+Stripe delivers at least once and retries anything it didn't see a 2xx for,
+so the same event.id can arrive several times, sometimes concurrently. The
+webhook path claims the id here before enqueueing: the first delivery wins
+and later ones are acked without touching the orders table. Whether the
+order is already in the target state is left to the order events processor,
+which checks it when it applies the transition.
+
+A claim is released if enqueueing fails, so Stripe's retry is processed.
+Entries expire after WEBHOOK_DEDUP_TTL_SECONDS; Stripe stops retrying after
+three days, which the default covers.
+"""
+import os
+import time
+
+WEBHOOK_DEDUP_TABLE = os.environ.get("WEBHOOK_DEDUP_TABLE")
+WEBHOOK_DEDUP_TTL_SECONDS = int(os.environ.get("WEBHOOK_DEDUP_TTL_SECONDS", str(4 * 24 * 3600)))
+
+
+class EventDedupStore:
+    """Interface for the seen-set."""
+
+    def claim(self, event_id):
+        """True the first time `event_id` is claimed, False while an earlier claim stands."""
+        raise NotImplementedError
+
+    def release(self, event_id):
+        raise NotImplementedError
+
+
+class MemoryEventDedup(EventDedupStore):
+    """Per-container stand-in for tests and local runs."""
+
+    def __init__(self, ttl_seconds=WEBHOOK_DEDUP_TTL_SECONDS, clock=time.time):
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self.seen = {}  # event_id -> expires_at
+
+    def claim(self, event_id):
+        now = self.clock()
+        if self.seen.get(event_id, 0) > now:
+            return False
+        self.seen[event_id] = now + self.ttl_seconds
+        return True
+
+    def release(self, event_id):
+        self.seen.pop(event_id, None)
+
+
+class DynamoEventDedup(EventDedupStore):
+    """eventId (hash) table with a DynamoDB TTL attribute named expiresAt."""
+
+    def __init__(self, table, ttl_seconds=WEBHOOK_DEDUP_TTL_SECONDS, clock=time.time):
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+
+    def claim(self, event_id):
+        now = int(self.clock())
+        try:
+            # TTL deletion lags by up to ~48h, so an expired item counts as unclaimed
+            self.table.put_item(
+                Item={"eventId": event_id, "claimedAt": now, "expiresAt": now + self.ttl_seconds},
+                ConditionExpression="attribute_not_exists(eventId) OR expiresAt < :now",
+                ExpressionAttributeValues={":now": now}
+            )
+            return True
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+
+    def release(self, event_id):
+        self.table.delete_item(Key={"eventId": event_id})
+
+
+def get_dedup_store():
+    if WEBHOOK_DEDUP_TABLE:
+        import boto3
+        return DynamoEventDedup(boto3.resource("dynamodb").Table(WEBHOOK_DEDUP_TABLE))
+    return MemoryEventDedup()
@@ -1,20 +1,33 @@
 import json
 import os
-import stripe
 import boto3
 from boto3.dynamodb.conditions import Key
 from datetime import datetime, timezone
+from card_cache import INVALIDATING_EVENTS, customer_for_event, get_card_cache
+from event_dedup import get_dedup_store
+from payment_gateway import InvalidSignature, get_gateway
 
-stripe.api_key = os.environ["STRIPE_SECRET_KEY"]
 USERS_TABLE = os.environ["USERS_TABLE"]
-ORDERS_TABLE = os.environ.get("ORDERS_TABLE") 
 ORDER_EVENTS_QUEUE = os.environ["ORDER_EVENTS_QUEUE_URL"]
-WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET")
+FUNCTION_NAME = os.environ.get("AWS_LAMBDA_FUNCTION_NAME")
 
 sqs = boto3.client("sqs")
 dynamodb = boto3.resource("dynamodb")
 users_table = dynamodb.Table(USERS_TABLE)
-orders_table = dynamodb.Table(ORDERS_TABLE) if ORDERS_TABLE else None
+lambda_client = boto3.client("lambda")
+# Stripe, or the offline fake with PAYMENT_GATEWAY=fake
+gateway = get_gateway()
+
+def schedule_card_refresh(customer_id):
+    # Async self-invoke: a background thread would be frozen along with the container once we return
+    lambda_client.invoke(
+        FunctionName=FUNCTION_NAME,
+        InvocationType="Event",
+        Payload=json.dumps({"mode": "refresh_cards", "customer_id": customer_id})
+    )
+
+saved_cards = get_card_cache(gateway.list_cards, schedule_card_refresh)
+seen_events = get_dedup_store()
 
 def respond(status_code, body):
     return {
@@ -29,6 +42,12 @@ def respond(status_code, body):
     }
 
 def lambda_handler(event, context):
+    # Background refresh scheduled by a stale card cache read
+    if event.get("mode") == "refresh_cards":
+        cards = saved_cards.refresh(event["customer_id"])
+        print(f"Refreshed {len(cards)} card(s) for {event['customer_id']}")
+        return {"cards": len(cards)}
+
     method = event.get("httpMethod")
     path_params = event.get("pathParameters") or {}
     resource_path = event.get("resource", "")
@@ -50,22 +69,8 @@ def lambda_handler(event, context):
         customer_id = user["stripe_customer_id"]
 
         try:
-            payment_methods = stripe.PaymentMethod.list(
-                customer=customer_id,
-                type="card"
-            )
-
-            cards = [
-                {
-                    "id": pm.id,
-                    "brand": pm.card.brand,
-                    "last4": pm.card.last4,
-                    "exp_month": pm.card.exp_month,
-                    "exp_year": pm.card.exp_year
-                }
-                for pm in payment_methods.auto_paging_iter()
-            ]
-
+            cards, state = saved_cards.get(customer_id)
+            print(f"Cards for {customer_id}: {state} {saved_cards.stats()}")
             return respond(200, {"cards": cards})
 
         except Exception as e:
@@ -77,13 +82,19 @@ def lambda_handler(event, context):
         sig_header = event["headers"].get("Stripe-Signature")
 
         try:
-            stripe_event = stripe.Webhook.construct_event(
-                payload, sig_header, WEBHOOK_SECRET
-            )
-        except stripe.error.SignatureVerificationError:
+            stripe_event = gateway.construct_event(payload, sig_header)
+        except InvalidSignature:
             return respond(400, {"error": "Invalid Stripe signature"})
 
         event_type = stripe_event["type"]
+
+        # Saved cards changed: the next listing goes back to Stripe
+        if event_type in INVALIDATING_EVENTS:
+            customer_id = customer_for_event(stripe_event)
+            if customer_id:
+                saved_cards.invalidate(customer_id)
+            return respond(200, {"message": f"Card cache invalidated for {customer_id}"})
+
         data = stripe_event["data"]["object"]
         order_id = data.get("metadata", {}).get("order_id")
 
@@ -97,12 +108,17 @@ def lambda_handler(event, context):
         else:
             return respond(200, {"message": f"Ignored event type: {event_type}"})
 
+        # Idempotency: Stripe redelivers events, so only the first delivery of an id is enqueued.
+        # The order events processor skips transitions the order has already made.
+        event_id = stripe_event["id"]
         try:
-            # Imdempotency: check current order status to avoid duplicate state push
-            order = orders_table.get_item(Key={"order_id": order_id}).get("Item")
-            if order and order.get("status") == new_status:
-                return respond(200, {"message": f"Order already in {new_status}"})
+            if not seen_events.claim(event_id):
+                return respond(200, {"message": f"Duplicate event {event_id}"})
+        except Exception as e:
+            # Better a duplicate on the queue than a dropped payment event
+            print(f"Webhook dedup check failed for {event_id}: {e}")
 
+        try:
             now_utc = datetime.now(timezone.utc).isoformat()
 
             # Push to FIFO queue for state transition
@@ -119,6 +135,11 @@ def lambda_handler(event, context):
             )
             return respond(200, {"message": f"Event queued for order {order_id}: {new_status}"})
         except Exception as e:
+            # Let Stripe's retry through the dedup check
+            try:
+                seen_events.release(event_id)
+            except Exception as release_error:
+                print(f"Could not release {event_id}: {release_error}")
             return respond(500, {"error": str(e)})
 
     return respond(404, {"error": "Route not found"})
\ No newline at end of file
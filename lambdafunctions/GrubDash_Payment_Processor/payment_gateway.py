@@ -0,0 +1,256 @@
+"""Payment gateway shared by the orders and payment processor functions.
+
+Everything checkout needs from Stripe goes through PaymentGateway, so it can
+be swapped for FakeGateway (PAYMENT_GATEWAY=fake) to load-test checkout
+without network access to Stripe or using up API quota:
+
+- IDs and client secrets have Stripe's shapes (cus_..., pi_..._secret_...).
+- Every call sleeps for a log-normal latency fitted to FAKE_STRIPE_LATENCY_MS
+  ("p50,p99"). A share of calls (FAKE_STRIPE_ERROR_RATE) fails with a
+  rate-limit, connection or API error, in roughly the mix Stripe returns.
+- Webhooks are signed the way Stripe signs them (t=...,v1=HMAC-SHA256 over
+  "t.payload" with STRIPE_WEBHOOK_SECRET). They verify with either gateway,
+  and emit() POSTs them to /payment/events.
+
+Both functions must be deployed with the same PAYMENT_GATEWAY and
+STRIPE_WEBHOOK_SECRET. checkout_benchmark.py drives the loop end to end.
+"""
+import hashlib
+import hmac
+import json
+import math
+import os
+import random
+import string
+import time
+import urllib.error
+import urllib.request
+
+PAYMENT_GATEWAY = os.environ.get("PAYMENT_GATEWAY", "stripe")
+WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET")
+WEBHOOK_TOLERANCE_SECONDS = 300
+
+FAKE_LATENCY_MS = os.environ.get("FAKE_STRIPE_LATENCY_MS", "250,900")
+FAKE_ERROR_RATE = float(os.environ.get("FAKE_STRIPE_ERROR_RATE", "0"))
+FAKE_WEBHOOK_URL = os.environ.get("FAKE_STRIPE_WEBHOOK_URL")
+
+# (kind, HTTP status, retryable, weight) for injected failures
+FAKE_ERRORS = [
+    ("rate_limit", 429, True, 0.5),
+    ("api_connection", None, True, 0.3),
+    ("api_error", 500, True, 0.2),
+]
+
+_ID_ALPHABET = string.ascii_letters + string.digits
+
+
+class PaymentGatewayError(Exception):
+    def __init__(self, message, kind="api_error", status=None, retryable=False):
+        super().__init__(message)
+        self.kind = kind
+        self.status = status
+        self.retryable = retryable
+
+
+class InvalidSignature(Exception):
+    pass
+
+
+class PaymentGateway:
+    def create_customer(self, user_id, email=None):
+        """Returns the new customer id."""
+        raise NotImplementedError
+
+    def create_payment_intent(self, amount_cents, customer_id, order_id, save_card=False):
+        """Returns {"id", "client_secret"}."""
+        raise NotImplementedError
+
+    def list_cards(self, customer_id):
+        """Returns [{"id", "brand", "last4", "exp_month", "exp_year"}]."""
+        raise NotImplementedError
+
+    def construct_event(self, payload, sig_header):
+        """Verifies a webhook and returns the event; InvalidSignature if it doesn't verify."""
+        raise NotImplementedError
+
+
+class StripeGateway(PaymentGateway):
+    def __init__(self, api_key=None, webhook_secret=WEBHOOK_SECRET):
+        import stripe
+        stripe.api_key = api_key or os.environ["STRIPE_SECRET_KEY"]
+        self.stripe = stripe
+        self.webhook_secret = webhook_secret
+
+    # DOC: https://docs.stripe.com/api/customers
+    def create_customer(self, user_id, email=None):
+        return self._call(self.stripe.Customer.create, metadata={"user_id": user_id}, email=email or None).id
+
+    # DOC: https://docs.stripe.com/api/payment_intents
+    def create_payment_intent(self, amount_cents, customer_id, order_id, save_card=False):
+        intent = self._call(
+            self.stripe.PaymentIntent.create,
+            amount=amount_cents,
+            currency="usd",
+            customer=customer_id,
+            setup_future_usage="off_session" if save_card else None,
+            automatic_payment_methods={"enabled": True},
+            metadata={"order_id": order_id}
+        )
+        return {"id": intent.id, "client_secret": intent.client_secret}
+
+    def list_cards(self, customer_id):
+        payment_methods = self._call(self.stripe.PaymentMethod.list, customer=customer_id, type="card", limit=100)
+        return [
+            {
+                "id": pm.id,
+                "brand": pm.card.brand,
+                "last4": pm.card.last4,
+                "exp_month": pm.card.exp_month,
+                "exp_year": pm.card.exp_year
+            }
+            for pm in payment_methods.auto_paging_iter()
+        ]
+
+    def construct_event(self, payload, sig_header):
+        try:
+            return self.stripe.Webhook.construct_event(payload, sig_header, self.webhook_secret)
+        except self.stripe.error.SignatureVerificationError as e:
+            raise InvalidSignature(str(e))
+
+    def _call(self, method, **kwargs):
+        errors = self.stripe.error
+        try:
+            return method(**kwargs)
+        except errors.RateLimitError as e:
+            raise PaymentGatewayError(str(e), "rate_limit", 429, retryable=True)
+        except errors.APIConnectionError as e:
+            raise PaymentGatewayError(str(e), "api_connection", retryable=True)
+        except errors.StripeError as e:
+            status = getattr(e, "http_status", None)
+            raise PaymentGatewayError(str(e), "api_error", status, retryable=bool(status and status >= 500))
+
+
+class FakeGateway(PaymentGateway):
+    def __init__(self, webhook_secret=WEBHOOK_SECRET, latency_ms=FAKE_LATENCY_MS, error_rate=FAKE_ERROR_RATE,
+                 webhook_url=FAKE_WEBHOOK_URL, seed=None, sleep=time.sleep, clock=time.time):
+        p50, p99 = (float(v) for v in str(latency_ms).split(","))
+        # Log-normal through both points; z(0.99) = 2.326
+        self.latency_mu = math.log(max(p50, 0.001))
+        self.latency_sigma = max(math.log(max(p99, 0.001)) - self.latency_mu, 0) / 2.326
+        self.error_rate = error_rate
+        self.webhook_secret = webhook_secret or "whsec_fake"
+        self.webhook_url = webhook_url
+        self.rng = random.Random(seed)
+        self.sleep = sleep
+        self.clock = clock
+        self.calls = 0
+        self.failures = 0
+
+    def create_customer(self, user_id, email=None):
+        self._simulate("customers.create")
+        return self.new_id("cus")
+
+    def create_payment_intent(self, amount_cents, customer_id, order_id, save_card=False):
+        self._simulate("payment_intents.create")
+        intent_id = self.new_id("pi")
+        return {"id": intent_id, "client_secret": f"{intent_id}_secret_{self._random_string(25)}"}
+
+    def list_cards(self, customer_id):
+        self._simulate("payment_methods.list")
+        # Stable per customer: zero to two cards
+        rng = random.Random(customer_id)
+        return [
+            {
+                "id": f"pm_{''.join(rng.choice(_ID_ALPHABET) for _ in range(24))}",
+                "brand": rng.choice(["visa", "mastercard", "amex"]),
+                "last4": f"{rng.randrange(10000):04d}",
+                "exp_month": rng.randint(1, 12),
+                "exp_year": time.gmtime().tm_year + rng.randint(1, 5)
+            }
+            for _ in range(rng.randint(0, 2))
+        ]
+
+    def construct_event(self, payload, sig_header):
+        parts = {}
+        for item in (sig_header or "").split(","):
+            key, _, value = item.partition("=")
+            parts.setdefault(key.strip(), []).append(value.strip())
+        try:
+            timestamp = int(parts["t"][0])
+        except (KeyError, ValueError):
+            raise InvalidSignature("Missing or malformed timestamp")
+        if abs(self.clock() - timestamp) > WEBHOOK_TOLERANCE_SECONDS:
+            raise InvalidSignature("Timestamp outside the tolerance zone")
+        expected = self._signature(timestamp, payload)
+        if not any(hmac.compare_digest(expected, v) for v in parts.get("v1", [])):
+            raise InvalidSignature("No signatures found matching the expected signature")
+        return json.loads(payload)
+
+    # Webhooks
+
+    def payment_event(self, intent_id, order_id, amount_cents=None, succeeded=True):
+        """A payment_intent.succeeded (or .payment_failed) event as Stripe would send it."""
+        event_type = "payment_intent.succeeded" if succeeded else "payment_intent.payment_failed"
+        return {
+            "id": self.new_id("evt"),
+            "object": "event",
+            "type": event_type,
+            "created": int(self.clock()),
+            "livemode": False,
+            "data": {"object": {
+                "id": intent_id,
+                "object": "payment_intent",
+                "amount": amount_cents,
+                "currency": "usd",
+                "status": "succeeded" if succeeded else "requires_payment_method",
+                "metadata": {"order_id": order_id}
+            }}
+        }
+
+    def sign(self, event):
+        """(payload, Stripe-Signature header) for an event."""
+        payload = json.dumps(event)
+        timestamp = int(self.clock())
+        return payload, f"t={timestamp},v1={self._signature(timestamp, payload)}"
+
+    def emit(self, event, url=None, timeout=10):
+        """POSTs a signed event to /payment/events; returns (status, body)."""
+        payload, signature = self.sign(event)
+        request = urllib.request.Request(
+            url or self.webhook_url,
+            data=payload.encode("utf-8"),
+            headers={"Content-Type": "application/json", "Stripe-Signature": signature},
+            method="POST"
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return response.status, response.read().decode("utf-8")
+        except urllib.error.HTTPError as e:
+            return e.code, e.read().decode("utf-8")
+
+    # Internals
+
+    def new_id(self, prefix):
+        return f"{prefix}_{self._random_string(24)}"
+
+    def _random_string(self, length):
+        return "".join(self.rng.choice(_ID_ALPHABET) for _ in range(length))
+
+    def _signature(self, timestamp, payload):
+        signed = f"{timestamp}.{payload}".encode("utf-8")
+        return hmac.new(self.webhook_secret.encode("utf-8"), signed, hashlib.sha256).hexdigest()
+
+    def _simulate(self, operation):
+        self.calls += 1
+        self.sleep(self.rng.lognormvariate(self.latency_mu, self.latency_sigma) / 1000.0)
+        if self.rng.random() < self.error_rate:
+            self.failures += 1
+            kind, status, retryable, _ = self.rng.choices(FAKE_ERRORS, weights=[e[3] for e in FAKE_ERRORS])[0]
+            raise PaymentGatewayError(f"Injected {kind} on {operation}", kind, status, retryable)
+
+
+def get_gateway():
+    if PAYMENT_GATEWAY == "fake":
+        print("Using the fake payment gateway")
+        return FakeGateway()
+    return StripeGateway()
@@ -1,47 +1,121 @@
 import boto3
 import os
 import json
+import random
+import time
+from decimal import Decimal
+from recommendation_cache import RecommendationCache
+from menu_store import MenuStore
 
 personalize_runtime = boto3.client('personalize-runtime', region_name=os.environ['REGION'])
 CAMPAIGN_ARN = os.environ['CAMPAIGN_ARN']
+USERS_TABLE = os.environ.get('USERS_TABLE')
+
+DEFAULT_NUM_RESULTS = int(os.environ.get('DEFAULT_NUM_RESULTS', '10'))
+# Hydration reads every result in one BatchGetItem, which takes at most 100 keys
+MAX_NUM_RESULTS = min(int(os.environ.get('MAX_NUM_RESULTS', '50')), 100)
+# Applied when the request doesn't name a filter
+DEFAULT_FILTER_ARN = os.environ.get('DEFAULT_FILTER_ARN')
+# {"name": "arn:aws:personalize:..."}; clients pick one by name with ?filter=, never by ARN
+FILTERS = json.loads(os.environ.get('RECOMMENDATION_FILTERS', '{}'))
+
+# Hydrated cards carry what the home-page tiles render: the first menu item gives the
+# image and cuisine. Migrated restaurants only have menuVersion; their item comes from menu_store
+CARD_PROJECTION = "userId, #name, rating, email, address, createdAt, #menu[0], menuVersion"
+CARD_NAMES = {"#name": "name", "#menu": "menu"}
+BATCH_GET_ATTEMPTS = 5
+
+dynamodb = boto3.resource('dynamodb')
+cache = RecommendationCache()
+# Per-item menus; snapshots are cached per container and keyed by menuVersion
+menus = MenuStore(dynamodb.Table(USERS_TABLE)) if USERS_TABLE else None
+
+def json_default(obj):
+    if isinstance(obj, Decimal):
+        return int(obj) if obj % 1 == 0 else float(obj)
+    return str(obj)
+
+def respond(status_code, body):
+    return {
+        "statusCode": status_code,
+        "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Content-Type": "application/json"
+        },
+        "body": json.dumps(body, default=json_default)
+    }
+
+def recommend(user_id, num_results, filter_arn):
+    kwargs = {"campaignArn": CAMPAIGN_ARN, "userId": user_id, "numResults": num_results}
+    if filter_arn:
+        kwargs["filterArn"] = filter_arn
+    response = personalize_runtime.get_recommendations(**kwargs)
+    return [item["itemId"] for item in response.get("itemList", [])]
+
+def hydrate(restaurant_ids):
+    """Restaurant cards in recommendation order, from one BatchGetItem (ids are capped well under 100)
+    plus a menu snapshot for restaurants on per-item menus."""
+    if not restaurant_ids:
+        return []
+    found = {}
+    pending = {USERS_TABLE: {
+        "Keys": [{"userId": i} for i in dict.fromkeys(restaurant_ids)],
+        "ProjectionExpression": CARD_PROJECTION,
+        "ExpressionAttributeNames": CARD_NAMES
+    }}
+    for attempt in range(BATCH_GET_ATTEMPTS):
+        response = dynamodb.batch_get_item(RequestItems=pending)
+        for item in response.get("Responses", {}).get(USERS_TABLE, []):
+            found[item["userId"]] = item
+        pending = response.get("UnprocessedKeys") or {}
+        if not pending:
+            break
+        time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+    else:
+        print(f"Hydration left {len(pending[USERS_TABLE]['Keys'])} restaurant(s) unprocessed")
+    for card in found.values():
+        version = card.pop("menuVersion", None)
+        if version is not None and "menu" not in card:
+            card["menu"] = menus.snapshot(card["userId"], version=int(version))["items"][:1]
+    # Restaurants that were deleted since training are dropped rather than shown empty
+    return [found[i] for i in restaurant_ids if i in found]
 
 def lambda_handler(event, context):
     try:
         print("EVENT:", json.dumps(event))  # For debugging in CloudWatch
 
-        user_id = event.get("queryStringParameters", {}).get("userId")
+        params = event.get("queryStringParameters") or {}
+        user_id = params.get("userId")
         if not user_id:
-            return {
-                "statusCode": 400,
-                "headers": {"Access-Control-Allow-Origin": "*"},
-                "body": json.dumps({"error": "Missing userId"})
-            }
-
-        response = personalize_runtime.get_recommendations(
-            campaignArn=CAMPAIGN_ARN,
-            userId=user_id,
-            numResults=10
-        )
-
-        recommendations = [item["itemId"] for item in response.get("itemList", [])]
-
-        print("RECOMMENDATIONS:", recommendations)
-
-        return {
-            "statusCode": 200,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Content-Type": "application/json"
-            },
-            "body": json.dumps({"recommendedRestaurantIds": recommendations})
-        }
+            return respond(400, {"error": "Missing userId"})
+
+        try:
+            num_results = int(params.get("numResults") or DEFAULT_NUM_RESULTS)
+        except ValueError:
+            return respond(400, {"error": "numResults must be an integer"})
+        if not 1 <= num_results <= MAX_NUM_RESULTS:
+            return respond(400, {"error": f"numResults must be between 1 and {MAX_NUM_RESULTS}"})
+
+        filter_name = params.get("filter")
+        if filter_name and filter_name not in FILTERS:
+            return respond(400, {"error": f"Unknown filter: {filter_name}"})
+        filter_arn = FILTERS[filter_name] if filter_name else DEFAULT_FILTER_ARN
+
+        with_cards = params.get("hydrate") in ("1", "true")
+        if with_cards and not USERS_TABLE:
+            return respond(400, {"error": "Hydration is not configured"})
+
+        def load():
+            recommendations = recommend(user_id, num_results, filter_arn)
+            body = {"recommendedRestaurantIds": recommendations}
+            if with_cards:
+                body["restaurants"] = hydrate(recommendations)
+            return body
+
+        body = cache.get((user_id, num_results, filter_name or "", with_cards), load)
+        print("RECOMMENDATIONS:", body["recommendedRestaurantIds"], cache.stats())
+        return respond(200, body)
 
     except Exception as e:
         print("ERROR:", str(e))
-        return {
-            "statusCode": 500,
-            "headers": {
-                "Access-Control-Allow-Origin": "*"
-            },
-            "body": json.dumps({"error": "Internal server error", "details": str(e)})
-        }
+        return respond(500, {"error": "Internal server error", "details": str(e)})
@@ -0,0 +1,50 @@
+"""Warm-container cache of recommendation responses.
+
+Keys are (userId, numResults, filter, hydrate), values the response body, kept
+for RECOMMENDATION_CACHE_TTL_SECONDS. Personalize results for a user only move
+when new interactions are ingested and the campaign picks them up, so a few
+minutes of staleness costs nothing visible while every home-page reload
+within that window skips both the Personalize call and the hydration read.
+
+A container serves one invocation at a time, so there is nothing to lock or
+coalesce; failures are not cached.
+"""
+import os
+import time
+from collections import OrderedDict
+
+CACHE_TTL_SECONDS = float(os.environ.get("RECOMMENDATION_CACHE_TTL_SECONDS", "300"))
+CACHE_MAX_ENTRIES = int(os.environ.get("RECOMMENDATION_CACHE_MAX_ENTRIES", "5000"))
+
+
+class RecommendationCache:
+    def __init__(self, ttl_seconds=CACHE_TTL_SECONDS, max_entries=CACHE_MAX_ENTRIES, clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, load):
+        """Cached value for `key`, calling load() and storing its result on a miss."""
+        entry = self.entries.get(key)
+        if entry and entry[0] > self.clock():
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+        self.misses += 1
+        value = load()
+        self.entries[key] = (self.clock() + self.ttl_seconds, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return value
+
+    def invalidate(self, user_id):
+        for key in [k for k in self.entries if k[0] == user_id]:
+            del self.entries[key]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.entries)}
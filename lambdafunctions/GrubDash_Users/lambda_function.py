@@ -2,21 +2,289 @@ import json
 import boto3
 import uuid
 import os
+import re
+import gzip
+import base64
+import hashlib
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
 from utils import get_table
+from menu_store import MenuStore, MenuItemNotFound, InvalidMenuItem, RestaurantNotFound
+from update_builder import InvalidUpdate, from_body
 
 table = get_table()
+dynamodb = boto3.resource('dynamodb')
+# The resource's client keeps its Python-type conversion but, unlike the Table
+# resource, is thread-safe; bulk updates share it across workers
+client = dynamodb.meta.client
+
+# Per-item menus; the snapshot cache lives as long as the container
+menus = MenuStore(table)
+
+# Bodies at least this large are gzipped for clients that accept it. Needs */* in the
+# API's binary media types so API Gateway decodes the base64 body; that also makes it
+# base64-encode request bodies, which request_json undoes
+GZIP_MIN_BYTES = int(os.environ.get("GZIP_MIN_BYTES", "1024"))
+
+# Bumped on every write to the user item; always projected, so the ETag moves with menu edits
+VERSION_ATTRIBUTES = ("version", "menuVersion")
+# GET /users?ids=...: BatchGetItem takes at most 100 keys per call
+BATCH_GET_MAX_KEYS = 100
+BATCH_GET_MAX_IDS = int(os.environ.get("BATCH_GET_MAX_IDS", "200"))
+BATCH_GET_ATTEMPTS = 5
+# POST /users/bulk-update: TransactWriteItems takes at most 100 actions
+BULK_UPDATE_MAX_ITEMS = 100
+BULK_UPDATE_WORKERS = int(os.environ.get("BULK_UPDATE_WORKERS", "8"))
+
+FIELD_PATTERN = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*(\.[A-Za-z_][A-Za-z0-9_]*)*$")
 
 # Reusable CORS-enabled response
-def respond(status_code, body):
-    return {
+def respond(status_code, body, headers=None, event=None):
+    response = {
         "statusCode": status_code,
         "headers": {
             "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET,POST,PUT,OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type"
+            "Access-Control-Allow-Methods": "GET,POST,PUT,DELETE,OPTIONS",
+            "Access-Control-Allow-Headers": "Content-Type,If-None-Match",
+            "Access-Control-Expose-Headers": "ETag",
+            **(headers or {})
         },
-        "body": json.dumps(body, default=str)
+        "body": json.dumps(body, default=str) if body is not None else ""
     }
+    if event and len(response["body"]) >= GZIP_MIN_BYTES and "gzip" in header(event, "Accept-Encoding"):
+        response["body"] = base64.b64encode(gzip.compress(response["body"].encode("utf-8"))).decode("ascii")
+        response["isBase64Encoded"] = True
+        response["headers"]["Content-Encoding"] = "gzip"
+        response["headers"]["Content-Type"] = "application/json"
+    return response
+
+def header(event, name):
+    """Case-insensitive request header lookup; '' when absent."""
+    for key, value in (event.get("headers") or {}).items():
+        if key.lower() == name.lower():
+            return value or ""
+    return ""
+
+def request_json(event):
+    """Parsed request body, {} when empty; ValueError when it isn't (base64-wrapped) JSON."""
+    body = event.get("body") or "{}"
+    if event.get("isBase64Encoded"):
+        body = base64.b64decode(body).decode("utf-8")
+    return json.loads(body)
+
+def parse_fields(raw):
+    """fields=a,b,c.d -> list of attribute paths; ValueError on anything else."""
+    fields = [f.strip() for f in raw.split(",") if f.strip()]
+    for field in fields:
+        if not FIELD_PATTERN.match(field):
+            raise ValueError(f"Invalid field: {field}")
+    return list(dict.fromkeys(fields))
+
+def projection(fields):
+    """ProjectionExpression and names for `fields` plus the version attributes."""
+    names = {}
+    paths = []
+    for field in list(fields) + [a for a in VERSION_ATTRIBUTES if a not in fields]:
+        parts = []
+        for part in field.split("."):
+            alias = f"#p{len(names)}"
+            names.setdefault(alias, part)
+            parts.append(alias)
+        paths.append(".".join(parts))
+    return ", ".join(paths), names
+
+def etag(item, fields):
+    """Weak ETag hashed from the item as read, so a write moves it whether or not it bumped version."""
+    canonical = json.dumps({"fields": fields or ["*"], "item": item}, default=str, sort_keys=True)
+    return f'W/"{hashlib.sha1(canonical.encode("utf-8")).hexdigest()[:20]}"'
+
+def get_user(user_id, event):
+    params = event.get("queryStringParameters") or {}
+    fields = []
+    kwargs = {"Key": {"userId": user_id}}
+    if params.get("fields"):
+        try:
+            fields = parse_fields(params["fields"])
+        except ValueError as e:
+            return respond(400, {"error": str(e)})
+        kwargs["ProjectionExpression"], kwargs["ExpressionAttributeNames"] = projection(fields)
+
+    item = table.get_item(**kwargs).get("Item")
+    if not item:
+        return respond(404, {"error": "User not found"})
+
+    tag = etag(item, fields)
+    cache_headers = {"ETag": tag, "Cache-Control": "private, no-cache"}
+    if tag in [t.strip() for t in header(event, "If-None-Match").split(",")]:
+        return respond(304, None, cache_headers)
+
+    wants_menu = not fields or "menu" in fields
+    if wants_menu and "menuVersion" in item and "menu" not in item:
+        # Migrated restaurants: same response shape as before, menu from the cached snapshot
+        item["menu"] = menus.snapshot(user_id, version=int(item["menuVersion"]))["items"]
+    if fields:
+        # Version attributes were only projected for the ETag
+        requested = {f.split(".")[0] for f in fields}
+        item = {k: v for k, v in item.items() if k in requested}
+    return respond(200, item, cache_headers, event)
+
+def batch_get(ids, fields):
+    """userId -> item for the ids that exist, retrying UnprocessedKeys with backoff."""
+    request = {"Keys": []}
+    if fields:
+        expression, names = projection(list(dict.fromkeys(["userId"] + fields)))
+        request.update(ProjectionExpression=expression, ExpressionAttributeNames=names)
+
+    found = {}
+    for start in range(0, len(ids), BATCH_GET_MAX_KEYS):
+        pending = {table.name: {**request, "Keys": [{"userId": i} for i in ids[start:start + BATCH_GET_MAX_KEYS]]}}
+        for attempt in range(BATCH_GET_ATTEMPTS):
+            response = dynamodb.batch_get_item(RequestItems=pending)
+            for item in response.get("Responses", {}).get(table.name, []):
+                found[item["userId"]] = item
+            pending = response.get("UnprocessedKeys") or {}
+            if not pending:
+                break
+            # Throttled keys come back unprocessed; back off before asking again
+            time.sleep(random.uniform(0, 0.05 * 2 ** attempt))
+        else:
+            raise RuntimeError(f"{len(pending[table.name]['Keys'])} key(s) still unprocessed after {BATCH_GET_ATTEMPTS} attempts")
+    return found
+
+def get_users(event):
+    """GET /users?ids=a,b,c[&fields=...]: items in request order, null for ids that don't exist."""
+    params = event.get("queryStringParameters") or {}
+    ids = list(dict.fromkeys(i.strip() for i in (params.get("ids") or "").split(",") if i.strip()))
+    if not ids:
+        return respond(400, {"error": "Missing ids"})
+    if len(ids) > BATCH_GET_MAX_IDS:
+        return respond(400, {"error": f"At most {BATCH_GET_MAX_IDS} ids per request"})
+    try:
+        fields = parse_fields(params["fields"]) if params.get("fields") else []
+    except ValueError as e:
+        return respond(400, {"error": str(e)})
+
+    found = batch_get(ids, fields)
+
+    requested = {f.split(".")[0] for f in fields}
+    items = []
+    for user_id in ids:
+        item = found.get(user_id)
+        if item is not None:
+            if (not fields or "menu" in requested) and "menuVersion" in item and "menu" not in item:
+                item["menu"] = menus.snapshot(user_id, version=int(item["menuVersion"]))["items"]
+            if fields:
+                item = {k: v for k, v in item.items() if k in requested}
+        items.append(item)
+
+    return respond(200, {
+        "ids": ids,
+        "items": items,
+        "missing": [i for i in ids if i not in found]
+    }, event=event)
+
+def build_user_update(body):
+    """UpdateBuilder for a PUT body, with the server-managed version bump."""
+    if isinstance(body, dict):
+        body = {k: v for k, v in body.items() if k not in VERSION_ATTRIBUTES}  # server-managed
+    builder = from_body(body, protected=("userId",) + VERSION_ATTRIBUTES)
+    if builder.touches("menu"):
+        # Migrated restaurants no longer store the list; they're edited through /menu/items
+        builder.require_absent("menuVersion")
+    # Every write moves the version that expected_version checks against
+    builder.bump("version")
+    return builder
+
+def conflict(user_id, builder):
+    """409 body saying which condition failed, with the version the client should retry against."""
+    item = client.get_item(
+        TableName=table.name,
+        Key={"userId": user_id},
+        ProjectionExpression="#version, menuVersion",
+        ExpressionAttributeNames={"#version": "version"}
+    ).get("Item") or {}
+    if builder.touches("menu") and "menuVersion" in item:
+        return {"error": "Menu is stored per item; use /users/{id}/menu/items"}
+    return {"error": "Version conflict", "current_version": int(item.get("version", 0))}
+
+def update_user(user_id, body):
+    """(status, body) for one update; PUT /users/{id} and non-atomic bulk updates share it."""
+    try:
+        builder = build_user_update(body)
+        kwargs = builder.build()
+    except InvalidUpdate as e:
+        return 400, {"error": str(e)}
+    print(kwargs)
+    try:
+        res = client.update_item(TableName=table.name, Key={"userId": user_id}, ReturnValues="UPDATED_NEW", **kwargs)
+    except client.exceptions.ConditionalCheckFailedException:
+        return 409, conflict(user_id, builder)
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ValidationException":
+            # e.g. a nested path under a map the item doesn't have
+            return 400, {"error": e.response["Error"]["Message"]}
+        raise
+    return 200, {"message": "User updated successfully", "version": int(res["Attributes"]["version"])}
+
+def bulk_update(event):
+    """POST /users/bulk-update {"updates": [{"userId": ..., <PUT body>}], "atomic": true}
+
+    Atomic (the default) applies every update in one TransactWriteItems or none
+    of them; otherwise each is applied on its own and reported per user.
+    """
+    try:
+        payload = request_json(event)
+    except ValueError:
+        return respond(400, {"error": "Invalid JSON body"})
+    updates = payload.get("updates")
+    if not isinstance(updates, list) or not updates:
+        return respond(400, {"error": "Missing updates"})
+    if len(updates) > BULK_UPDATE_MAX_ITEMS:
+        return respond(400, {"error": f"At most {BULK_UPDATE_MAX_ITEMS} updates per request"})
+    if not all(isinstance(u, dict) and isinstance(u.get("userId"), str) and u["userId"] for u in updates):
+        return respond(400, {"error": "Every update needs a userId"})
+    ids = [u["userId"] for u in updates]
+    if len(set(ids)) != len(ids):
+        return respond(400, {"error": "Each userId may appear only once"})
+    bodies = [{k: v for k, v in u.items() if k != "userId"} for u in updates]
+
+    if payload.get("atomic", True):
+        return transact_update(ids, bodies)
+
+    with ThreadPoolExecutor(max_workers=min(BULK_UPDATE_WORKERS, len(ids))) as pool:
+        outcomes = list(pool.map(update_user, ids, bodies))
+    return respond(200, {"results": [{"userId": i, "status": s, **b} for i, (s, b) in zip(ids, outcomes)]})
+
+def transact_update(ids, bodies):
+    builders, actions, invalid = [], [], []
+    for user_id, body in zip(ids, bodies):
+        try:
+            builder = build_user_update(body)
+            actions.append({"Update": {"TableName": table.name, "Key": {"userId": user_id}, **builder.build()}})
+            builders.append(builder)
+        except InvalidUpdate as e:
+            invalid.append({"userId": user_id, "status": 400, "error": str(e)})
+    if invalid:
+        return respond(400, {"error": "Invalid updates; nothing was applied", "results": invalid})
+
+    try:
+        client.transact_write_items(TransactItems=actions)
+    except client.exceptions.TransactionCanceledException as e:
+        results = []
+        for user_id, builder, reason in zip(ids, builders, e.response.get("CancellationReasons", [])):
+            code = reason.get("Code", "None")
+            if code == "ConditionalCheckFailed":
+                results.append({"userId": user_id, "status": 409, **conflict(user_id, builder)})
+            elif code != "None":
+                results.append({"userId": user_id, "status": 409, "error": reason.get("Message") or code})
+        return respond(409, {"error": "Transaction cancelled; nothing was applied", "results": results})
+    except ClientError as e:
+        if e.response["Error"]["Code"] == "ValidationException":
+            return respond(400, {"error": e.response["Error"]["Message"]})
+        raise
+    return respond(200, {"results": [{"userId": i, "status": 200} for i in ids]})
 
 def lambda_handler(event, context):
     method = event.get("httpMethod")
@@ -24,49 +292,66 @@ def lambda_handler(event, context):
     path_params = event.get("pathParameters") or {}
 
     print(event)
-    # GET /users/{id}
+    # /users/{id}/menu and /users/{id}/menu/items[/{item_id}]
+    if "/menu" in path and "id" in path_params:
+        return handle_menu(method, path, path_params, event)
+
+    # POST /users/bulk-update
+    if method == "POST" and path.endswith("/bulk-update"):
+        return bulk_update(event)
+
+    # GET /users?ids=a,b,c
+    if method == "GET" and not path_params and (event.get("queryStringParameters") or {}).get("ids"):
+        return get_users(event)
+
+    # GET /users/{id}[?fields=name,email]
     if method == "GET" and "id" in path_params:
-        user_id = path_params["id"]
-        response = table.get_item(Key={"userId": user_id})
-        item = response.get("Item")
-        return respond(200, item) if item else respond(404, {"error": "User not found"})
+        return get_user(path_params["id"], event)
     
     elif method == "PUT" and "id" in path_params:
         user_id = path_params["id"]
-        data = json.loads(event['body'])
-        update_expr_parts = []
-        expr_attr_values = {}
-        expr_attr_names = {}
-
-        reserved_words = {'name', 'user', 'status', 'type', 'role'}  # extend as needed
+        try:
+            data = request_json(event)
+        except ValueError:
+            return respond(400, {"error": "Invalid JSON body"})
         print("data is", data)
-        for key, value in data.items():
-            if key in reserved_words:
-                alias = f"#{key[:1]}"
-                expr_attr_names[alias] = key
-                update_expr_parts.append(f"{alias} = :{key}")
-            else:
-                update_expr_parts.append(f"{key} = :{key}")
-            expr_attr_values[f":{key}"] = value
+        # {"field": value, "$remove": [...], "$append": {...}, "expected_version": n}; see update_builder
+        status, body = update_user(user_id, data)
+        return respond(status, body)
 
-        update_expr = "SET " + ", ".join(update_expr_parts)
-
-        kwargs = {
-            'Key': {'userId': user_id},
-            'UpdateExpression': update_expr,
-            'ExpressionAttributeValues': expr_attr_values
-        }
-
-        print(kwargs)
+    # Fallback for unmatched routes
+    return respond(404, {"error": "Route not found"})
 
-        if expr_attr_names:
-            kwargs['ExpressionAttributeNames'] = expr_attr_names
+def handle_menu(method, path, path_params, event):
+    restaurant_id = path_params["id"]
+    item_id = path_params.get("item_id")
+    try:
+        # GET /users/{id}/menu
+        if method == "GET" and path.endswith("/menu"):
+            return respond(200, menus.snapshot(restaurant_id))
 
-        res = table.update_item(**kwargs)
+        # POST /users/{id}/menu/items
+        if method == "POST" and path.endswith("/menu/items"):
+            item_id, version = menus.add_item(restaurant_id, request_json(event))
+            return respond(201, {"item_id": item_id, "version": version})
 
-        print(res)
+        # PUT /users/{id}/menu/items/{item_id}
+        if method == "PUT" and item_id:
+            version = menus.update_item(restaurant_id, item_id, request_json(event))
+            return respond(200, {"item_id": item_id, "version": version})
 
-        return respond(200, {"message": "User updated successfully"})
+        # DELETE /users/{id}/menu/items/{item_id}
+        if method == "DELETE" and item_id:
+            version = menus.remove_item(restaurant_id, item_id)
+            return respond(200, {"item_id": item_id, "version": version})
+    except InvalidMenuItem as e:
+        return respond(400, {"error": str(e)})
+    except MenuItemNotFound:
+        return respond(404, {"error": f"Menu item not found: {item_id}"})
+    except RestaurantNotFound:
+        return respond(404, {"error": f"Restaurant not found: {restaurant_id}"})
+    except ValueError:
+        # From request_json: the body is not (base64-wrapped) JSON
+        return respond(400, {"error": "Invalid JSON body"})
 
-    # Fallback for unmatched routes
     return respond(404, {"error": "Route not found"})
\ No newline at end of file
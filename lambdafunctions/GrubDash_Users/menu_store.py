@@ -0,0 +1,237 @@
+"""Per-item menu storage with a versioned, cached snapshot read path.
+
+Menus used to live as one `menu` list on the restaurant's user item, so any
+edit rewrote the whole list and every user read carried it. Items now live
+in MENU_ITEMS_TABLE (restaurant_id hash, item_id range), and the user item
+only keeps a `menuVersion` counter:
+
+- add/update/remove write the single item, then ADD 1 to menuVersion. The
+  version moves after the item, so a snapshot built while an edit is in
+  flight is tagged with the older version and is rebuilt on the next read.
+- snapshot() returns the compact menu for a restaurant. It is cached per
+  container and keyed by version: a read costs one projected GetItem for the
+  version (skipped when the caller already has it) and a Query only when the
+  version moved.
+
+Restaurants that still have the legacy `menu` list are served from it, and
+migrated on their first edit (the list is removed from the user item).
+Legacy entries without an item_id get `legacy-<position>`, so concurrent
+first edits write the same records instead of duplicates. Writes never
+create a user item: an edit for an unknown userId raises RestaurantNotFound.
+"""
+import os
+import time
+import uuid
+from collections import OrderedDict
+from decimal import Decimal
+import boto3
+from boto3.dynamodb.conditions import Key
+
+MENU_ITEMS_TABLE = os.environ.get("MENU_ITEMS_TABLE", "grubdash_menu_items")
+SNAPSHOT_CACHE_MAX = int(os.environ.get("MENU_SNAPSHOT_CACHE_MAX", "1000"))
+# Serve a cached snapshot this long without re-reading the version; 0 always checks
+SNAPSHOT_FRESH_SECONDS = float(os.environ.get("MENU_SNAPSHOT_FRESH_SECONDS", "0"))
+
+ITEM_FIELDS = ("name", "description", "category", "price", "image_url")
+
+
+class MenuItemNotFound(Exception):
+    pass
+
+
+class RestaurantNotFound(Exception):
+    pass
+
+
+class InvalidMenuItem(Exception):
+    pass
+
+
+def _clean(fields):
+    """Keeps the editable menu fields; prices are stored as Decimal."""
+    unknown = set(fields) - set(ITEM_FIELDS) - {"item_id"}
+    if unknown:
+        raise InvalidMenuItem(f"Unknown menu fields: {sorted(unknown)}")
+    cleaned = {k: v for k, v in fields.items() if k in ITEM_FIELDS}
+    if "price" in cleaned:
+        try:
+            cleaned["price"] = Decimal(str(cleaned["price"]))
+        except Exception:
+            raise InvalidMenuItem(f"Invalid price: {cleaned['price']}")
+        if cleaned["price"] < 0:
+            raise InvalidMenuItem(f"Invalid price: {cleaned['price']}")
+    return cleaned
+
+
+def compact_item(item):
+    return {
+        "item_id": item["item_id"],
+        **{k: item[k] for k in ITEM_FIELDS if item.get(k) not in (None, "")}
+    }
+
+
+class MenuStore:
+    def __init__(self, users_table, items_table=None, clock=time.monotonic):
+        self.users_table = users_table
+        self.items_table = items_table or boto3.resource("dynamodb").Table(MENU_ITEMS_TABLE)
+        self.clock = clock
+        self.snapshots = OrderedDict()  # restaurant_id -> (checked_at, snapshot)
+
+    # Writes
+
+    def add_item(self, restaurant_id, fields):
+        self._migrate_legacy(restaurant_id)
+        item = _clean(fields)
+        if "name" not in item or "price" not in item:
+            raise InvalidMenuItem("A menu item needs a name and a price")
+        item_id = fields.get("item_id") or str(uuid.uuid4())
+        self.items_table.put_item(
+            Item={"restaurant_id": restaurant_id, "item_id": item_id, **item, "updatedAt": _now()},
+            ConditionExpression="attribute_not_exists(item_id)"
+        )
+        return item_id, self._bump(restaurant_id)
+
+    def update_item(self, restaurant_id, item_id, fields):
+        self._migrate_legacy(restaurant_id)
+        changes = _clean(fields)
+        if not changes:
+            raise InvalidMenuItem("Nothing to update")
+        changes["updatedAt"] = _now()
+        names = {f"#f{i}": k for i, k in enumerate(changes)}
+        values = {f":v{i}": v for i, v in enumerate(changes.values())}
+        try:
+            self.items_table.update_item(
+                Key={"restaurant_id": restaurant_id, "item_id": item_id},
+                UpdateExpression="SET " + ", ".join(f"#f{i} = :v{i}" for i in range(len(changes))),
+                ConditionExpression="attribute_exists(item_id)",
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values
+            )
+        except self.items_table.meta.client.exceptions.ConditionalCheckFailedException:
+            raise MenuItemNotFound(item_id)
+        return self._bump(restaurant_id)
+
+    def remove_item(self, restaurant_id, item_id):
+        self._migrate_legacy(restaurant_id)
+        try:
+            self.items_table.delete_item(
+                Key={"restaurant_id": restaurant_id, "item_id": item_id},
+                ConditionExpression="attribute_exists(item_id)"
+            )
+        except self.items_table.meta.client.exceptions.ConditionalCheckFailedException:
+            raise MenuItemNotFound(item_id)
+        return self._bump(restaurant_id)
+
+    # Reads
+
+    def version(self, restaurant_id):
+        """menuVersion, or None for a restaurant still on the legacy list (or no user at all)."""
+        item = self.users_table.get_item(
+            Key={"userId": restaurant_id},
+            ProjectionExpression="menuVersion"
+        ).get("Item") or {}
+        return int(item["menuVersion"]) if "menuVersion" in item else None
+
+    def snapshot(self, restaurant_id, version=None, legacy_menu=None):
+        """{"restaurantId", "version", "items": [compact item]}.
+
+        Pass `version` when the caller already read the user item, and
+        `legacy_menu` if that item still carries a menu list.
+        """
+        if legacy_menu is not None:
+            return {"restaurantId": restaurant_id, "version": 0, "items": [compact_item(i) for i in legacy_menu]}
+
+        cached = self.snapshots.get(restaurant_id)
+        now = self.clock()
+        if cached and version is None and now - cached[0] < SNAPSHOT_FRESH_SECONDS:
+            return cached[1]
+
+        if version is None:
+            version = self.version(restaurant_id)
+            if version is None:
+                legacy = self._legacy_menu(restaurant_id)
+                return self.snapshot(restaurant_id, legacy_menu=legacy or [])
+
+        if cached and cached[1]["version"] == version:
+            self.snapshots[restaurant_id] = (now, cached[1])
+            self.snapshots.move_to_end(restaurant_id)
+            return cached[1]
+
+        snapshot = {"restaurantId": restaurant_id, "version": version, "items": self.items(restaurant_id)}
+        self.snapshots[restaurant_id] = (now, snapshot)
+        self.snapshots.move_to_end(restaurant_id)
+        while len(self.snapshots) > SNAPSHOT_CACHE_MAX:
+            self.snapshots.popitem(last=False)
+        return snapshot
+
+    def items(self, restaurant_id):
+        kwargs = {"KeyConditionExpression": Key("restaurant_id").eq(restaurant_id)}
+        items = []
+        while True:
+            response = self.items_table.query(**kwargs)
+            items.extend(compact_item(i) for i in response.get("Items", []))
+            if "LastEvaluatedKey" not in response:
+                return items
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    # Internals
+
+    def _bump(self, restaurant_id):
+        try:
+            response = self.users_table.update_item(
+                Key={"userId": restaurant_id},
+                UpdateExpression="ADD menuVersion :one",
+                ConditionExpression="attribute_exists(userId)",
+                ExpressionAttributeValues={":one": 1},
+                ReturnValues="UPDATED_NEW"
+            )
+        except self.users_table.meta.client.exceptions.ConditionalCheckFailedException:
+            raise RestaurantNotFound(restaurant_id)
+        self.snapshots.pop(restaurant_id, None)
+        return int(response["Attributes"]["menuVersion"])
+
+    def _legacy_menu(self, restaurant_id):
+        item = self.users_table.get_item(
+            Key={"userId": restaurant_id},
+            ProjectionExpression="menu"
+        ).get("Item") or {}
+        return item.get("menu")
+
+    def _migrate_legacy(self, restaurant_id):
+        """Moves a legacy menu list into per-item records before the first per-item edit."""
+        user = self.users_table.get_item(
+            Key={"userId": restaurant_id},
+            ProjectionExpression="userId, menuVersion, menu"
+        ).get("Item")
+        if user is None:
+            raise RestaurantNotFound(restaurant_id)
+        if "menuVersion" in user:
+            return
+        legacy = user.get("menu") or []
+        with self.items_table.batch_writer() as batch:
+            for index, entry in enumerate(legacy):
+                item = {k: v for k, v in entry.items() if k in ITEM_FIELDS and v not in (None, "")}
+                if "price" in item:
+                    item["price"] = Decimal(str(item["price"]))
+                batch.put_item(Item={
+                    "restaurant_id": restaurant_id,
+                    "item_id": entry.get("item_id") or f"legacy-{index}",
+                    **item,
+                    "updatedAt": _now()
+                })
+        # Only the first migration wins; a concurrent one finds menuVersion already set
+        # and has rewritten the same item ids
+        try:
+            self.users_table.update_item(
+                Key={"userId": restaurant_id},
+                UpdateExpression="SET menuVersion = :one REMOVE menu",
+                ConditionExpression="attribute_exists(userId) AND attribute_not_exists(menuVersion)",
+                ExpressionAttributeValues={":one": 1}
+            )
+        except self.users_table.meta.client.exceptions.ConditionalCheckFailedException:
+            pass
+        print(f"Migrated {len(legacy)} menu item(s) for {restaurant_id} to {MENU_ITEMS_TABLE}")
+
+
+def _now():
+    return time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
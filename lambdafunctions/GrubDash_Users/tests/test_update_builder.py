@@ -0,0 +1,127 @@
+import os
+import sys
+import unittest
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from update_builder import InvalidUpdate, UpdateBuilder, from_body  # noqa: E402
+
+
+class UpdateBuilderTest(unittest.TestCase):
+    def test_set_uses_placeholders_for_names_and_values(self):
+        kwargs = UpdateBuilder().set("name", "Pizza Palace").set("location.lat", 40.7).build()
+        self.assertEqual(kwargs["UpdateExpression"], "SET #n0 = :v0, #n1.#n2 = :v1")
+        self.assertEqual(kwargs["ExpressionAttributeNames"], {"#n0": "name", "#n1": "location", "#n2": "lat"})
+        self.assertEqual(kwargs["ExpressionAttributeValues"], {":v0": "Pizza Palace", ":v1": Decimal("40.7")})
+        self.assertNotIn("ConditionExpression", kwargs)
+
+    def test_repeated_names_share_a_placeholder(self):
+        kwargs = UpdateBuilder().set("address.city", "NYC").set("location.city", "NYC").build()
+        self.assertEqual(kwargs["UpdateExpression"], "SET #n0.#n1 = :v0, #n2.#n1 = :v1")
+
+    def test_list_index_stays_outside_the_placeholder(self):
+        kwargs = UpdateBuilder().set("tags[2]", "vegan").build()
+        self.assertEqual(kwargs["UpdateExpression"], "SET #n0[2] = :v0")
+
+    def test_floats_become_decimals_when_nested(self):
+        kwargs = UpdateBuilder().set("location", {"lat": 1.5, "points": [2.25]}).build()
+        self.assertEqual(kwargs["ExpressionAttributeValues"][":v0"], {"lat": Decimal("1.5"), "points": [Decimal("2.25")]})
+
+    def test_remove_append_and_bump_clauses(self):
+        kwargs = UpdateBuilder().append("tags", ["late-night"]).remove("promo").bump("version").build()
+        self.assertEqual(
+            kwargs["UpdateExpression"],
+            "SET #n0 = list_append(if_not_exists(#n0, :v0), :v1) REMOVE #n1 ADD #n2 :v2"
+        )
+        self.assertEqual(kwargs["ExpressionAttributeValues"], {":v0": [], ":v1": ["late-night"], ":v2": 1})
+
+    def test_protected_attribute_rejected_but_bump_allowed(self):
+        with self.assertRaises(InvalidUpdate):
+            UpdateBuilder().set("userId", "someone-else")
+        with self.assertRaises(InvalidUpdate):
+            UpdateBuilder(protected=("userId", "version")).remove("version")
+        UpdateBuilder(protected=("userId", "version")).bump("version").build()
+
+    def test_overlapping_paths_rejected(self):
+        for first, second in [("location", "location.lat"), ("location.lat", "location"),
+                              ("tags[0]", "tags"), ("name", "name")]:
+            with self.subTest(first=first, second=second), self.assertRaises(InvalidUpdate):
+                UpdateBuilder().set(first, 1).set(second, 2)
+        UpdateBuilder().set("location.lat", 1).set("location.lon", 2).set("tags[0]", 3).set("tags[1]", 4)
+
+    def test_invalid_paths_rejected(self):
+        for path in ["", "a..b", "1abc", "a.b[x]", "a b", None]:
+            with self.subTest(path=path), self.assertRaises(InvalidUpdate):
+                UpdateBuilder().set(path, 1)
+
+    def test_append_needs_a_list(self):
+        with self.assertRaises(InvalidUpdate):
+            UpdateBuilder().append("tags", "late-night")
+
+    def test_expect_version(self):
+        kwargs = UpdateBuilder().set("name", "x").expect_version(7).build()
+        self.assertEqual(kwargs["ConditionExpression"], "#n1 = :v1")
+        self.assertEqual(kwargs["ExpressionAttributeNames"]["#n1"], "version")
+        self.assertEqual(kwargs["ExpressionAttributeValues"][":v1"], 7)
+
+    def test_expect_version_zero_matches_missing_attribute(self):
+        kwargs = UpdateBuilder().set("name", "x").expect_version(0).build()
+        self.assertEqual(kwargs["ConditionExpression"], "(attribute_not_exists(#n1) OR #n1 = :v1)")
+
+    def test_expect_version_rejects_non_integers(self):
+        for expected in [-1, 1.5, "3", True]:
+            with self.subTest(expected=expected), self.assertRaises(InvalidUpdate):
+                UpdateBuilder().expect_version(expected)
+
+    def test_conditions_are_anded(self):
+        kwargs = UpdateBuilder().set("name", "x").require_absent("deletedAt").expect_version(2).build()
+        self.assertEqual(kwargs["ConditionExpression"], "attribute_not_exists(#n1) AND #n2 = :v1")
+
+    def test_touches(self):
+        builder = UpdateBuilder().set("location.lat", 1).remove("promo")
+        self.assertTrue(builder.touches("location"))
+        self.assertTrue(builder.touches("promo"))
+        self.assertFalse(builder.touches("lat"))
+
+    def test_empty_update_rejected(self):
+        with self.assertRaises(InvalidUpdate):
+            UpdateBuilder().build()
+        with self.assertRaises(InvalidUpdate):
+            UpdateBuilder().expect_version(1).build()
+
+
+class FromBodyTest(unittest.TestCase):
+    def test_full_body(self):
+        kwargs = from_body({
+            "name": "Pizza Palace",
+            "$remove": ["promo"],
+            "$append": {"tags": ["late-night"]},
+            "expected_version": 3
+        }).build()
+        self.assertEqual(
+            kwargs["UpdateExpression"],
+            "SET #n0 = :v0, #n2 = list_append(if_not_exists(#n2, :v1), :v2) REMOVE #n1"
+        )
+        self.assertEqual(kwargs["ExpressionAttributeNames"],
+                         {"#n0": "name", "#n1": "promo", "#n2": "tags", "#n3": "version"})
+        self.assertEqual(kwargs["ConditionExpression"], "#n3 = :v3")
+
+    def test_control_keys_are_not_set(self):
+        kwargs = from_body({"name": "x", "expected_version": None}).build()
+        self.assertEqual(kwargs["UpdateExpression"], "SET #n0 = :v0")
+        self.assertNotIn("ConditionExpression", kwargs)
+
+    def test_malformed_bodies(self):
+        for body in [[], "name", {"$remove": "promo"}, {"$append": ["tags"]}, {"$append": {"tags": "x"}},
+                     {"userId": "u2"}, {"name": "x", "$remove": ["name"]}, {}]:
+            with self.subTest(body=body), self.assertRaises(InvalidUpdate):
+                from_body(body).build()
+
+    def test_custom_protected_attributes(self):
+        with self.assertRaises(InvalidUpdate):
+            from_body({"version": 9}, protected=("userId", "version"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+"""Builds DynamoDB UpdateItem expressions from request bodies.
+
+Every attribute name goes through its own placeholder (#n0, #n1, ...) and
+every value through its own (:v0, :v1, ...), so reserved words and names that
+share a prefix never collide. Paths may be nested (`location.lat`) and index
+into lists (`tags[0]`).
+
+A PUT body is a map of path -> value to SET, plus optional control keys:
+
+    {
+        "name": "Pizza Palace",
+        "location.lat": 40.7,
+        "$remove": ["promo"],
+        "$append": {"tags": ["late-night"]},
+        "expected_version": 7
+    }
+
+`expected_version` makes the write conditional on the item's current
+`version`, so two dashboards editing the same restaurant can't silently
+overwrite each other; the caller maps the failed condition to a 409.
+"""
+import re
+from decimal import Decimal
+
+SEGMENT_PATTERN = re.compile(r"^([A-Za-z_][A-Za-z0-9_-]*)((?:\[\d+\])*)$")
+
+REMOVE_KEY = "$remove"
+APPEND_KEY = "$append"
+EXPECTED_VERSION_KEY = "expected_version"
+CONTROL_KEYS = (REMOVE_KEY, APPEND_KEY, EXPECTED_VERSION_KEY)
+
+
+class InvalidUpdate(Exception):
+    pass
+
+
+def _to_dynamo(value):
+    """boto3 rejects floats; JSON numbers arrive as them."""
+    if isinstance(value, float):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {k: _to_dynamo(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_to_dynamo(v) for v in value]
+    return value
+
+
+def _split(path):
+    """'location.coords[0]' -> [('location', ''), ('coords', '[0]')]"""
+    if not isinstance(path, str) or not path:
+        raise InvalidUpdate(f"Invalid attribute path: {path!r}")
+    segments = []
+    for part in path.split("."):
+        match = SEGMENT_PATTERN.match(part)
+        if not match:
+            raise InvalidUpdate(f"Invalid attribute path: {path!r}")
+        segments.append(match.groups())
+    return segments
+
+
+class UpdateBuilder:
+    def __init__(self, protected=("userId",)):
+        self.protected = set(protected)
+        self.names = {}   # placeholder -> attribute name
+        self.placeholders = {}  # attribute name -> placeholder
+        self.values = {}
+        self.sets = []
+        self.removes = []
+        self.adds = []
+        self.conditions = []
+        self.paths = []  # flattened paths already written, for overlap checks
+
+    # Placeholders
+
+    def name(self, attribute):
+        if attribute not in self.placeholders:
+            placeholder = f"#n{len(self.placeholders)}"
+            self.placeholders[attribute] = placeholder
+            self.names[placeholder] = attribute
+        return self.placeholders[attribute]
+
+    def value(self, value):
+        placeholder = f":v{len(self.values)}"
+        self.values[placeholder] = _to_dynamo(value)
+        return placeholder
+
+    # Actions
+
+    def set(self, path, value):
+        self.sets.append(f"{self._target(path)} = {self.value(value)}")
+        return self
+
+    def remove(self, path):
+        self.removes.append(self._target(path))
+        return self
+
+    def append(self, path, values):
+        if not isinstance(values, list):
+            raise InvalidUpdate(f"{APPEND_KEY} values for {path!r} must be a list")
+        target = self._target(path)
+        self.sets.append(f"{target} = list_append(if_not_exists({target}, {self.value([])}), {self.value(values)})")
+        return self
+
+    def bump(self, attribute):
+        """ADD 1 to a server-managed counter; protected attributes are allowed here."""
+        self.adds.append(f"{self.name(attribute)} {self.value(1)}")
+        return self
+
+    # Conditions
+
+    def expect_version(self, expected, attribute="version"):
+        """Only applies if `attribute` equals `expected`; 0 also matches an item that has none yet."""
+        if isinstance(expected, bool) or not isinstance(expected, int) or expected < 0:
+            raise InvalidUpdate(f"{EXPECTED_VERSION_KEY} must be a non-negative integer")
+        version = self.name(attribute)
+        condition = f"{version} = {self.value(expected)}"
+        if expected == 0:
+            condition = f"(attribute_not_exists({version}) OR {condition})"
+        self.conditions.append(condition)
+        return self
+
+    def require_absent(self, attribute):
+        self.conditions.append(f"attribute_not_exists({self.name(attribute)})")
+        return self
+
+    def touches(self, attribute):
+        """True if any write targets the top-level `attribute` or something under it."""
+        return any(p[0] == attribute for p in self.paths)
+
+    def build(self):
+        """UpdateItem keyword arguments, without Key/TableName."""
+        clauses = []
+        if self.sets:
+            clauses.append("SET " + ", ".join(self.sets))
+        if self.removes:
+            clauses.append("REMOVE " + ", ".join(self.removes))
+        if self.adds:
+            clauses.append("ADD " + ", ".join(self.adds))
+        if not clauses:
+            raise InvalidUpdate("Nothing to update")
+        kwargs = {"UpdateExpression": " ".join(clauses), "ExpressionAttributeNames": dict(self.names)}
+        if self.values:
+            kwargs["ExpressionAttributeValues"] = dict(self.values)
+        if self.conditions:
+            kwargs["ConditionExpression"] = " AND ".join(self.conditions)
+        return kwargs
+
+    def _target(self, path):
+        """Placeholder path for a write, refusing keys and paths that overlap one already written."""
+        segments = _split(path)
+        if segments[0][0] in self.protected:
+            raise InvalidUpdate(f"{segments[0][0]} can't be updated")
+        flat = tuple(part for name, index in segments for part in [name] + re.findall(r"\[\d+\]", index))
+        for other in self.paths:
+            shorter = min(len(flat), len(other))
+            if flat[:shorter] == other[:shorter]:
+                raise InvalidUpdate(f"Overlapping updates to {path!r}")
+        self.paths.append(flat)
+        return ".".join(self.name(name) + index for name, index in segments)
+
+
+def from_body(body, protected=("userId",)):
+    """UpdateBuilder for a PUT body; see the module docstring for the format."""
+    if not isinstance(body, dict):
+        raise InvalidUpdate("Update body must be a JSON object")
+    builder = UpdateBuilder(protected)
+    for path, value in body.items():
+        if path not in CONTROL_KEYS:
+            builder.set(path, value)
+
+    removes = body.get(REMOVE_KEY) or []
+    if not isinstance(removes, list):
+        raise InvalidUpdate(f"{REMOVE_KEY} must be a list of paths")
+    for path in removes:
+        builder.remove(path)
+
+    appends = body.get(APPEND_KEY) or {}
+    if not isinstance(appends, dict):
+        raise InvalidUpdate(f"{APPEND_KEY} must map paths to lists")
+    for path, values in appends.items():
+        builder.append(path, values)
+
+    if body.get(EXPECTED_VERSION_KEY) is not None:
+        builder.expect_version(body[EXPECTED_VERSION_KEY])
+    return builder
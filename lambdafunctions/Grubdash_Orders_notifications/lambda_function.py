@@ -2,39 +2,109 @@
 import boto3
 import json
 import os
+from botocore.config import Config
+from concurrent.futures import ThreadPoolExecutor
+from connection_registry import ConnectionRegistry
 
 TABLE_NAME = os.environ['TABLE_NAME']
 API_GW_ENDPOINT = os.environ['API_GW_ENDPOINT']
 
+# Orders per WebSocket frame
+MAX_BATCH_ORDERS = int(os.environ.get('NOTIFICATION_MAX_BATCH', '25'))
+SEND_WORKERS = int(os.environ.get('NOTIFICATION_SEND_WORKERS', '8'))
+
 dynamodb = boto3.resource('dynamodb')
 table = dynamodb.Table(TABLE_NAME)
 
+# Short timeouts so one slow tablet can only hold up its own send
 apigw = boto3.client(
     'apigatewaymanagementapi',
-    endpoint_url=API_GW_ENDPOINT
+    endpoint_url=API_GW_ENDPOINT,
+    config=Config(connect_timeout=2, read_timeout=3, retries={'max_attempts': 2})
 )
 
-def lambda_handler(event, context):
-    print(event)
-    # data = json.loads(event)  # e.g., {"restaurantId": "r1", "orderId": "...", "status": "NEW_ORDER"}
-    data = event
-    restaurant_id = data['restaurantId']
-    # order_id = data['orderId']
-    # status = data['status']
-
-    # Query connections for that restaurantId
-    response = table.query(
-        IndexName='restaurantId-index',
-        KeyConditionExpression=boto3.dynamodb.conditions.Key('restaurantId').eq(restaurant_id)
-    )
-
-    for conn in response['Items']:
+# restaurantId -> connections, cached per warm container
+connections = ConnectionRegistry(table, 'restaurant')
+
+def build_frames(restaurant_id, orders):
+    # A lone order keeps the original single-order payload
+    if len(orders) == 1:
+        return [orders[0]]
+    return [
+        {
+            "type": "orders_batch",
+            "restaurantId": restaurant_id,
+            "orders": orders[start:start + MAX_BATCH_ORDERS]
+        }
+        for start in range(0, len(orders), MAX_BATCH_ORDERS)
+    ]
+
+def deliver(restaurant_id, connection_id, entries):
+    """Sends [(messageId, order)] to one connection.
+
+    Returns ('sent' | 'gone' | 'failed', messageIds of the orders not sent)."""
+    orders = [order for _, order in entries]
+    sent_orders = 0
+    for frame in build_frames(restaurant_id, orders):
         try:
             apigw.post_to_connection(
-                ConnectionId=conn['connectionId'],
-                Data=json.dumps(data).encode('utf-8')
+                ConnectionId=connection_id,
+                Data=json.dumps(frame, default=str).encode('utf-8')
             )
+            sent_orders += len(frame.get("orders", [frame]))
         except apigw.exceptions.GoneException:
-            table.delete_item(Key={'connectionId': conn['connectionId']})
+            return 'gone', []
+        except Exception as e:
+            # Throttled or timed out: stop here without stalling the other connections
+            print(f"[BACKPRESSURE] {connection_id}: {e}")
+            return 'failed', [message_id for message_id, _ in entries[sent_orders:]]
+    return 'sent', []
+
+def lambda_handler(event, context):
+    print(event)
+    # data = json.loads(event)  # e.g., {"restaurantId": "r1", "orderId": "...", "status": "NEW_ORDER"}
+
+    # SQS-batched notifications (the event source batching window is the aggregation
+    # window), or a single direct invocation
+    from_queue = 'Records' in event
+    if from_queue:
+        notifications = [(record['messageId'], json.loads(record['body'])) for record in event['Records']]
+    else:
+        notifications = [(None, event)]
+
+    by_restaurant = {}
+    for message_id, data in notifications:
+        by_restaurant.setdefault(data['restaurantId'], []).append((message_id, data))
+
+    # Connections for every restaurant in the batch
+    jobs = [
+        (restaurant_id, conn['connectionId'], by_restaurant[restaurant_id])
+        for restaurant_id, conns in connections.get_many(by_restaurant.keys()).items()
+        for conn in conns
+    ]
+
+    if jobs:
+        with ThreadPoolExecutor(max_workers=min(SEND_WORKERS, len(jobs))) as pool:
+            results = list(pool.map(lambda job: deliver(*job), jobs))
+    else:
+        results = []
+
+    # An order a live connection didn't get goes back to the queue; the orders page
+    # drops orderIds it already shows, so connections that did get it see no duplicate
+    undelivered = set()
+    for (restaurant_id, connection_id, _), (result, unsent) in zip(jobs, results):
+        if result == 'gone':
+            connections.remove(restaurant_id, connection_id)
+        undelivered.update(unsent)
+
+    statuses = [result for result, _ in results]
+    print(f"Delivered {len(notifications)} notification(s) over {len(jobs)} connection(s): "
+          f"{statuses.count('sent')} sent, {statuses.count('failed')} failed, {statuses.count('gone')} gone; "
+          f"{len(undelivered)} notification(s) to retry")
+    print("Connection cache stats:", connections.stats())
 
-    return { 'statusCode': 200 }
\ No newline at end of file
+    if from_queue:
+        return {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in sorted(undelivered)]}
+    if undelivered:
+        raise RuntimeError("Order notification was not delivered")
+    return { 'statusCode': 200 }
@@ -4,10 +4,12 @@ from datetime import datetime, timezone, timedelta
 from boto3.dynamodb.conditions import Key
 import os
 from decimal import Decimal
+from trace_store import get_trace_store, read_route
 
 dynamodb = boto3.resource("dynamodb")
 DELIVERY_TABLE = os.environ["DELIVERY_TABLE"]
 delivery_table = dynamodb.Table(DELIVERY_TABLE)
+trace_store = get_trace_store()
 
 def json_safe(data):
     if isinstance(data, list):
@@ -60,6 +62,24 @@ def lambda_handler(event, context):
             "body": json.dumps(json_safe(item))
         }
 
+    elif len(path_parts) == 3 and path_parts[0] == "partners" and path_parts[2] == "trace":
+        # GET /partners/{delivery_id}/trace → full driver route in one read
+        delivery_id = path_parts[1]
+        if not trace_store:
+            return {"statusCode": 404, "body": json.dumps({"error": "Trace history not enabled"})}
+
+        route = read_route(trace_store, delivery_id)
+        if not route:
+            return {"statusCode": 404, "body": json.dumps({"error": "Trace not found"})}
+
+        return {
+            "statusCode": 200,
+            "body": json.dumps({
+                "delivery_id": delivery_id,
+                "points": [[round(lat, 6), round(lng, 6), ts] for lat, lng, ts in route]
+            })
+        }
+
     else:
         return {
             "statusCode": 400,
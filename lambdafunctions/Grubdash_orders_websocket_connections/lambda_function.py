@@ -3,10 +3,16 @@ import time
 import json
 import os
 
+# Location wire formats understood by Grubdash_stream_location_updates
+SUPPORTED_FORMATS = {'json', 'compact'}
+
 dynamodb = boto3.resource('dynamodb')
 TABLE_NAME = os.environ['TABLE_NAME']
 table = dynamodb.Table(TABLE_NAME)
 
+# Records expire unless a heartbeat refreshes them; matches API Gateway's 10 min idle timeout
+CONNECTION_TTL_SECONDS = int(os.environ.get('CONNECTION_TTL_SECONDS', '600'))
+
 def lambda_handler(event, context):
     print("Connecting...")
     print(event)
@@ -15,30 +21,30 @@ def lambda_handler(event, context):
     query_params = event.get('queryStringParameters', {})
     restaurant_id = query_params.get('restaurantId')
     customer_id = query_params.get('customerId')
+    wire_format = query_params.get('format', 'json')
 
     if not restaurant_id and not customer_id:
         return { 'statusCode': 400, 'body': 'Missing restaurantId or customerId' }
 
+    if wire_format not in SUPPORTED_FORMATS:
+        return { 'statusCode': 400, 'body': f'Unsupported format: {wire_format}' }
+
     user_type = 'restaurant' if restaurant_id else 'customer'
     user_id = restaurant_id or customer_id
-    index_name = f"{user_type}Id-index"
     id_key = f"{user_type}Id"
-    
-    response = table.query(
-        IndexName=index_name,
-        KeyConditionExpression=boto3.dynamodb.conditions.Key(id_key).eq(user_id)
-    )
-
-    for item in response.get('Items', []):
-        old_id = item['connectionId']
-        if old_id != connection_id:
-            table.delete_item(Key={'connectionId': old_id})
-            print(f"Deleted old connection: {old_id}")
-
-    response = table.put_item(Item={
+
+    # Several live connections per user are fine (e.g. two restaurant tablets);
+    # stale ones age out through expiresAt and the connection sweeper
+    now = time.time()
+    item = {
         'connectionId': connection_id,
         id_key: user_id,
-        'timestamp': int(time.time() * 1000)
-    })
+        'timestamp': int(now * 1000),
+        'expiresAt': int(now) + CONNECTION_TTL_SECONDS
+    }
+    if wire_format != 'json':
+        item['format'] = wire_format
+
+    response = table.put_item(Item=item)
     print("Connection saved to DynamoDB:", response)
     return { 'statusCode': 200 }
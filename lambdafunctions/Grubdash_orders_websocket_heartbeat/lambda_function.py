@@ -0,0 +1,27 @@
+import boto3
+import os
+import time
+
+dynamodb = boto3.resource('dynamodb')
+TABLE_NAME = os.environ['TABLE_NAME']
+table = dynamodb.Table(TABLE_NAME)
+
+CONNECTION_TTL_SECONDS = int(os.environ.get('CONNECTION_TTL_SECONDS', '600'))
+
+# Route: {"action": "heartbeat"} — pushes the connection's expiresAt forward
+def lambda_handler(event, context):
+    connection_id = event['requestContext']['connectionId']
+
+    try:
+        table.update_item(
+            Key={'connectionId': connection_id},
+            UpdateExpression='SET expiresAt = :e',
+            ConditionExpression='attribute_exists(connectionId)',
+            ExpressionAttributeValues={':e': int(time.time()) + CONNECTION_TTL_SECONDS}
+        )
+    except dynamodb.meta.client.exceptions.ConditionalCheckFailedException:
+        # Already swept; the client will reconnect once API Gateway drops the socket
+        print(f"Heartbeat for unknown connection {connection_id}")
+        return { 'statusCode': 410 }
+
+    return { 'statusCode': 200 }
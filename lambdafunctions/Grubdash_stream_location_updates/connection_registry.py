@@ -0,0 +1,106 @@
+"""Warm-container cache of WebSocket connections per user.
+
+Senders used to query the connections GSI for every message they pushed. The
+registry keeps user -> [connection item] for a short TTL (empty results too,
+so users without an open socket don't cost a query each time), drops a
+connection as soon as API Gateway reports it gone, and resolves many users
+at once with concurrent GSI queries for the cache misses.
+"""
+import os
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+CACHE_TTL_SECONDS = float(os.environ.get("CONNECTION_CACHE_TTL_SECONDS", "5"))
+CACHE_MAX_USERS = int(os.environ.get("CONNECTION_CACHE_MAX_USERS", "10000"))
+LOOKUP_WORKERS = int(os.environ.get("CONNECTION_LOOKUP_WORKERS", "8"))
+
+
+class ConnectionRegistry:
+    def __init__(self, table, user_type, ttl_seconds=CACHE_TTL_SECONDS,
+                 max_users=CACHE_MAX_USERS, clock=time.monotonic):
+        self.table = table
+        self.index_name = f"{user_type}Id-index"
+        self.id_key = f"{user_type}Id"
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        self.clock = clock
+        self.cache = OrderedDict()  # user_id -> (expires_at, [item])
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id):
+        return self.get_many([user_id])[user_id]
+
+    def get_many(self, user_ids):
+        """Returns {user_id: [connection item]} for every requested user."""
+        now = self.clock()
+        result = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            cached = self.cache.get(user_id)
+            if cached and cached[0] > now:
+                self.cache.move_to_end(user_id)
+                result[user_id] = list(cached[1])
+                self.hits += 1
+            else:
+                missing.append(user_id)
+                self.misses += 1
+
+        if len(missing) == 1:
+            fetched = [self._query(missing[0])]
+        elif missing:
+            # The resource's client is thread-safe, unlike the Table resource
+            with ThreadPoolExecutor(max_workers=min(LOOKUP_WORKERS, len(missing))) as pool:
+                fetched = list(pool.map(self._query, missing))
+        else:
+            fetched = []
+
+        expires_at = self.clock() + self.ttl_seconds
+        for user_id, items in zip(missing, fetched):
+            self._store(user_id, expires_at, items)
+            result[user_id] = list(items)
+        return result
+
+    def remove(self, user_id, connection_id):
+        """Forgets a connection API Gateway reported as gone and deletes its record."""
+        cached = self.cache.get(user_id)
+        if cached:
+            remaining = [i for i in cached[1] if i["connectionId"] != connection_id]
+            self.cache[user_id] = (cached[0], remaining)
+        self.table.delete_item(Key={"connectionId": connection_id})
+
+    def invalidate(self, user_id):
+        self.cache.pop(user_id, None)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "cached_users": len(self.cache)}
+
+    def _store(self, user_id, expires_at, items):
+        self.cache[user_id] = (expires_at, items)
+        self.cache.move_to_end(user_id)
+        while len(self.cache) > self.max_users:
+            self.cache.popitem(last=False)
+
+    def _query(self, user_id):
+        # Same Python-type conversion as the Table resource, so values stay native
+        client = self.table.meta.client
+        kwargs = {
+            "TableName": self.table.name,
+            "IndexName": self.index_name,
+            "KeyConditionExpression": "#k = :v",
+            "ExpressionAttributeNames": {"#k": self.id_key},
+            "ExpressionAttributeValues": {":v": user_id}
+        }
+        items = []
+        now = time.time()
+        while True:
+            response = client.query(**kwargs)
+            for item in response.get("Items", []):
+                # Heartbeat lapsed but the sweeper hasn't deleted it yet
+                if "expiresAt" in item and item["expiresAt"] < now:
+                    continue
+                items.append(item)
+            if "LastEvaluatedKey" not in response:
+                return items
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
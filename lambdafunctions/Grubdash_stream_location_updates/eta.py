@@ -0,0 +1,69 @@
+import math
+import os
+from collections import OrderedDict
+from location_filter import haversine_m
+
+# Tunables (overridable per deployment)
+SPEED_TAU_SECONDS = float(os.environ.get("ETA_SPEED_TAU_SECONDS", "30"))
+DEFAULT_SPEED_MPS = float(os.environ.get("ETA_DEFAULT_SPEED_MPS", "6"))  # ~13 mph city driving
+MIN_SPEED_MPS = float(os.environ.get("ETA_MIN_SPEED_MPS", "1.5"))  # keeps ETA finite at red lights
+ROUTE_FACTOR = float(os.environ.get("ETA_ROUTE_FACTOR", "1.3"))  # street grid vs straight line
+MAX_TRACKED = int(os.environ.get("ETA_MAX_TRACKED", "5000"))
+
+# Faster than this between two fixes is a GPS jump, not driving
+MAX_PLAUSIBLE_SPEED_MPS = 45.0
+
+
+class EtaEstimator:
+    """Rolling per-delivery ETA, O(1) per point.
+
+    Speed is an exponentially weighted moving average whose weight depends on
+    the time since the previous point (time constant SPEED_TAU_SECONDS), so
+    irregular GPS intervals are handled. Remaining distance is the haversine
+    distance to the destination scaled by ROUTE_FACTOR.
+    """
+
+    def __init__(self, tau_seconds=SPEED_TAU_SECONDS, default_speed=DEFAULT_SPEED_MPS,
+                 min_speed=MIN_SPEED_MPS, route_factor=ROUTE_FACTOR, max_tracked=MAX_TRACKED):
+        self.tau_seconds = tau_seconds
+        self.default_speed = default_speed
+        self.min_speed = min_speed
+        self.route_factor = route_factor
+        self.max_tracked = max_tracked
+        self.state = OrderedDict()  # key -> [dest_lat, dest_lng, lat, lng, timestamp, speed]
+
+    def has_destination(self, key):
+        return key in self.state
+
+    def set_destination(self, key, lat, lng):
+        entry = self.state.get(key)
+        if entry:
+            entry[0], entry[1] = float(lat), float(lng)
+        else:
+            self.state[key] = [float(lat), float(lng), None, None, None, None]
+            while len(self.state) > self.max_tracked:
+                self.state.popitem(last=False)
+        self.state.move_to_end(key)
+
+    def update(self, key, lat, lng, timestamp):
+        """Feeds one point and returns eta_seconds, or None without a destination."""
+        entry = self.state.get(key)
+        if entry is None:
+            return None
+        self.state.move_to_end(key)
+        lat, lng, timestamp = float(lat), float(lng), int(timestamp)
+        dest_lat, dest_lng, prev_lat, prev_lng, prev_ts, speed = entry
+
+        if prev_ts is not None and timestamp > prev_ts:
+            dt = (timestamp - prev_ts) / 1000.0
+            sample = haversine_m(prev_lat, prev_lng, lat, lng) / dt
+            if sample <= MAX_PLAUSIBLE_SPEED_MPS:
+                alpha = 1.0 - math.exp(-dt / self.tau_seconds)
+                speed = sample if speed is None else speed + alpha * (sample - speed)
+
+        if prev_ts is None or timestamp > prev_ts:
+            entry[2], entry[3], entry[4], entry[5] = lat, lng, timestamp, speed
+
+        remaining = haversine_m(lat, lng, dest_lat, dest_lng) * self.route_factor
+        effective_speed = max(speed if speed is not None else self.default_speed, self.min_speed)
+        return int(round(remaining / effective_speed))
@@ -2,14 +2,92 @@ import boto3
 import os
 import json
 import time
+from collections import OrderedDict
+from location_filter import LocationFilter
+from location_codec import FORMAT_COMPACT, build_batch_frame
+from trace_store import TraceWriter, get_trace_store
+from eta import EtaEstimator
+from connection_registry import ConnectionRegistry
 
 dynamodb = boto3.resource('dynamodb')
 apigw = boto3.client('apigatewaymanagementapi', endpoint_url=os.environ['WEBSOCKET_ENDPOINT'])
 
 TABLE_NAME = os.environ['TABLE_NAME']
 table = dynamodb.Table(TABLE_NAME)
+ORDERS_TABLE = os.environ.get('ORDERS_TABLE')
+orders_table = dynamodb.Table(ORDERS_TABLE) if ORDERS_TABLE else None
+
+# customerId -> connections, cached briefly instead of querying the GSI per message
+connections = ConnectionRegistry(table, 'customer')
+
+# Kept at module level so dead-band state survives across warm invocations
+location_filter = LocationFilter()
+
+# Optional route history (TRACE_TABLE or TRACE_DIR); every point is kept, not just forwarded ones
+trace_store = get_trace_store()
+
+# Rolling speed + remaining distance per delivery, also kept across warm invocations
+eta_estimator = EtaEstimator()
+
+# Orders with no usable delivery_location (or whose lookup failed), so a delivery
+# without one costs one GetItem per TTL instead of one per location point
+DESTINATION_MISS_TTL_SECONDS = float(os.environ.get('DESTINATION_MISS_TTL_SECONDS', '60'))
+DESTINATION_MISS_MAX = 5000
+destination_misses = OrderedDict()  # orderId -> expires_at
+
+def lookup_destination(order_id):
+    expires_at = destination_misses.get(order_id)
+    if expires_at and expires_at > time.monotonic():
+        return None
+    destination = None
+    try:
+        order = orders_table.get_item(
+            Key={'order_id': order_id},
+            ProjectionExpression='delivery_location'
+        ).get('Item')
+        destination = (order or {}).get('delivery_location')
+    except Exception as e:
+        # The ETA is optional; the point is still pushed without one
+        print(f"Error looking up destination for order {order_id}:", e)
+    if not destination:
+        destination_misses[order_id] = time.monotonic() + DESTINATION_MISS_TTL_SECONDS
+        destination_misses.move_to_end(order_id)
+        while len(destination_misses) > DESTINATION_MISS_MAX:
+            destination_misses.popitem(last=False)
+    return destination
+
+def ensure_destination(eta_key, body):
+    """Resolves the drop-off point once per delivery: from the message, else the order."""
+    if eta_estimator.has_destination(eta_key):
+        return
+    destination = body.get('destination')
+    if not destination and orders_table and body.get('orderId'):
+        destination = lookup_destination(body['orderId'])
+    if not destination:
+        return
+    lat = destination.get('latitude', destination.get('lat'))
+    lng = destination.get('longitude', destination.get('lng'))
+    if lat is not None and lng is not None:
+        eta_estimator.set_destination(eta_key, lat, lng)
+
+def send(customer_id, connection_id, message):
+    try:
+        apigw.post_to_connection(
+            ConnectionId=connection_id,
+            Data=json.dumps(message, separators=(',', ':')).encode('utf-8')
+        )
+        return True
+    except apigw.exceptions.GoneException:
+        print(f"Stale connection {connection_id}, deleting...")
+        connections.remove(customer_id, connection_id)
+        return False
 
 def lambda_handler(event, context):
+    # customerId -> [(lat, lng, timestamp, eta_seconds)], in arrival order
+    pending = {}
+    trace_writer = TraceWriter(trace_store) if trace_store else None
+    untraced = 0
+
     for record in event['Records']:
         print("Processing record:", record)
         try:
@@ -24,32 +102,75 @@ def lambda_handler(event, context):
                 print("Missing required fields:", body)
                 continue
 
-            # Lookup WebSocket connection for customerId
-            response = table.query(
-                IndexName='customerId-index',
-                KeyConditionExpression=boto3.dynamodb.conditions.Key('customerId').eq(customer_id)
-            )
+            # Traces are read back per delivery; keyed by customer they'd mix deliveries and never be found
+            if trace_writer and body.get('deliveryId'):
+                trace_writer.add(body['deliveryId'], lat, lng, timestamp)
+            elif trace_writer:
+                untraced += 1
 
-            for item in response.get('Items', []):
-                connection_id = item['connectionId']
+            # Every point feeds the speed estimate, even ones the filter drops below
+            eta_key = body.get('orderId') or customer_id
+            ensure_destination(eta_key, body)
+            eta_seconds = eta_estimator.update(eta_key, lat, lng, timestamp)
 
-                message = {
-                    "type": "location_update",
-                    # "partnerId": partner_id,
-                    "lat": lat,
-                    "lng": lng,
-                    "timestamp": timestamp
-                }
-
-                try:
-                    apigw.post_to_connection(
-                        ConnectionId=connection_id,
-                        Data=json.dumps(message).encode('utf-8')
-                    )
-                    print(f"Sent location update to customer {customer_id}")
-                except apigw.exceptions.GoneException:
-                    print(f"Stale connection {connection_id}, deleting...")
-                    table.delete_item(Key={'connectionId': connection_id})
+            # Drop points that wouldn't visibly move the marker on the tracking map
+            filter_key = body.get('partnerId') or customer_id
+            if not location_filter.should_forward(filter_key, lat, lng, timestamp):
+                continue
+
+            pending.setdefault(customer_id, []).append((lat, lng, timestamp, eta_seconds))
 
         except Exception as e:
             print("Error processing record:", e)
+
+    # Lookup WebSocket connections for every customer in this batch at once
+    try:
+        connections_by_customer = connections.get_many(pending.keys()) if pending else {}
+    except Exception as e:
+        print("Error looking up connections:", e)
+        connections_by_customer = {}
+
+    for customer_id, items in connections_by_customer.items():
+        points = pending[customer_id]
+        try:
+            for item in items:
+                connection_id = item['connectionId']
+
+                # Compact clients get every point of this batch in a single frame
+                if item.get('format') == FORMAT_COMPACT:
+                    frame = build_batch_frame([p[:3] for p in points])
+                    if points[-1][3] is not None:
+                        frame["eta_seconds"] = points[-1][3]
+                    send(customer_id, connection_id, frame)
+                    continue
+
+                for lat, lng, timestamp, eta_seconds in points:
+                    message = {
+                        "type": "location_update",
+                        # "partnerId": partner_id,
+                        "lat": lat,
+                        "lng": lng,
+                        "timestamp": timestamp
+                    }
+                    if eta_seconds is not None:
+                        message["eta_seconds"] = eta_seconds
+                    if not send(customer_id, connection_id, message):
+                        break
+
+            print(f"Sent {len(points)} location update(s) to customer {customer_id}")
+
+        except Exception as e:
+            print(f"Error sending updates to customer {customer_id}:", e)
+
+    # Persist after the pushes so history writes stay off the customer-facing latency
+    if untraced:
+        print(f"{untraced} point(s) without a deliveryId were not traced")
+    if trace_writer:
+        try:
+            trace_writer.flush()
+            print(f"Trace chunks written: {trace_writer.chunks_written}")
+        except Exception as e:
+            print("Error writing trace chunks:", e)
+
+    print("Location filter stats:", location_filter.stats())
+    print("Connection cache stats:", connections.stats())
@@ -0,0 +1,193 @@
+"""Append-only store for driver location traces.
+
+Points are kept column-wise in packed arrays (float32 lat, float32 lng, int32
+ms deltas from the previous point) and written a chunk at a time, so a whole
+delivery route is a handful of items/records rather than one per point.
+
+Two backends share the same chunk encoding:
+  - DynamoTraceStore: table with trace_id (hash, string) + chunk_key (range,
+                      string: zero-padded first point ms + digest of the chunk)
+  - FileTraceStore:   one append-only file per trace under a directory
+"""
+import hashlib
+import os
+import struct
+from array import array
+
+TRACE_TABLE = os.environ.get("TRACE_TABLE")
+TRACE_DIR = os.environ.get("TRACE_DIR")
+CHUNK_POINTS = int(os.environ.get("TRACE_CHUNK_POINTS", "256"))
+
+# t0 (int64 ms) + point count (uint32), little endian
+_FILE_HEADER = struct.Struct("<qI")
+
+
+class TraceChunk:
+    def __init__(self, t0, lats, lngs, deltas):
+        self.t0 = int(t0)
+        self.lats = lats
+        self.lngs = lngs
+        self.deltas = deltas
+
+    @classmethod
+    def from_points(cls, points):
+        """points: (lat, lng, timestamp_ms) tuples, oldest first."""
+        lats, lngs, deltas = array("f"), array("f"), array("i")
+        t0 = prev = int(points[0][2])
+        for lat, lng, ts in points:
+            ts = int(ts)
+            lats.append(float(lat))
+            lngs.append(float(lng))
+            deltas.append(ts - prev)
+            prev = ts
+        return cls(t0, lats, lngs, deltas)
+
+    @classmethod
+    def from_bytes(cls, t0, lat_bytes, lng_bytes, delta_bytes):
+        lats, lngs, deltas = array("f"), array("f"), array("i")
+        lats.frombytes(lat_bytes)
+        lngs.frombytes(lng_bytes)
+        deltas.frombytes(delta_bytes)
+        return cls(t0, lats, lngs, deltas)
+
+    def __len__(self):
+        return len(self.lats)
+
+    def digest(self):
+        """Short content hash: equal chunks share it, different ones with the same t0 don't."""
+        h = hashlib.sha1()
+        for column in (self.lats, self.lngs, self.deltas):
+            h.update(column.tobytes())
+        return h.hexdigest()[:12]
+
+    def points(self):
+        ts = self.t0
+        for lat, lng, delta in zip(self.lats, self.lngs, self.deltas):
+            ts += delta
+            yield (lat, lng, ts)
+
+
+class DynamoTraceStore:
+    def __init__(self, table):
+        self.table = table
+
+    def append(self, trace_id, chunk):
+        # Keyed by first timestamp plus content, so an SQS redelivery of the same batch
+        # overwrites itself while two batches starting in the same millisecond both stay
+        self.table.put_item(Item={
+            "trace_id": str(trace_id),
+            "chunk_key": f"{chunk.t0:015d}#{chunk.digest()}",
+            "t0": chunk.t0,
+            "n": len(chunk),
+            "lat": chunk.lats.tobytes(),
+            "lng": chunk.lngs.tobytes(),
+            "dt": chunk.deltas.tobytes()
+        })
+
+    def read(self, trace_id):
+        from boto3.dynamodb.conditions import Key
+
+        chunks = []
+        kwargs = {"KeyConditionExpression": Key("trace_id").eq(str(trace_id))}
+        while True:
+            response = self.table.query(**kwargs)
+            for item in response.get("Items", []):
+                chunks.append(TraceChunk.from_bytes(
+                    item["t0"], _raw(item["lat"]), _raw(item["lng"]), _raw(item["dt"])
+                ))
+            if "LastEvaluatedKey" not in response:
+                return chunks
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+
+class FileTraceStore:
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, trace_id):
+        safe = "".join(c if c.isalnum() or c in "-_" else "_" for c in str(trace_id))
+        return os.path.join(self.directory, f"{safe}.trace")
+
+    def append(self, trace_id, chunk):
+        # Same identity as DynamoTraceStore's chunk_key: an SQS redelivery of a batch
+        # finds its chunk already written instead of appending it twice
+        key = (chunk.t0, chunk.digest())
+        if any((c.t0, c.digest()) == key for c in self.read(trace_id)):
+            return
+        record = (
+            _FILE_HEADER.pack(chunk.t0, len(chunk))
+            + chunk.lats.tobytes() + chunk.lngs.tobytes() + chunk.deltas.tobytes()
+        )
+        with open(self._path(trace_id), "ab") as f:
+            f.write(record)
+
+    def read(self, trace_id):
+        try:
+            with open(self._path(trace_id), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+
+        chunks = []
+        offset = 0
+        while offset + _FILE_HEADER.size <= len(data):
+            t0, n = _FILE_HEADER.unpack_from(data, offset)
+            offset += _FILE_HEADER.size
+            size = n * 4
+            lat_bytes = data[offset:offset + size]
+            lng_bytes = data[offset + size:offset + 2 * size]
+            delta_bytes = data[offset + 2 * size:offset + 3 * size]
+            offset += 3 * size
+            if len(delta_bytes) < size:
+                break  # torn final write
+            chunks.append(TraceChunk.from_bytes(t0, lat_bytes, lng_bytes, delta_bytes))
+        return chunks
+
+
+class TraceWriter:
+    """Buffers points per trace and writes them to the store in chunks."""
+
+    def __init__(self, store, chunk_points=CHUNK_POINTS):
+        self.store = store
+        self.chunk_points = chunk_points
+        self.buffers = {}
+        self.chunks_written = 0
+
+    def add(self, trace_id, lat, lng, timestamp):
+        buffer = self.buffers.setdefault(str(trace_id), [])
+        buffer.append((lat, lng, int(timestamp)))
+        if len(buffer) >= self.chunk_points:
+            self._write(trace_id)
+
+    def flush(self):
+        for trace_id in list(self.buffers):
+            self._write(trace_id)
+
+    def _write(self, trace_id):
+        points = self.buffers.pop(trace_id, None)
+        if not points:
+            return
+        points.sort(key=lambda p: p[2])
+        self.store.append(trace_id, TraceChunk.from_points(points))
+        self.chunks_written += 1
+
+
+def read_route(store, trace_id):
+    """Whole route for a trace as (lat, lng, timestamp) tuples in time order."""
+    chunks = sorted(store.read(trace_id), key=lambda c: c.t0)
+    return [point for chunk in chunks for point in chunk.points()]
+
+
+def get_trace_store():
+    if TRACE_TABLE:
+        import boto3
+        return DynamoTraceStore(boto3.resource("dynamodb").Table(TRACE_TABLE))
+    if TRACE_DIR:
+        return FileTraceStore(TRACE_DIR)
+    return None
+
+
+def _raw(value):
+    # boto3 hands Binary attributes back wrapped in boto3.dynamodb.types.Binary
+    return getattr(value, "value", value)
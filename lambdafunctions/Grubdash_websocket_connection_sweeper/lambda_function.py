@@ -0,0 +1,32 @@
+import boto3
+import os
+import time
+from boto3.dynamodb.conditions import Attr
+
+dynamodb = boto3.resource('dynamodb')
+TABLE_NAME = os.environ['TABLE_NAME']
+table = dynamodb.Table(TABLE_NAME)
+
+# Scheduled (EventBridge) sweep of connections whose heartbeat stopped.
+# DynamoDB TTL also deletes them eventually, but only within ~48h, so senders
+# would keep posting to dead sockets in the meantime.
+def lambda_handler(event, context):
+    now = int(time.time())
+    scan_kwargs = {
+        'FilterExpression': Attr('expiresAt').lt(now),
+        'ProjectionExpression': 'connectionId'
+    }
+
+    deleted = 0
+    with table.batch_writer() as batch:
+        while True:
+            response = table.scan(**scan_kwargs)
+            for item in response.get('Items', []):
+                batch.delete_item(Key={'connectionId': item['connectionId']})
+                deleted += 1
+            if 'LastEvaluatedKey' not in response:
+                break
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    print(f"Swept {deleted} expired connections")
+    return { 'statusCode': 200, 'deleted': deleted }
@@ -0,0 +1,131 @@
+"""Streams index and delete actions into size-bounded _bulk requests.
+
+Actions are buffered until the next one would push the request past
+BULK_MAX_BYTES (or BULK_MAX_ACTIONS), then sent as one NDJSON body. A _bulk
+response can partly fail; items rejected with 429/5xx are resent on their own
+with backoff, up to BULK_ITEM_ATTEMPTS, while mapping errors and other 4xx are
+recorded and not retried. A delete of a missing document counts as done,
+under `missing` rather than `deleted`, since nothing in the index changed.
+"""
+import json
+import os
+import random
+import time
+
+BULK_MAX_BYTES = int(os.environ.get("BULK_MAX_BYTES", str(5 * 1024 * 1024)))
+BULK_MAX_ACTIONS = int(os.environ.get("BULK_MAX_ACTIONS", "1000"))
+BULK_ITEM_ATTEMPTS = int(os.environ.get("BULK_ITEM_ATTEMPTS", "3"))
+BULK_BACKOFF_SECONDS = float(os.environ.get("BULK_BACKOFF_SECONDS", "0.2"))
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+MAX_RECORDED_ERRORS = 100
+
+
+class BulkIndexer:
+    def __init__(self, client, index_name, json_cls=None, max_bytes=BULK_MAX_BYTES, max_actions=BULK_MAX_ACTIONS):
+        self.client = client
+        self.index_name = index_name
+        self.json_cls = json_cls
+        self.max_bytes = max_bytes
+        self.max_actions = max_actions
+        self.pending = []  # [(doc_id, op, payload bytes)]
+        self.pending_bytes = 0
+        self.started = time.perf_counter()
+        self.indexed = 0
+        self.deleted = 0
+        self.missing = 0
+        self.failed = 0
+        self.retried = 0
+        self.requests = 0
+        self.bytes_sent = 0
+        self.errors = []
+        self.failed_ids = set()
+
+    def index(self, doc_id, doc):
+        action = {"index": {"_index": self.index_name, "_id": doc_id}}
+        payload = (json.dumps(action) + "\n" + json.dumps(doc, cls=self.json_cls) + "\n").encode("utf-8")
+        self._add(doc_id, "index", payload)
+
+    def delete(self, doc_id):
+        action = {"delete": {"_index": self.index_name, "_id": doc_id}}
+        self._add(doc_id, "delete", (json.dumps(action) + "\n").encode("utf-8"))
+
+    def flush(self):
+        batch, self.pending, self.pending_bytes = self.pending, [], 0
+        for attempt in range(1, BULK_ITEM_ATTEMPTS + 1):
+            if not batch:
+                return
+            batch = self._send(batch, final=attempt == BULK_ITEM_ATTEMPTS)
+            if batch:
+                self.retried += len(batch)
+                time.sleep(random.uniform(0, BULK_BACKOFF_SECONDS * 2 ** attempt))
+
+    def close(self):
+        self.flush()
+        return self.stats()
+
+    def stats(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "indexed": self.indexed,
+            "deleted": self.deleted,
+            "missing": self.missing,
+            "failed": self.failed,
+            "retried": self.retried,
+            "bulk_requests": self.requests,
+            "bytes_sent": self.bytes_sent,
+            "elapsed_s": round(elapsed, 2),
+            "docs_per_sec": round((self.indexed + self.deleted) / elapsed, 1) if elapsed else None
+        }
+
+    def _add(self, doc_id, op, payload):
+        if self.pending and self.pending_bytes + len(payload) > self.max_bytes:
+            self.flush()
+        self.pending.append((doc_id, op, payload))
+        self.pending_bytes += len(payload)
+        if len(self.pending) >= self.max_actions:
+            self.flush()
+
+    def _send(self, batch, final):
+        """Sends one _bulk request; returns the entries worth retrying."""
+        body = b"".join(payload for _, _, payload in batch)
+        self.requests += 1
+        self.bytes_sent += len(body)
+        try:
+            res = self.client.request("POST", "_bulk", body, content_type="application/x-ndjson")
+        except Exception as e:
+            return self._fail_all(batch, str(e), final)
+        if res.status >= 400:
+            return self._fail_all(batch, f"{res.status} {res.text[:500]}", final,
+                                  retryable=res.status in RETRYABLE_STATUSES)
+
+        retry = []
+        for entry, item in zip(batch, res.json().get("items", [])):
+            doc_id, op, _ = entry
+            result = item.get(op, {})
+            status = result.get("status", 500)
+            if op == "delete" and status == 404:
+                self.missing += 1
+            elif status < 300:
+                if op == "index":
+                    self.indexed += 1
+                else:
+                    self.deleted += 1
+            elif status in RETRYABLE_STATUSES and not final:
+                retry.append(entry)
+            else:
+                self._record_failure(doc_id, f"{status} {json.dumps(result.get('error'))[:500]}")
+        return retry
+
+    def _fail_all(self, batch, reason, final, retryable=True):
+        if retryable and not final:
+            return batch
+        for doc_id, _, _ in batch:
+            self._record_failure(doc_id, reason)
+        return []
+
+    def _record_failure(self, doc_id, reason):
+        self.failed += 1
+        self.failed_ids.add(doc_id)
+        if len(self.errors) < MAX_RECORDED_ERRORS:
+            self.errors.append({"id": doc_id, "error": reason})
@@ -0,0 +1,140 @@
+"""Blue/green rebuilds of the search index behind the grubhub_menu alias.
+
+A rebuild never touches the index SearchOpenSearch is reading:
+
+1. create grubhub_menu_v<timestamp> from the managed template, with replicas
+   at 0 and refresh disabled so the bulk load doesn't pay for either. It also
+   gets the BUILDING_ALIAS, so stream updates that arrive during the load are
+   written to it as well and aren't lost at the swap.
+2. bulk load it (the caller's job).
+3. restore the live settings, refresh, force-merge and wait for the
+   replicas.
+4. move the alias in one _aliases call. That removes it from the old
+   version, or removes the legacy concrete grubhub_menu index on the first
+   rebuild, adds it to the new version and drops BUILDING_ALIAS.
+
+Older versions are kept (INDEX_KEEP_VERSIONS) so rollback() can point the
+alias back at the previous one without rebuilding.
+"""
+import os
+import time
+from search_mapping import ALIAS, BULK_LOAD_SETTINGS, INDEX_TEMPLATE, LIVE_SETTINGS, VERSION_PREFIX
+
+BUILDING_ALIAS = f"{ALIAS}_building"
+KEEP_VERSIONS = int(os.environ.get("INDEX_KEEP_VERSIONS", "3"))
+FORCE_MERGE_TIMEOUT_SECONDS = float(os.environ.get("INDEX_FORCE_MERGE_TIMEOUT_SECONDS", "300"))
+HEALTH_TIMEOUT = os.environ.get("INDEX_HEALTH_TIMEOUT", "60s")
+
+
+class RebuildError(Exception):
+    pass
+
+
+def _check(res, action):
+    if res.status >= 400:
+        raise RebuildError(f"{action} failed: {res.status} {res.text[:1000]}")
+    return res.json()
+
+
+def new_version_name():
+    return f"{VERSION_PREFIX}{time.strftime('%Y%m%d%H%M%S', time.gmtime())}"
+
+
+def versions(client):
+    """Versioned index names, oldest first."""
+    res = client.request("GET", f"_cat/indices/{VERSION_PREFIX}*?format=json&h=index")
+    if res.status == 404:
+        return []
+    return sorted(row["index"] for row in _check(res, "List versions"))
+
+
+def alias_targets(client, alias=ALIAS):
+    res = client.request("GET", f"_alias/{alias}")
+    if res.status == 404:
+        return []
+    return sorted(_check(res, f"Resolve {alias}"))
+
+
+def legacy_index_exists(client):
+    """True while grubhub_menu is still the concrete index from before aliases."""
+    res = client.request("GET", ALIAS)
+    if res.status == 404:
+        return False
+    return ALIAS in _check(res, f"Get {ALIAS}")
+
+
+def create_build_index(client):
+    _check(client.request("PUT", f"_index_template/{ALIAS}", INDEX_TEMPLATE), "Put index template")
+    name = new_version_name()
+    _check(client.request("PUT", name, {
+        "settings": {"index": BULK_LOAD_SETTINGS},
+        "aliases": {BUILDING_ALIAS: {}}
+    }), f"Create {name}")
+    print(f"Created {name} for bulk load with {BULK_LOAD_SETTINGS}")
+    return name
+
+
+def finish_build(client, name):
+    """Restores live settings and gets the segments into shape before the swap."""
+    _check(client.request("PUT", f"{name}/_settings", {"index": {
+        "number_of_replicas": LIVE_SETTINGS["number_of_replicas"],
+        "refresh_interval": LIVE_SETTINGS["refresh_interval"]
+    }}), f"Restore settings on {name}")
+    _check(client.request("POST", f"{name}/_refresh"), f"Refresh {name}")
+
+    # The merge carries on server-side if we stop waiting, so a timeout here isn't fatal
+    try:
+        res = client.request("POST", f"{name}/_forcemerge?max_num_segments=1",
+                             timeout=FORCE_MERGE_TIMEOUT_SECONDS, max_attempts=1)
+        print(f"Force merge of {name}: {res.status}")
+    except Exception as e:
+        print(f"Force merge of {name} still running after {FORCE_MERGE_TIMEOUT_SECONDS}s: {e}")
+
+    # Yellow is enough to serve: every primary is up. Replicas may never allocate on a
+    # single-node domain, so only a red index (missing primaries) stops the swap
+    res = client.request("GET", f"_cluster/health/{name}?wait_for_status=yellow&timeout={HEALTH_TIMEOUT}")
+    health = res.json() if res.status == 408 else _check(res, f"Health of {name}")
+    print(f"{name} health: {health.get('status')}, timed_out={health.get('timed_out')}")
+    if health.get("status") not in ("green", "yellow"):
+        raise RebuildError(f"{name} is {health.get('status')} after {HEALTH_TIMEOUT}, not swapping")
+    return _check(client.request("GET", f"{name}/_count"), f"Count {name}").get("count", 0)
+
+
+def swap_alias(client, name, from_build=True):
+    """Points ALIAS at `name` in one atomic _aliases call; returns what it pointed at before."""
+    previous = alias_targets(client)
+    actions = [{"remove": {"index": old, "alias": ALIAS}} for old in previous if old != name]
+    if legacy_index_exists(client):
+        # First rebuild: the alias can only take the name once the concrete index is gone
+        actions.append({"remove_index": {"index": ALIAS}})
+    actions.append({"add": {"index": name, "alias": ALIAS}})
+    if from_build:
+        actions.append({"remove": {"index": name, "alias": BUILDING_ALIAS}})
+    _check(client.request("POST", "_aliases", {"actions": actions}), f"Swap {ALIAS} to {name}")
+    print(f"{ALIAS} now points at {name} (was {previous or 'the legacy index'})")
+    return previous
+
+
+def abandon_build(client, name):
+    res = client.request("DELETE", name)
+    print(f"Abandoned build {name}: {res.status}")
+
+
+def rollback(client):
+    """Points the alias back at the newest version older than the live one."""
+    live = alias_targets(client)
+    older = [v for v in versions(client) if not live or v < min(live)]
+    if not older:
+        raise RebuildError(f"No earlier version to roll back to from {live}")
+    swap_alias(client, older[-1], from_build=False)
+    return older[-1]
+
+
+def prune(client, keep=KEEP_VERSIONS):
+    """Deletes all but the newest `keep` versions, never the live or a building one."""
+    protected = set(alias_targets(client)) | set(alias_targets(client, BUILDING_ALIAS))
+    stale = [v for v in versions(client)[:-keep] if v not in protected] if keep > 0 else []
+    for name in stale:
+        res = client.request("DELETE", name)
+        print(f"Pruned {name}: {res.status}")
+    return stale
@@ -1,18 +1,49 @@
-import boto3 
+import boto3
+import gzip
+import hashlib
 import json
+import os
+import queue
+import threading
 from decimal import Decimal
-from botocore.awsrequest import AWSRequest
-from botocore.auth import SigV4Auth
-from botocore.httpsession import URLLib3Session
+from boto3.dynamodb.types import TypeDeserializer
+from search_cache import get_search_cache
+from opensearch_client import get_client
+from search_mapping import ALIAS, build_suggest, ensure_mapping
+from bulk_indexer import BulkIndexer
+from menu_store import MENU_ITEMS_TABLE, MenuStore, compact_item
+import index_rebuild
 
-region = 'us-east-1'
-service = 'es'
-opensearch_url = 'https://search-restaurantsearch-b2jdmtdnimpz6ovyac7i3wv5te.us-east-1.es.amazonaws.com'
-index_name = 'grubhub_menu'
+# Endpoint and region live in opensearch_client. This is the alias SearchOpenSearch
+# reads; rebuilds move it between versioned indices (see index_rebuild.py)
+index_name = ALIAS
 
-credentials = boto3.Session().get_credentials()
+# A rebuild with more failed documents than this is abandoned instead of swapped in
+REBUILD_MAX_FAILED_RATIO = float(os.environ.get('REBUILD_MAX_FAILED_RATIO', '0.01'))
+
+# Where to write the snapshot SearchOpenSearch builds its fallback index from
+# (s3://bucket/key or a file path); unset skips it
+LOCAL_INDEX_PATH = os.environ.get('LOCAL_INDEX_PATH')
+
+# Parallel scan segments; each pages through its share of the table independently
+SCAN_SEGMENTS = int(os.environ.get('INDEX_SCAN_SEGMENTS', '4'))
+
+# Only restaurants have an address, coordinates and a menu (the legacy list or, once
+# migrated to per-item records, a menuVersion), so everyone else is filtered out server-side
+RESTAURANT_REQUIRED = ["address", "location_coordinates"]
+RESTAURANT_FILTER = " AND ".join(f"attribute_exists(#{a})" for a in RESTAURANT_REQUIRED) + \
+    " AND (attribute_exists(#menu) OR attribute_exists(#menuVersion))"
+RESTAURANT_ATTRIBUTES = ["userId", "name", "email", "address", "rating", "createdAt", "location_coordinates", "menu", "menuVersion"]
+
+opensearch = get_client()
 dynamodb = boto3.resource('dynamodb')
 table = dynamodb.Table('grubdash_users')
+menus = MenuStore(table)
+
+deserializer = TypeDeserializer()
+
+# Stream batches ensure the mapping once per container rather than per invocation
+mapping_ensured = False
 
 # Handle Decimal encoding
 class DecimalEncoder(json.JSONEncoder):
@@ -21,77 +52,321 @@ class DecimalEncoder(json.JSONEncoder):
             return float(o)
         return super().default(o)
 
-# Sign and send HTTP request to OpenSearch
-def sign_and_send_request(endpoint, method, body):
-    request = AWSRequest(
-        method=method,
-        url=endpoint,
-        data=body,
-        headers={'Content-Type': 'application/json'}
-    )
-    SigV4Auth(credentials, service, region).add_auth(request)
-    session = URLLib3Session()
-    response = session.send(request.prepare())
-    return response
+def build_document(restaurant, menu=None):
+    """`menu` is the restaurant's per-item menu; without it the legacy list is used."""
+    doc = {
+        "userId": restaurant.get("userId", ""),
+        "name": restaurant.get("name", ""),
+        "email": restaurant.get("email", ""),
+        "address": restaurant.get("address", ""),
+        "rating": restaurant.get("rating", None),
+        "createdAt": restaurant.get("createdAt", ""),
+        "location": {
+            "lat": float(restaurant["location_coordinates"].get("latitude", 0)),
+            "lon": float(restaurant["location_coordinates"].get("longitude", 0))
+        },
+        "menu": []
+    }
 
-def lambda_handler(event, context):
-    response = table.scan()
-    items = response['Items']
-    results = []
+    for item in menu if menu is not None else restaurant.get("menu", []):
+        menu_item = {
+            "name": item.get("name", ""),
+            "description": item.get("description", ""),
+            "category": item.get("category", ""),
+            "item_id": item.get("item_id", ""),
+            "image_url": item.get("image_url", ""),
+            "price": str(item.get("price", ""))
+        }
+        doc["menu"].append(menu_item)
+
+    # Typeahead inputs for the suggest endpoint
+    doc["suggest"] = build_suggest(doc["name"], doc["menu"], doc["rating"])
+    doc["content_hash"] = content_hash(doc)
+    return doc
+
+def is_restaurant(item):
+    return bool(item) and all(a in item for a in RESTAURANT_REQUIRED) and ("menu" in item or "menuVersion" in item)
+
+def restaurant_point(item):
+    coords = item["location_coordinates"]
+    return float(coords.get("latitude", 0)), float(coords.get("longitude", 0))
+
+def content_hash(doc):
+    canonical = json.dumps(doc, cls=DecimalEncoder, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32]
+
+def scan_restaurants(segments=SCAN_SEGMENTS):
+    return parallel_scan(table.name, segments, RESTAURANT_FILTER, RESTAURANT_ATTRIBUTES)
+
+def scan_menus(segments=SCAN_SEGMENTS):
+    """restaurant_id -> [menu item] for every restaurant on per-item menus."""
+    by_restaurant = {}
+    for item in parallel_scan(MENU_ITEMS_TABLE, segments):
+        by_restaurant.setdefault(item["restaurant_id"], []).append(compact_item(item))
+    return by_restaurant
+
+def parallel_scan(table_name, segments, filter_expression=None, attributes=None):
+    """Yields items from a segmented parallel scan as pages arrive.
+
+    Every segment follows LastEvaluatedKey to its end, so tables past 1 MB are
+    covered. Pages go through a bounded queue: the scan stays at most a few
+    pages ahead of the bulk requests consuming it.
+    """
+    # Thread-safe, unlike the Table resource, and returns Python-typed items like it
+    client = table.meta.client
+    pages = queue.Queue(maxsize=segments * 2)
+    base = {"TableName": table_name, "TotalSegments": segments}
+    if attributes:
+        names = {f"#{a}": a for a in attributes}
+        base["ProjectionExpression"] = ", ".join(names)
+        base["ExpressionAttributeNames"] = names
+    if filter_expression:
+        base["FilterExpression"] = filter_expression
+
+    def scan_segment(segment):
+        kwargs = {**base, "Segment": segment}
+        try:
+            while True:
+                page = client.scan(**kwargs)
+                pages.put(("items", page.get("Items", [])))
+                if "LastEvaluatedKey" not in page:
+                    break
+                kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+        except Exception as e:
+            pages.put(("error", f"segment {segment}: {e}"))
+        finally:
+            pages.put(("done", None))
+
+    workers = [threading.Thread(target=scan_segment, args=(s,), daemon=True) for s in range(segments)]
+    for worker in workers:
+        worker.start()
+
+    scan_errors = []
+    done = 0
+    while done < segments:
+        kind, value = pages.get()
+        if kind == "items":
+            yield from value
+        elif kind == "error":
+            print(f"Scan failed for {value}")
+            scan_errors.append(value)
+        else:
+            done += 1
+    if scan_errors:
+        raise RuntimeError(f"Scan incomplete: {scan_errors}")
+
+# JSON lines of the indexed documents, gzipped when the name ends in .gz
+def write_snapshot(path, docs):
+    data = "".join(json.dumps(doc, cls=DecimalEncoder) + "\n" for doc in docs).encode("utf-8")
+    if path.endswith(".gz"):
+        data = gzip.compress(data)
+    if path.startswith("s3://"):
+        bucket, _, key = path[len("s3://"):].partition("/")
+        boto3.client("s3").put_object(Bucket=bucket, Key=key, Body=data)
+    else:
+        with open(path, "wb") as f:
+            f.write(data)
+    print(f"Wrote search snapshot of {len(docs)} restaurants ({len(data)} bytes) to {path}")
+
+def indexed_hashes(doc_ids):
+    """content_hash currently stored for each id; missing documents are left out."""
+    if not doc_ids:
+        return {}
+    res = opensearch.request("POST", f"{index_name}/_mget?_source=content_hash", {"ids": list(doc_ids)})
+    if res.status >= 400:
+        print(f"_mget failed ({res.status}), indexing without the no-op check: {res.text}")
+        return {}
+    return {
+        d["_id"]: d["_source"].get("content_hash")
+        for d in res.json().get("docs", [])
+        if d.get("found")
+    }
+
+def handle_stream(records):
+    """Applies a batch of grubdash_users stream records to the index.
+
+    Only the last change per user in the batch matters. A user that is (or
+    stops being) a restaurant becomes an index or a delete; an index whose
+    content hash matches the old image or the indexed document is a no-op.
+    Failed items are reported back as batchItemFailures so the stream
+    retries from the earliest record for them.
+    """
+    latest = {}
+    sequence = {}
+    for record in records:
+        keys = {k: deserializer.deserialize(v) for k, v in record["dynamodb"]["Keys"].items()}
+        user_id = keys["userId"]
+        seq = record["dynamodb"]["SequenceNumber"]
+        latest[user_id] = record
+        sequence[user_id] = min(sequence.get(user_id, seq), seq, key=int)
+
+    upserts = {}
+    deletes = []
+    points = {}  # user_id -> locations whose nearby searches the change can affect
+    unchanged = 0
+    for user_id, record in latest.items():
+        images = record["dynamodb"]
+        new = {k: deserializer.deserialize(v) for k, v in images.get("NewImage", {}).items()}
+        old = {k: deserializer.deserialize(v) for k, v in images.get("OldImage", {}).items()}
+
+        if record["eventName"] == "REMOVE" or not is_restaurant(new):
+            # Only restaurants were ever indexed, so customer signups and edits need no delete
+            if is_restaurant(old):
+                deletes.append(user_id)
+                points[user_id] = [restaurant_point(old)]
+            continue
+
+        # Per-item menus aren't in the image; both sides get the current one, and a
+        # menu edit shows up as a menuVersion change
+        menu = menus.items(user_id) if "menuVersion" in new else None
+        doc = build_document(new, menu)
+        old_doc = build_document(old, menu if "menuVersion" in old else None) if is_restaurant(old) else None
+        if old_doc and new.get("menuVersion") == old.get("menuVersion") and old_doc["content_hash"] == doc["content_hash"]:
+            unchanged += 1  # e.g. a login timestamp or payment field changed
+            continue
+        upserts[user_id] = doc
+        points[user_id] = [(doc["location"]["lat"], doc["location"]["lon"])]
+        if old_doc:
+            points[user_id].append(restaurant_point(old))
+
+    # The old image can be stale relative to the index (replays, missed batches); check what's live
+    stored = indexed_hashes(upserts)
+    bulk = BulkIndexer(opensearch, index_name, json_cls=DecimalEncoder)
+    for user_id, doc in upserts.items():
+        if stored.get(user_id) == doc["content_hash"]:
+            unchanged += 1
+            continue
+        bulk.index(user_id, doc)
+    for user_id in deletes:
+        bulk.delete(user_id)
+    stats = bulk.close()
+
+    # A rebuild in progress may already have scanned past these users; apply them there too
+    building = index_rebuild.alias_targets(opensearch, index_rebuild.BUILDING_ALIAS)
+    if building and (upserts or deletes):
+        shadow = BulkIndexer(opensearch, index_rebuild.BUILDING_ALIAS, json_cls=DecimalEncoder)
+        for user_id, doc in upserts.items():
+            shadow.index(user_id, doc)
+        for user_id in deletes:
+            shadow.delete(user_id)
+        print(f"Mirrored stream batch to {building}:", json.dumps(shadow.close()))
+
+    print(f"Stream batch of {len(records)} record(s), {len(latest)} user(s), {unchanged} unchanged:", json.dumps(stats))
+    for error in bulk.errors:
+        print(f"Failed to apply change for {error['id']}: {error['error']}")
+
+    if stats["indexed"] or stats["deleted"]:
+        try:
+            # Only the regions around changed restaurants (old and new location), not the whole cache
+            get_search_cache().invalidate(points=[p for user_points in points.values() for p in user_points])
+        except Exception as e:
+            print(f"Failed to invalidate search cache: {e}")
+
+    failures = [sequence[user_id] for user_id in bulk.failed_ids]
+    return {"batchItemFailures": [{"itemIdentifier": min(failures, key=int)}] if failures else []}
+
+def load_index(target):
+    """Scans every restaurant into `target`; returns (report, indexed docs, scan complete)."""
+    bulk = BulkIndexer(opensearch, target, json_cls=DecimalEncoder)
     errors = []
+    docs = []
+    scanned = 0
+    complete = True
 
-    for restaurant in items:
+    try:
+        per_item_menus = scan_menus()
+        for restaurant in scan_restaurants():
+            scanned += 1
+            try:
+                menu = per_item_menus.get(restaurant["userId"], []) if "menuVersion" in restaurant else None
+                doc = build_document(restaurant, menu)
+            except Exception as e:
+                print(f"Error building document for restaurant: {restaurant.get('userId')}: {e}")
+                errors.append({"id": restaurant.get("userId"), "error": str(e)})
+                continue
+            # use userId as document ID to avoid duplication
+            bulk.index(doc["userId"], doc)
+            docs.append(doc)
+    except RuntimeError as e:
+        errors.append({"id": None, "error": str(e)})
+        complete = False
+
+    stats = bulk.close()
+    errors.extend(bulk.errors)
+    print(f"Loaded {scanned} scanned restaurants into {target}:", json.dumps(stats))
+    print("OpenSearch client stats:", json.dumps(opensearch.stats()))
+    return {"scanned": scanned, **stats, "errors": errors}, [d for d in docs if d["userId"] not in bulk.failed_ids], complete
+
+def publish(docs):
+    """After the live index changed wholesale: refresh the fallback snapshot and drop cached searches."""
+    if LOCAL_INDEX_PATH:
         try:
-            if 'address' not in restaurant or 'location_coordinates' not in restaurant or 'menu' not in restaurant:
-                continue  # skip incomplete data
-
-            doc = {
-                "userId": restaurant.get("userId", ""),
-                "name": restaurant.get("name", ""),
-                "email": restaurant.get("email", ""),
-                "address": restaurant.get("address", ""),
-                "rating": restaurant.get("rating", None),
-                "createdAt": restaurant.get("createdAt", ""),
-                "location": {
-                    "lat": float(restaurant["location_coordinates"].get("latitude", 0)),
-                    "lon": float(restaurant["location_coordinates"].get("longitude", 0))
-                },
-                "menu": []
+            write_snapshot(LOCAL_INDEX_PATH, docs)
+        except Exception as e:
+            print(f"Failed to write search snapshot: {e}")
+
+    # Searches cached before this run would otherwise be served until their TTL runs out
+    try:
+        get_search_cache().invalidate()
+    except Exception as e:
+        print(f"Failed to invalidate search cache: {e}")
+
+def rebuild():
+    """Blue/green: load a fresh versioned index and only move the alias if the load is sound."""
+    name = index_rebuild.create_build_index(opensearch)
+    try:
+        report, docs, complete = load_index(name)
+        failed_ratio = report["failed"] / max(report["scanned"], 1)
+        if not complete or failed_ratio > REBUILD_MAX_FAILED_RATIO:
+            index_rebuild.abandon_build(opensearch, name)
+            return {
+                "statusCode": 500,
+                "body": json.dumps({"error": f"Rebuild of {name} abandoned; alias unchanged", **report})
             }
+        report["count"] = index_rebuild.finish_build(opensearch, name)
+        report["previous"] = index_rebuild.swap_alias(opensearch, name)
+    except Exception as e:
+        # Don't leave a half-built index behind for stream updates to keep mirroring into
+        print(f"Rebuild failed: {e}")
+        index_rebuild.abandon_build(opensearch, name)
+        if not isinstance(e, index_rebuild.RebuildError):
+            raise
+        return {"statusCode": 500, "body": json.dumps({"error": str(e)})}
 
-            for item in restaurant.get("menu", []):
-                menu_item = {
-                    "name": item.get("name", ""),
-                    "description": item.get("description", ""),
-                    "category": item.get("category", ""),
-                    "item_id": item.get("item_id", ""),
-                    "image_url": item.get("image_url", ""),
-                    "price": str(item.get("price", ""))
-                }
-                doc["menu"].append(menu_item)
+    publish(docs)
+    report["pruned"] = index_rebuild.prune(opensearch)
+    return {"statusCode": 200, "body": json.dumps({"index": name, **report})}
 
-            endpoint = f"{opensearch_url}/{index_name}/_doc/{doc['userId']}"  # use userId as document ID to avoid duplication
-            body = json.dumps(doc, cls=DecimalEncoder)
-            res = sign_and_send_request(endpoint, "PUT", body)
+def lambda_handler(event, context):
+    global mapping_ensured
 
-            print(f"Indexed restaurant: {doc['name']}")
-            print(f"Status: {res.status_code}, Response: {res.text}")
+    # DynamoDB Streams trigger on grubdash_users: incremental mode
+    records = event.get("Records") or []
+    if records and records[0].get("eventSource") == "aws:dynamodb":
+        if not mapping_ensured:
+            mapping_ensured = ensure_mapping(opensearch, index_name)
+        return handle_stream(records)
 
-            results.append(res.status_code)
-            if res.status_code >= 400:
-                errors.append(res.text)
+    mode = event.get("mode", "reindex")
+    if mode == "rebuild":
+        return rebuild()
+    if mode == "rollback":
+        try:
+            target = index_rebuild.rollback(opensearch)
+        except index_rebuild.RebuildError as e:
+            return {"statusCode": 409, "body": json.dumps({"error": str(e)})}
+        # The snapshot stays at the newer build until the next rebuild or reindex
+        get_search_cache().invalidate()
+        return {"statusCode": 200, "body": json.dumps({"index": target})}
 
-        except Exception as e:
-            print(f"Error indexing restaurant: {restaurant.get('userId')}")
-            print(str(e))
-            results.append(500)
-            errors.append(str(e))
+    # In-place reindex through the alias (or the legacy index before the first rebuild).
+    # Documents below carry a completion field; it has to be mapped before the first write
+    if not mapping_ensured:
+        mapping_ensured = ensure_mapping(opensearch, index_name)
+    report, docs, _ = load_index(index_name)
+    publish(docs)
 
     return {
         "statusCode": 200,
-        "body": json.dumps({
-            "indexed": len(results),
-            "responses": results,
-            "errors": errors
-        })
+        "body": json.dumps(report)
     }
@@ -0,0 +1,160 @@
+"""Signed OpenSearch client shared by the search and indexing functions.
+
+One instance per warm container: credentials come from a single boto3
+session and are only re-resolved when they approach expiry, requests go
+through one keep-alive urllib3 pool, larger bodies are gzip-compressed
+before signing, and 429/5xx responses are retried with full-jitter backoff
+within the caller's timeout.
+Per-request latency is recorded for stats().
+"""
+import gzip
+import json
+import math
+import os
+import random
+import time
+import boto3
+import urllib3
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+
+REGION = os.environ.get("OPENSEARCH_REGION", "us-east-1")
+SERVICE = "es"
+OPENSEARCH_URL = os.environ.get(
+    "OPENSEARCH_URL",
+    "https://search-restaurantsearch-b2jdmtdnimpz6ovyac7i3wv5te.us-east-1.es.amazonaws.com"
+)
+
+POOL_SIZE = int(os.environ.get("OPENSEARCH_POOL_SIZE", "10"))
+MAX_ATTEMPTS = int(os.environ.get("OPENSEARCH_MAX_ATTEMPTS", "3"))
+BACKOFF_BASE_SECONDS = float(os.environ.get("OPENSEARCH_BACKOFF_BASE_SECONDS", "0.1"))
+BACKOFF_MAX_SECONDS = float(os.environ.get("OPENSEARCH_BACKOFF_MAX_SECONDS", "2"))
+GZIP_MIN_BYTES = int(os.environ.get("OPENSEARCH_GZIP_MIN_BYTES", "1024"))
+CONNECT_TIMEOUT_SECONDS = 2.0
+TIMEOUT = urllib3.Timeout(connect=CONNECT_TIMEOUT_SECONDS, read=float(os.environ.get("OPENSEARCH_READ_TIMEOUT", "10")))
+
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+LATENCY_SAMPLES = 1000
+
+
+class OpenSearchResponse:
+    def __init__(self, status, data):
+        self.status = status
+        self.data = data
+
+    @property
+    def text(self):
+        return self.data.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.data.decode("utf-8")) if self.data else {}
+
+
+class OpenSearchClient:
+    def __init__(self, base_url=OPENSEARCH_URL, region=REGION, session=None, pool=None):
+        self.base_url = base_url.rstrip("/")
+        self.region = region
+        self.credentials = (session or boto3.Session()).get_credentials()
+        self.pool = pool or urllib3.PoolManager(maxsize=POOL_SIZE, timeout=TIMEOUT, retries=False)
+        self.latencies_ms = []
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0
+
+    def request(self, method, path, body=None, content_type="application/json", timeout=None, max_attempts=None):
+        """Sends a signed request; body may be a dict/list (JSON-encoded), str or bytes.
+
+        timeout (seconds) caps the whole call, retries and backoff included:
+        each attempt gets what is left and no retry starts past the deadline.
+        max_attempts overrides the default for callers on a latency budget.
+        """
+        attempts = max_attempts or MAX_ATTEMPTS
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body)
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+
+        headers = {"Content-Type": content_type, "Accept-Encoding": "gzip"}
+        if body and len(body) >= GZIP_MIN_BYTES:
+            body = gzip.compress(body)
+            headers["Content-Encoding"] = "gzip"
+
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        for attempt in range(1, attempts + 1):
+            # Full jitter: uniform over [0, min(cap, base * 2^attempt)]
+            backoff = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+            started = time.perf_counter()
+            try:
+                response = self.pool.request(
+                    method, url, body=body, headers=self._sign(method, url, body, headers),
+                    timeout=self._attempt_timeout(deadline)
+                )
+                status, data = response.status, response.data
+            except urllib3.exceptions.HTTPError as e:
+                if attempt == attempts or self._past(deadline, backoff):
+                    self.errors += 1
+                    raise
+                print(f"OpenSearch {method} {path} failed ({e}), retrying")
+                status = None
+            finally:
+                self._record((time.perf_counter() - started) * 1000)
+
+            if status is not None and (
+                    status not in RETRYABLE_STATUSES or attempt == attempts or self._past(deadline, backoff)):
+                if status >= 400:
+                    self.errors += 1
+                return OpenSearchResponse(status, data)
+
+            self.retries += 1
+            time.sleep(backoff)
+
+    def stats(self):
+        ordered = sorted(self.latencies_ms)
+
+        def pct(p):
+            if not ordered:
+                return None
+            return round(ordered[max(0, int(math.ceil(p / 100.0 * len(ordered))) - 1)], 2)
+
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "errors": self.errors,
+            "latency_ms_p50": pct(50),
+            "latency_ms_p99": pct(99)
+        }
+
+    def _sign(self, method, url, body, headers):
+        # get_frozen_credentials() only refreshes when the cached set is close to expiry
+        request = AWSRequest(method=method, url=url, data=body, headers=dict(headers))
+        SigV4Auth(self.credentials.get_frozen_credentials(), SERVICE, self.region).add_auth(request)
+        return dict(request.headers)
+
+    @staticmethod
+    def _attempt_timeout(deadline):
+        if deadline is None:
+            return TIMEOUT
+        remaining = max(deadline - time.monotonic(), 0.001)
+        return urllib3.Timeout(total=remaining, connect=min(CONNECT_TIMEOUT_SECONDS, remaining), read=remaining)
+
+    @staticmethod
+    def _past(deadline, backoff):
+        """Whether waiting `backoff` seconds would leave no time for another attempt."""
+        return deadline is not None and time.monotonic() + backoff >= deadline
+
+    def _record(self, elapsed_ms):
+        self.requests += 1
+        self.latencies_ms.append(elapsed_ms)
+        if len(self.latencies_ms) > LATENCY_SAMPLES:
+            del self.latencies_ms[:len(self.latencies_ms) - LATENCY_SAMPLES]
+
+
+_client = None
+
+
+def get_client():
+    global _client
+    if _client is None:
+        _client = OpenSearchClient()
+    return _client
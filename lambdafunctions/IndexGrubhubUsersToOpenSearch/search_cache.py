@@ -0,0 +1,260 @@
+"""Result cache for restaurant search.
+
+Keys are the normalized query text plus a quantized geo cell of the caller's
+position, so nearby users typing the same thing share an entry. Searches are
+run against the cell centre, which keeps a cached result exactly what a fresh
+query for that cell would return; callers re-measure distances from their own
+position before responding.
+
+Two tiers: an in-container LRU with TTL, and an optional shared tier behind
+the SharedCache interface (DynamoSharedCache when SEARCH_CACHE_TABLE is set).
+
+Invalidation goes through generation numbers kept in the shared tier and
+folded into every key, so old entries are never served once they move on:
+
+- a global generation, bumped by full reindexes, rebuilds and rollbacks.
+- one per region (REGION_CELLS x REGION_CELLS geo cells), bumped by
+  stream updates for the regions whose searches could return the changed
+  restaurant, so a single edit doesn't wipe every cached search everywhere.
+
+Containers re-read the generations at most every GENERATION_CHECK_SECONDS.
+Without the shared tier there is nothing to bump: the indexer can't reach
+the search containers, whose entries go stale for up to
+SEARCH_CACHE_TTL_SECONDS after a change.
+"""
+import json
+import math
+import os
+import time
+from collections import OrderedDict
+
+SEARCH_CACHE_TABLE = os.environ.get("SEARCH_CACHE_TABLE")
+CELL_DEGREES = float(os.environ.get("SEARCH_CACHE_CELL_DEGREES", "0.01"))  # ~1.1 km of latitude
+LOCAL_TTL_SECONDS = float(os.environ.get("SEARCH_CACHE_TTL_SECONDS", "60"))
+SHARED_TTL_SECONDS = int(os.environ.get("SEARCH_CACHE_SHARED_TTL_SECONDS", "300"))
+LOCAL_MAX_ENTRIES = int(os.environ.get("SEARCH_CACHE_MAX_ENTRIES", "2000"))
+GENERATION_CHECK_SECONDS = float(os.environ.get("SEARCH_CACHE_GENERATION_CHECK_SECONDS", "30"))
+REGION_CELLS = int(os.environ.get("SEARCH_CACHE_REGION_CELLS", "50"))  # 0.5 degrees with the default cells
+
+# Searches return restaurants within this distance of the (cell centre) search point
+SEARCH_RADIUS_MILES = 10
+MILES_PER_DEGREE_LAT = 69.0
+
+GENERATION_KEY = "__generation__"
+
+
+def normalize_query(query):
+    return " ".join((query or "").lower().split())
+
+
+def geo_cell(lat, lon, cell_degrees=CELL_DEGREES):
+    """Returns (cell id, cell centre lat, cell centre lon)."""
+    row = math.floor(lat / cell_degrees)
+    col = math.floor(lon / cell_degrees)
+    centre_lat = round((row + 0.5) * cell_degrees, 6)
+    centre_lon = round((col + 0.5) * cell_degrees, 6)
+    return f"{row}:{col}", centre_lat, centre_lon
+
+
+def region_of_cell(cell_id):
+    row, col = (int(part) for part in cell_id.split(":"))
+    return f"{row // REGION_CELLS}:{col // REGION_CELLS}"
+
+
+def regions_near(lat, lon, cell_degrees=CELL_DEGREES):
+    """Regions holding a cell whose search radius can reach (lat, lon)."""
+    reach_lat = SEARCH_RADIUS_MILES / MILES_PER_DEGREE_LAT + cell_degrees
+    reach_lon = SEARCH_RADIUS_MILES / (MILES_PER_DEGREE_LAT * max(math.cos(math.radians(lat)), 0.01)) + cell_degrees
+    region_degrees = cell_degrees * REGION_CELLS
+    rows = range(math.floor((lat - reach_lat) / region_degrees), math.floor((lat + reach_lat) / region_degrees) + 1)
+    cols = range(math.floor((lon - reach_lon) / region_degrees), math.floor((lon + reach_lon) / region_degrees) + 1)
+    return {f"{row}:{col}" for row in rows for col in cols}
+
+
+class LocalCache:
+    def __init__(self, ttl_seconds=LOCAL_TTL_SECONDS, max_entries=LOCAL_MAX_ENTRIES, clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self.entries = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if not entry:
+            return None
+        if entry[0] <= self.clock():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return entry[1]
+
+    def set(self, key, value):
+        self.entries[key] = (self.clock() + self.ttl_seconds, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+
+class SharedCache:
+    """Interface for a cross-container tier. Values are JSON-serializable."""
+
+    def get(self, key):
+        raise NotImplementedError
+
+    def set(self, key, value, ttl_seconds):
+        raise NotImplementedError
+
+    def get_generation(self, region=None):
+        """The global generation, or a region's when `region` is given."""
+        raise NotImplementedError
+
+    def bump_generation(self, region=None):
+        raise NotImplementedError
+
+
+class DynamoSharedCache(SharedCache):
+    """cache_key (hash) table with a DynamoDB TTL attribute named expiresAt."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def get(self, key):
+        item = self.table.get_item(Key={"cache_key": key}).get("Item")
+        if not item or int(item.get("expiresAt", 0)) <= time.time():
+            return None
+        return json.loads(item["value"])
+
+    def set(self, key, value, ttl_seconds):
+        self.table.put_item(Item={
+            "cache_key": key,
+            "value": json.dumps(value),
+            "expiresAt": int(time.time()) + ttl_seconds
+        })
+
+    def get_generation(self, region=None):
+        item = self.table.get_item(Key={"cache_key": _generation_key(region)}, ConsistentRead=True).get("Item")
+        return int(item["generation"]) if item else 0
+
+    def bump_generation(self, region=None):
+        response = self.table.update_item(
+            Key={"cache_key": _generation_key(region)},
+            UpdateExpression="ADD generation :one",
+            ExpressionAttributeValues={":one": 1},
+            ReturnValues="UPDATED_NEW"
+        )
+        return int(response["Attributes"]["generation"])
+
+
+class SearchCache:
+    def __init__(self, local=None, shared=None, clock=time.monotonic):
+        self.local = local or LocalCache(clock=clock)
+        self.shared = shared
+        self.clock = clock
+        self.generation = 0
+        self.generation_checked_at = None
+        self.region_generations = {}  # region -> (generation, checked_at)
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def key(self, query, cell_id, scope=""):
+        region_generation = self.region_generations.get(region_of_cell(cell_id), (0, None))[0]
+        return f"{self.generation}.{region_generation}|{scope}|{cell_id}|{query}"
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            self.local_hits += 1
+            return value
+        if self.shared:
+            try:
+                value = self.shared.get(key)
+            except Exception as e:
+                print(f"Shared search cache read failed: {e}")
+                value = None
+            if value is not None:
+                self.local.set(key, value)
+                self.shared_hits += 1
+                return value
+        self.misses += 1
+        return None
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        if self.shared:
+            try:
+                self.shared.set(key, value, SHARED_TTL_SECONDS)
+            except Exception as e:
+                print(f"Shared search cache write failed: {e}")
+
+    def refresh_generation(self, cell_id=None):
+        """Picks up reindexes (and stream updates near `cell_id`) from the shared tier,
+        at most every GENERATION_CHECK_SECONDS."""
+        if not self.shared:
+            return
+        now = self.clock()
+        if self.generation_checked_at is None or now - self.generation_checked_at >= GENERATION_CHECK_SECONDS:
+            self.generation_checked_at = now
+            try:
+                generation = self.shared.get_generation()
+                if generation != self.generation:
+                    self.generation = generation
+                    self.local.clear()
+            except Exception as e:
+                print(f"Search cache generation check failed: {e}")
+
+        if cell_id is None:
+            return
+        region = region_of_cell(cell_id)
+        known = self.region_generations.get(region)
+        if known and now - known[1] < GENERATION_CHECK_SECONDS:
+            return
+        try:
+            # Entries under the old region generation are simply never looked up again
+            self.region_generations[region] = (self.shared.get_generation(region), now)
+        except Exception as e:
+            print(f"Search cache generation check failed for region {region}: {e}")
+
+    def invalidate(self, points=None):
+        """Moves the global generation (a reindex) or, given restaurant (lat, lon) points,
+        the generation of every region whose searches could return them. Containers
+        pick it up on their next generation check."""
+        self.local.clear()
+        if not self.shared:
+            print(f"No SEARCH_CACHE_TABLE: search containers keep cached results for up to "
+                  f"{LOCAL_TTL_SECONDS:g}s after this change")
+            return
+        if points is None:
+            self.generation = self.shared.bump_generation()
+            return
+        regions = sorted({region for lat, lon in points for region in regions_near(lat, lon)})
+        for region in regions:
+            self.shared.bump_generation(region)
+        print(f"Search cache invalidated for region(s) {regions}")
+
+    def stats(self):
+        lookups = self.local_hits + self.shared_hits + self.misses
+        return {
+            "local_hits": self.local_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.local_hits + self.shared_hits) / lookups, 3) if lookups else None,
+            "generation": self.generation,
+            "regions": len(self.region_generations),
+            "entries": len(self.local.entries)
+        }
+
+
+def _generation_key(region):
+    return f"{GENERATION_KEY}|{region}" if region else GENERATION_KEY
+
+
+def get_search_cache():
+    shared = None
+    if SEARCH_CACHE_TABLE:
+        import boto3
+        shared = DynamoSharedCache(boto3.resource("dynamodb").Table(SEARCH_CACHE_TABLE))
+    return SearchCache(shared=shared)
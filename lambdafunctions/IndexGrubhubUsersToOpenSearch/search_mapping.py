@@ -0,0 +1,110 @@
+"""Managed settings and mapping for the grubhub_menu indices.
+
+`grubhub_menu` is the alias SearchOpenSearch queries; rebuilds create
+versioned indices (grubhub_menu_v<timestamp>) from INDEX_TEMPLATE and move the
+alias once they are loaded (see index_rebuild.py).
+
+Every text field the search sorts or filters on keeps a `.keyword` subfield,
+so queries written against the old dynamically-mapped index (userId.keyword)
+work unchanged on managed ones.
+
+`suggest` is a completion field with a geo context on the restaurant location,
+so the suggest endpoint can ask for "prefixes near this cell" straight from the
+in-memory FST instead of running the nested fuzzy search on every keystroke.
+"""
+import os
+
+ALIAS = "grubhub_menu"
+VERSION_PREFIX = f"{ALIAS}_v"
+
+SUGGEST_GEO_PRECISION = 5  # geohash length, ~4.9 km cells
+SUGGEST_MAX_INPUTS = 50
+
+# Settings the live index runs with, and the overrides used while bulk loading
+LIVE_SETTINGS = {
+    "number_of_shards": int(os.environ.get("INDEX_SHARDS", "1")),
+    "number_of_replicas": int(os.environ.get("INDEX_REPLICAS", "1")),
+    "refresh_interval": os.environ.get("INDEX_REFRESH_INTERVAL", "1s")
+}
+BULK_LOAD_SETTINGS = {
+    "number_of_replicas": 0,
+    "refresh_interval": "-1"
+}
+
+_KEYWORD = {"keyword": {"type": "keyword", "ignore_above": 256}}
+
+MAPPING = {
+    "dynamic": False,
+    "properties": {
+        "userId": {"type": "keyword", "fields": _KEYWORD},
+        "name": {"type": "text", "fields": _KEYWORD},
+        "email": {"type": "keyword"},
+        "address": {"type": "text"},
+        "rating": {"type": "float"},
+        "createdAt": {"type": "keyword"},
+        "location": {"type": "geo_point"},
+        # Hash of the indexed content; stream updates compare against it to skip no-op writes
+        "content_hash": {"type": "keyword", "index": False},
+        "menu": {
+            "type": "nested",
+            "properties": {
+                "name": {"type": "text", "fields": _KEYWORD},
+                "description": {"type": "text"},
+                "category": {"type": "text", "fields": _KEYWORD},
+                "item_id": {"type": "keyword"},
+                "image_url": {"type": "keyword", "index": False},
+                "price": {"type": "keyword"}
+            }
+        },
+        "suggest": {
+            "type": "completion",
+            "contexts": [
+                {
+                    "name": "location",
+                    "type": "geo",
+                    "path": "location",
+                    "precision": SUGGEST_GEO_PRECISION
+                }
+            ]
+        }
+    }
+}
+
+
+def build_suggest(restaurant_name, menu_items, rating):
+    """Completion inputs for one restaurant: its name, dish names and categories.
+
+    Higher-rated restaurants rank first for the same prefix.
+    """
+    inputs = [restaurant_name]
+    for item in menu_items:
+        inputs.append(item.get("name", ""))
+        inputs.append(item.get("category", ""))
+    inputs = [i.strip() for i in dict.fromkeys(inputs) if i and i.strip()][:SUGGEST_MAX_INPUTS]
+    try:
+        weight = int(float(rating or 0) * 10) + 1
+    except (TypeError, ValueError):
+        weight = 1
+    return {"input": inputs, "weight": weight}
+
+
+# Fields added after the first, dynamically-mapped index; safe to put on any generation
+ADDITIVE_FIELDS = ("content_hash", "suggest")
+
+INDEX_TEMPLATE = {
+    "index_patterns": [f"{VERSION_PREFIX}*"],
+    "template": {
+        "settings": {"index": LIVE_SETTINGS},
+        "mappings": MAPPING
+    }
+}
+
+
+def ensure_mapping(client, index_name):
+    """Adds any missing fields to the index, creating it if it doesn't exist yet."""
+    additive = {"properties": {f: MAPPING["properties"][f] for f in ADDITIVE_FIELDS}}
+    res = client.request("PUT", f"{index_name}/_mapping", additive)
+    if res.status == 404:
+        res = client.request("PUT", index_name, {"settings": {"index": LIVE_SETTINGS}, "mappings": MAPPING})
+    print(f"Mapping ensure for {index_name}: {res.status} {res.text}")
+    return res.status < 400
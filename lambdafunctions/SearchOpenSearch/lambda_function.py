@@ -1,205 +1,323 @@
-import json
-import boto3
-import urllib3
-from botocore.awsrequest import AWSRequest
-from botocore.auth import SigV4Auth
-import base64
-from collections import defaultdict
-
-# Configuration
-region = 'us-east-1'
-service = 'es'
-index_name = 'grubhub_menu'
-opensearch_url = 'https://search-restaurantsearch-b2jdmtdnimpz6ovyac7i3wv5te.us-east-1.es.amazonaws.com'
-
-http = urllib3.PoolManager()
-
-# Basic auth for OpenSearch
-username = 'ccadmin'
-password = 'Ccadmin25@'
-auth_string = f"{username}:{password}"
-encoded_auth = base64.b64encode(auth_string.encode('utf-8')).decode('utf-8')
-
-def lambda_handler(event, context):
-    print("Received event:")
-    print(json.dumps(event, indent=2))
-
-    params = event.get('queryStringParameters') or {}
-    query_string = params.get('q', '').lower().strip()
-    lat = params.get('lat')
-    lon = params.get('lon')
-
-    if not lat or not lon:
-        return {
-            "statusCode": 400,
-            "body": json.dumps({"error": "Missing lat/lon in query parameters"})
-        }
-
-    try:
-        lat = float(lat)
-        lon = float(lon)
-    except ValueError:
-        return {
-            "statusCode": 400,
-            "body": json.dumps({"error": "lat and lon must be numbers"})
-        }
-
-    print(f"Query: '{query_string}', Location: lat={lat}, lon={lon}")
-
-    geo_filter = {
-        "geo_distance": {
-            "distance": "10mi",
-            "location": {
-                "lat": lat,
-                "lon": lon
-            }
-        }
-    }
-
-    if query_string:
-        query = {
-            "query": {
-                "bool": {
-                    "must": [
-                        {
-                            "bool": {
-                                "should": [
-                                    {
-                                        "nested": {
-                                            "path": "menu",
-                                            "query": {
-                                                "bool": {
-                                                    "should": [
-                                                        {
-                                                            "match": {
-                                                                "menu.name": {
-                                                                    "query": query_string,
-                                                                    "fuzziness": "AUTO"
-                                                                }
-                                                            }
-                                                        },
-                                                        {
-                                                            "match": {
-                                                                "menu.category": {
-                                                                    "query": query_string,
-                                                                    "fuzziness": "AUTO"
-                                                                }
-                                                            }
-                                                        }
-                                                    ]
-                                                }
-                                            }
-                                        }
-                                    },
-                                    {
-                                        "match": {
-                                            "name": {
-                                                "query": query_string,
-                                                "fuzziness": "AUTO"
-                                            }
-                                        }
-                                    }
-                                ]
-                            }
-                        }
-                    ],
-                    "filter": geo_filter
-                }
-            }
-        }
-    else:
-        query = {
-            "query": {
-                "bool": {
-                    "must": {
-                        "match_all": {}
-                    },
-                    "filter": geo_filter
-                }
-            }
-        }
-
-    body = json.dumps(query)
-    print("Final OpenSearch query being sent:")
-    print(json.dumps(query, indent=2))
-
-    url = f"{opensearch_url}/{index_name}/_search"
-
-    # Sign request using SigV4
-    session = boto3.Session()
-    credentials = session.get_credentials()
-    request = AWSRequest(method="POST", url=url, data=body, headers={"Content-Type": "application/json"})
-    SigV4Auth(credentials, service, region).add_auth(request)
-    headers = dict(request.headers)
-
-    try:
-        response = http.request("POST", url, body=body.encode("utf-8"), headers=headers)
-    except Exception as e:
-        print(f"Request error: {str(e)}")
-        return {
-            "statusCode": 500,
-            "body": json.dumps({"error": str(e)})
-        }
-
-    print("Raw response from OpenSearch:")
-    print(response.data.decode("utf-8"))
-
-    response_body = json.loads(response.data.decode("utf-8"))
-    hits = response_body.get("hits", {}).get("hits", [])
-
-    restaurants = defaultdict(lambda: {
-        "userId": "",
-        "name": "",
-        "email": "",
-        "address": "",
-        "rating": None,
-        "location_coordinates": {
-            "latitude": "",
-            "longitude": ""
-        },
-        "createdAt": "",
-        "menu": []
-    })
-
-    for hit in hits:
-        src = hit["_source"]
-        user_id = src.get("userId")
-        if not user_id:
-            continue
-
-        rest = restaurants[user_id]
-        rest["userId"] = user_id
-        rest["name"] = src.get("name", "")
-        rest["email"] = src.get("email", "")
-        rest["address"] = src.get("address", "")
-        rest["rating"] = src.get("rating")
-        rest["location_coordinates"] = {
-            "latitude": str(src.get("location", {}).get("lat", src.get("latitude", ""))),
-            "longitude": str(src.get("location", {}).get("lon", src.get("longitude", "")))
-        }
-        rest["createdAt"] = src.get("createdAt", "")
-
-        for item in src.get("menu", []):
-            menu_item = {
-                "name": item.get("name", ""),
-                "description": item.get("description", ""),
-                "category": item.get("category", ""),
-                "item_id": item.get("item_id", ""),
-                "image_url": item.get("image_url", ""),
-                "price": str(item.get("price", ""))
-            }
-            rest["menu"].append(menu_item)
-
-    final_response = list(restaurants.values())
-    print(f"Formatted restaurant documents: {len(final_response)}")
-
-    return {
-        "statusCode": 200,
-        "headers": {
-            "Access-Control-Allow-Origin": "*",
-            "Access-Control-Allow-Methods": "GET,POST,PUT,OPTIONS",
-            "Access-Control-Allow-Headers": "Content-Type",
-            "Content-Type": "application/json"
-        },
-        "body": json.dumps(final_response)
-    }
+import json
+import os
+import base64
+from search_cache import SEARCH_RADIUS_MILES, geo_cell, get_search_cache, normalize_query
+from opensearch_client import get_client
+from suggest import Suggester
+from local_search import LOCAL_INDEX_PATH, distance_mi, get_engine
+
+# Configuration (endpoint and region live in opensearch_client). An alias: the
+# indexer's blue/green rebuilds move it between versioned indices
+index_name = 'grubhub_menu'
+
+# 'local' serves everything from the in-process index (offline runs); otherwise
+# OpenSearch, falling back to the local index when it errors or runs over
+# SEARCH_TIMEOUT_SECONDS and a snapshot is configured
+SEARCH_BACKEND = os.environ.get('SEARCH_BACKEND', 'opensearch')
+SEARCH_TIMEOUT_SECONDS = float(os.environ.get('SEARCH_TIMEOUT_SECONDS', '3'))
+
+# Signed, pooled client reused across warm invocations
+opensearch = get_client()
+
+# Basic auth for OpenSearch
+username = 'ccadmin'
+password = 'Ccadmin25@'
+auth_string = f"{username}:{password}"
+encoded_auth = base64.b64encode(auth_string.encode('utf-8')).decode('utf-8')
+
+# Survives across warm invocations; see search_cache.py for keying and invalidation
+search_cache = get_search_cache()
+
+# Typeahead for the search box; its own per-prefix cache and latency budget
+suggester = Suggester(opensearch, index_name)
+
+response_headers = {
+    "Access-Control-Allow-Origin": "*",
+    "Access-Control-Allow-Methods": "GET,POST,PUT,OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type",
+    "Access-Control-Expose-Headers": "X-Next-Cursor,X-Cache,X-Search-Backend",
+    "Content-Type": "application/json"
+}
+
+# Paging
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+MATCHED_ITEMS_PER_RESTAURANT = 5
+SORT_TIEBREAK_FIELD = "userId.keyword"
+
+# Only what a restaurant card needs; full menus are opt-in with menu=full
+CARD_SOURCE_FIELDS = ["userId", "name", "email", "address", "rating", "location", "createdAt"]
+MENU_ITEM_SOURCE_FIELDS = [f"menu.{f}" for f in ("name", "description", "category", "item_id", "image_url", "price")]
+
+def encode_cursor(sort_values):
+    return base64.urlsafe_b64encode(json.dumps(sort_values).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor):
+    """The [distance, userId] sort values of the previous page's last hit."""
+    values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    if (not isinstance(values, list) or len(values) != 2
+            or isinstance(values[0], bool) or not isinstance(values[0], (int, float))
+            or not isinstance(values[1], str)):
+        raise ValueError(f"Malformed cursor: {cursor!r}")
+    return values
+
+def format_menu_item(item):
+    return {
+        "name": item.get("name", ""),
+        "description": item.get("description", ""),
+        "category": item.get("category", ""),
+        "item_id": item.get("item_id", ""),
+        "image_url": item.get("image_url", ""),
+        "price": str(item.get("price", ""))
+    }
+
+def format_hit(hit, full_menu):
+    src = hit["_source"]
+    if full_menu:
+        menu = src.get("menu", [])
+    else:
+        # Matching items for text queries, a single preview item for browse
+        inner = hit.get("inner_hits", {})
+        group = inner.get("matched_items") or inner.get("preview") or {}
+        menu = [h["_source"] for h in group.get("hits", {}).get("hits", [])]
+
+    return {
+        "userId": src.get("userId", ""),
+        "name": src.get("name", ""),
+        "email": src.get("email", ""),
+        "address": src.get("address", ""),
+        "rating": src.get("rating"),
+        "location_coordinates": {
+            "latitude": str(src.get("location", {}).get("lat", "")),
+            "longitude": str(src.get("location", {}).get("lon", ""))
+        },
+        "createdAt": src.get("createdAt", ""),
+        "distance_mi": round(hit["sort"][0], 2) if hit.get("sort") else None,  # from the search point
+        "menu": [format_menu_item(item) for item in menu]
+    }
+
+def with_caller_distances(body, lat, lon):
+    """Re-measures distance_mi from the caller; cached bodies are measured from the cell centre."""
+    restaurants = json.loads(body)
+    for restaurant in restaurants:
+        coords = restaurant["location_coordinates"]
+        try:
+            restaurant["distance_mi"] = round(distance_mi(lat, lon, float(coords["latitude"]), float(coords["longitude"])), 2)
+        except ValueError:
+            pass  # no stored location; keep the search point's distance
+    return json.dumps(restaurants)
+
+def lambda_handler(event, context):
+    print("Received event:")
+    print(json.dumps(event, indent=2))
+
+    params = event.get('queryStringParameters') or {}
+    query_string = normalize_query(params.get('q', ''))
+    lat = params.get('lat')
+    lon = params.get('lon')
+    cursor = params.get('cursor') or ''
+    full_menu = params.get('menu') == 'full'
+
+    if not lat or not lon:
+        return {
+            "statusCode": 400,
+            "body": json.dumps({"error": "Missing lat/lon in query parameters"})
+        }
+
+    try:
+        lat = float(lat)
+        lon = float(lon)
+        size = min(max(int(params.get('size') or DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+        search_after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        return {
+            "statusCode": 400,
+            "body": json.dumps({"error": "lat, lon, size and cursor must be valid"})
+        }
+
+    if event.get('resource', '').endswith('/suggest'):
+        result = suggester.suggest(params.get('q', ''), lat, lon)
+        print("Suggest stats:", json.dumps(suggester.stats()))
+        return {
+            "statusCode": 200,
+            "headers": {**response_headers, "X-Cache": "HIT" if result["cached"] else "MISS"},
+            "body": json.dumps(result)
+        }
+
+    print(f"Query: '{query_string}', Location: lat={lat}, lon={lon}, size={size}, cursor={cursor!r}")
+
+    # Nearby callers share a cell; the search itself runs from the cell centre, and
+    # displayed distances are re-measured from the caller's own position
+    user_lat, user_lon = lat, lon
+    cell_id, lat, lon = geo_cell(lat, lon)
+    search_cache.refresh_generation(cell_id)
+    cache_key = search_cache.key(query_string, cell_id, scope=f"{size}|{cursor}|{'full' if full_menu else 'card'}")
+    cached = search_cache.get(cache_key)
+    print("Search cache stats:", json.dumps(search_cache.stats()))
+    if cached is not None:
+        body, next_cursor = cached
+        return {
+            "statusCode": 200,
+            "headers": {**response_headers, "X-Cache": "HIT", "X-Next-Cursor": next_cursor},
+            "body": with_caller_distances(body, user_lat, user_lon)
+        }
+
+    geo_filter = {
+        "geo_distance": {
+            "distance": f"{SEARCH_RADIUS_MILES}mi",
+            "location": {
+                "lat": lat,
+                "lon": lon
+            }
+        }
+    }
+
+    def menu_inner_hits(name, hits):
+        # With menu=full the whole menu comes back in _source, so skip inner hits
+        if full_menu:
+            return {}
+        return {"inner_hits": {"name": name, "size": hits, "_source": MENU_ITEM_SOURCE_FIELDS}}
+
+    if query_string:
+        query = {
+            "bool": {
+                "must": [
+                    {
+                        "bool": {
+                            "should": [
+                                {
+                                    "nested": {
+                                        "path": "menu",
+                                        "query": {
+                                            "bool": {
+                                                "should": [
+                                                    {
+                                                        "match": {
+                                                            "menu.name": {
+                                                                "query": query_string,
+                                                                "fuzziness": "AUTO"
+                                                            }
+                                                        }
+                                                    },
+                                                    {
+                                                        "match": {
+                                                            "menu.category": {
+                                                                "query": query_string,
+                                                                "fuzziness": "AUTO"
+                                                            }
+                                                        }
+                                                    }
+                                                ]
+                                            }
+                                        },
+                                        **menu_inner_hits("matched_items", MATCHED_ITEMS_PER_RESTAURANT)
+                                    }
+                                },
+                                {
+                                    "match": {
+                                        "name": {
+                                            "query": query_string,
+                                            "fuzziness": "AUTO"
+                                        }
+                                    }
+                                }
+                            ]
+                        }
+                    }
+                ],
+                "filter": geo_filter
+            }
+        }
+    else:
+        query = {
+            "bool": {
+                "must": {
+                    "match_all": {}
+                },
+                # Optional clause, only there to pull one preview item for the card
+                "should": [
+                    {
+                        "nested": {
+                            "path": "menu",
+                            "query": {"match_all": {}},
+                            **menu_inner_hits("preview", 1)
+                        }
+                    }
+                ],
+                "filter": geo_filter
+            }
+        }
+
+    request_body = {
+        "size": size,
+        "query": query,
+        "_source": {"includes": CARD_SOURCE_FIELDS + (["menu"] if full_menu else [])},
+        "sort": [
+            {"_geo_distance": {"location": {"lat": lat, "lon": lon}, "order": "asc", "unit": "mi"}},
+            {SORT_TIEBREAK_FIELD: "asc"}
+        ],
+        "track_total_hits": False
+    }
+    if search_after:
+        request_body["search_after"] = search_after
+
+    print("Final OpenSearch query being sent:")
+    print(json.dumps(request_body, indent=2))
+
+    response = None
+    error = "Search backend unavailable"
+    if SEARCH_BACKEND != 'local':
+        try:
+            # Only cut a slow request short when there is something to fall back to
+            timeout = SEARCH_TIMEOUT_SECONDS if LOCAL_INDEX_PATH else None
+            response = opensearch.request("POST", f"{index_name}/_search", request_body, timeout=timeout)
+            print(f"OpenSearch responded {response.status} with {len(response.data)} bytes")
+        except Exception as e:
+            print(f"Request error: {str(e)}")
+            error = str(e)
+        print("OpenSearch client stats:", json.dumps(opensearch.stats()))
+
+    engine = None
+    if response is None or response.status >= 500 or response.status == 429:
+        engine = get_engine()
+
+    if engine is not None:
+        # Degraded mode: same hit shape, never cached so recovery is immediate
+        print(f"Serving from local search index: {json.dumps(engine.stats())}")
+        hits = engine.search(query_string, lat, lon, size=size, search_after=search_after,
+                             full_menu=full_menu, matched_items=MATCHED_ITEMS_PER_RESTAURANT)
+        cacheable = False
+        backend = "local"
+    elif response is None:
+        return {
+            "statusCode": 500,
+            "body": json.dumps({"error": error})
+        }
+    elif response.status >= 400:
+        # A rejected query or missing mapping is a bug to surface, not an empty result
+        print(f"OpenSearch rejected the search: {response.status} {response.text}")
+        return {
+            "statusCode": 502,
+            "body": json.dumps({"error": "Search backend error", "status": response.status})
+        }
+    else:
+        response_body = response.json()
+        cacheable = True
+        hits = response_body.get("hits", {}).get("hits", [])
+        backend = "opensearch"
+
+    final_response = [format_hit(hit, full_menu) for hit in hits if hit.get("_source", {}).get("userId")]
+    print(f"Formatted restaurant documents: {len(final_response)}")
+
+    # A full page means there may be more; the cursor is the last hit's sort values
+    next_cursor = encode_cursor(hits[-1]["sort"]) if len(hits) == size and hits[-1].get("sort") else ""
+
+    body = json.dumps(final_response)
+    if cacheable:
+        search_cache.set(cache_key, [body, next_cursor])
+
+    return {
+        "statusCode": 200,
+        "headers": {**response_headers, "X-Cache": "MISS", "X-Next-Cursor": next_cursor, "X-Search-Backend": backend},
+        "body": with_caller_distances(body, user_lat, user_lon)
+    }
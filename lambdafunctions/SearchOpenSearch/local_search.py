@@ -0,0 +1,254 @@
+"""In-process restaurant search over the documents the indexer writes to OpenSearch.
+
+Used when the OpenSearch domain is slow or down (degraded mode), when
+SEARCH_BACKEND=local (offline runs with no domain at all), and as the baseline
+in search_benchmark.py.
+
+Data structures:
+- inverted index: token -> restaurant ids (name) and token -> {restaurant id:
+  [menu item positions]} (menu name and category), so a term lookup yields the
+  restaurants and the matched items in one step.
+- trigram index over the vocabulary for fuzzy terms. Candidates sharing a
+  trigram with the query term are checked with a bounded edit distance using
+  the same AUTO fuzziness as the OpenSearch query (0 edits up to 2 chars, 1 up
+  to 5, 2 beyond).
+- uniform geo grid of GRID_DEGREES cells. A query visits the cells overlapping
+  the radius nearest-first and stops once the next cell can't beat the current
+  page, so cost follows page size and local density rather than index size.
+
+search() returns hits shaped like OpenSearch's (_source, sort, inner_hits), so
+the Lambda formats both through the same code and cursors stay interchangeable.
+"""
+import gzip
+import json
+import math
+import os
+import re
+import time
+from bisect import insort
+from collections import defaultdict
+
+LOCAL_INDEX_PATH = os.environ.get("LOCAL_INDEX_PATH")  # file path or s3://bucket/key
+LOCAL_INDEX_REFRESH_SECONDS = float(os.environ.get("LOCAL_INDEX_REFRESH_SECONDS", "900"))
+GRID_DEGREES = float(os.environ.get("LOCAL_INDEX_GRID_DEGREES", "0.02"))  # ~2.2 km of latitude
+
+EARTH_RADIUS_MI = 3958.8
+MILES_PER_DEG_LAT = 69.09
+MAX_FUZZY_EXPANSIONS = 50
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def trigrams(token):
+    padded = f"  {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def auto_fuzziness(term):
+    if len(term) <= 2:
+        return 0
+    return 1 if len(term) <= 5 else 2
+
+
+def within_edits(a, b, max_edits):
+    """Levenshtein distance <= max_edits, with an early exit per row."""
+    if abs(len(a) - len(b)) > max_edits:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > max_edits:
+            return False
+        previous = current
+    return previous[-1] <= max_edits
+
+
+def distance_mi(lat1, lon1, lat2, lon2):
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_MI * math.asin(math.sqrt(a))
+
+
+class LocalSearchEngine:
+    def __init__(self, documents=(), grid_degrees=GRID_DEGREES):
+        self.grid_degrees = grid_degrees
+        self.docs = []
+        self.name_postings = defaultdict(set)  # token -> {doc}
+        self.menu_postings = defaultdict(lambda: defaultdict(set))  # token -> {doc: {item}}
+        self.trigram_index = defaultdict(set)  # trigram -> {token}
+        self.grid = defaultdict(list)  # (row, col) -> [doc]
+        self.expansions = {}  # query term -> matching vocabulary tokens
+        self.built_at = time.time()
+        for doc in documents:
+            self.add(doc)
+
+    def add(self, doc):
+        if not doc.get("userId") or "location" not in doc:
+            return
+        doc_id = len(self.docs)
+        self.docs.append(doc)
+        for token in tokenize(doc.get("name")):
+            self._index_token(token)
+            self.name_postings[token].add(doc_id)
+        for position, item in enumerate(doc.get("menu", [])):
+            for token in tokenize(item.get("name")) + tokenize(item.get("category")):
+                self._index_token(token)
+                self.menu_postings[token][doc_id].add(position)
+        location = doc["location"]
+        self.grid[self._cell(location["lat"], location["lon"])].append(doc_id)
+
+    def search(self, query, lat, lon, size=20, search_after=None, full_menu=False,
+               radius_mi=10, matched_items=5):
+        """Restaurants within radius_mi, nearest first, ties broken by userId."""
+        tokens = [token for term in tokenize(query) for token in self._expand(term)]
+        restaurants = self._match(tokens) if query and query.strip() else None
+        after = (search_after[0], search_after[1]) if search_after else None
+
+        page = []  # sorted (distance, userId, doc), at most size long
+        for cell_distance, doc_ids in self._cells(lat, lon, radius_mi, restaurants):
+            if len(page) == size and cell_distance > page[-1][0]:
+                break
+            for doc_id in doc_ids:
+                if restaurants is not None and doc_id not in restaurants:
+                    continue
+                doc = self.docs[doc_id]
+                distance = distance_mi(lat, lon, doc["location"]["lat"], doc["location"]["lon"])
+                hit = (distance, doc["userId"], doc_id)
+                if distance > radius_mi or (after and hit[:2] <= after):
+                    continue
+                if len(page) < size or hit < page[-1]:
+                    insort(page, hit)
+                    del page[size:]
+
+        return [self._hit(h, tokens, restaurants is not None, full_menu, matched_items) for h in page]
+
+    def stats(self):
+        return {
+            "restaurants": len(self.docs),
+            "vocabulary": len(self.name_postings.keys() | self.menu_postings.keys()),
+            "grid_cells": len(self.grid),
+            "age_seconds": round(time.time() - self.built_at)
+        }
+
+    def _index_token(self, token):
+        if token not in self.name_postings and token not in self.menu_postings:
+            for gram in trigrams(token):
+                self.trigram_index[gram].add(token)
+            self.expansions.clear()
+
+    def _expand(self, term):
+        cached = self.expansions.get(term)
+        if cached is not None:
+            return cached
+        max_edits = auto_fuzziness(term)
+        if max_edits == 0:
+            tokens = [term]
+        else:
+            candidates = set()
+            for gram in trigrams(term):
+                candidates |= self.trigram_index.get(gram, set())
+            tokens = sorted(t for t in candidates if within_edits(term, t, max_edits))[:MAX_FUZZY_EXPANSIONS]
+        self.expansions[term] = tokens
+        return tokens
+
+    def _match(self, tokens):
+        """Any token matching the name or a menu item matches the restaurant."""
+        restaurants = set()
+        for token in tokens:
+            restaurants |= self.name_postings.get(token, set())
+            restaurants.update(self.menu_postings.get(token, {}))
+        return restaurants
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.grid_degrees), math.floor(lon / self.grid_degrees)
+
+    def _cells(self, lat, lon, radius_mi, restaurants):
+        """(nearest possible distance, doc ids) per cell that could hold a hit, nearest first."""
+        # Few matches: one pseudo-cell, cheaper than walking the grid
+        if restaurants is not None and len(restaurants) < 256:
+            return [(0.0, restaurants)]
+
+        dlat = radius_mi / MILES_PER_DEG_LAT
+        dlon = radius_mi / (MILES_PER_DEG_LAT * max(math.cos(math.radians(lat)), 0.01))
+        row_min, col_min = self._cell(lat - dlat, lon - dlon)
+        row_max, col_max = self._cell(lat + dlat, lon + dlon)
+        g = self.grid_degrees
+        cells = []
+        for row in range(row_min, row_max + 1):
+            for col in range(col_min, col_max + 1):
+                doc_ids = self.grid.get((row, col))
+                if not doc_ids:
+                    continue
+                # Closest point of the cell to the query point
+                nearest_lat = min(max(lat, row * g), (row + 1) * g)
+                nearest_lon = min(max(lon, col * g), (col + 1) * g)
+                cell_distance = distance_mi(lat, lon, nearest_lat, nearest_lon)
+                if cell_distance <= radius_mi:
+                    cells.append((cell_distance, doc_ids))
+        cells.sort(key=lambda c: c[0])
+        return cells
+
+    def _hit(self, hit, tokens, is_text_query, full_menu, matched_items):
+        distance, user_id, doc_id = hit
+        doc = self.docs[doc_id]
+        source = {k: v for k, v in doc.items() if k not in ("menu", "suggest")}
+        result = {"_id": user_id, "_source": source, "sort": [distance, user_id]}
+        menu = doc.get("menu", [])
+        if full_menu:
+            source["menu"] = menu
+        elif is_text_query:
+            # Items matching the most query tokens first
+            counts = defaultdict(int)
+            for token in tokens:
+                for position in self.menu_postings.get(token, {}).get(doc_id, ()):
+                    counts[position] += 1
+            ranked = sorted(counts, key=lambda p: (-counts[p], p))[:matched_items]
+            result["inner_hits"] = {"matched_items": {"hits": {"hits": [{"_source": menu[p]} for p in ranked]}}}
+        elif menu:
+            result["inner_hits"] = {"preview": {"hits": {"hits": [{"_source": menu[0]}]}}}
+        return result
+
+
+def load_documents(path):
+    """Reads a snapshot written by the indexer: JSON lines, gzipped if the name ends in .gz."""
+    if path.startswith("s3://"):
+        import boto3
+        bucket, _, key = path[len("s3://"):].partition("/")
+        data = boto3.client("s3").get_object(Bucket=bucket, Key=key)["Body"].read()
+    else:
+        with open(path, "rb") as f:
+            data = f.read()
+    if path.endswith(".gz"):
+        data = gzip.decompress(data)
+    return [json.loads(line) for line in data.decode("utf-8").splitlines() if line.strip()]
+
+
+_engine = None
+
+
+def get_engine():
+    """Engine built from LOCAL_INDEX_PATH, rebuilt once it is older than LOCAL_INDEX_REFRESH_SECONDS.
+
+    Returns None when no snapshot is configured or it can't be read; a stale
+    engine is kept rather than dropped if a refresh fails.
+    """
+    global _engine
+    if not LOCAL_INDEX_PATH:
+        return None
+    if _engine is None or time.time() - _engine.built_at > LOCAL_INDEX_REFRESH_SECONDS:
+        try:
+            started = time.perf_counter()
+            _engine = LocalSearchEngine(load_documents(LOCAL_INDEX_PATH))
+            print(f"Local search index built in {(time.perf_counter() - started) * 1000:.0f}ms:",
+                  json.dumps(_engine.stats()))
+        except Exception as e:
+            print(f"Failed to build local search index from {LOCAL_INDEX_PATH}: {e}")
+    return _engine
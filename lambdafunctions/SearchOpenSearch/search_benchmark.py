@@ -0,0 +1,148 @@
+"""Query latency baseline for the local search engine.
+
+Generates synthetic restaurants in the shape the indexer writes, spread around
+the same base location the simulators use, builds a LocalSearchEngine and
+times a fixed mix of text, fuzzy and browse queries from random points.
+
+    python search_benchmark.py --restaurants 10000 50000 100000
+    python search_benchmark.py --snapshot grubhub_menu.jsonl.gz --queries 2000
+
+Optionally replays the same mix against OpenSearch (--opensearch) so the two
+can be compared from the same machine.
+"""
+import argparse
+import json
+import math
+import random
+import time
+from local_search import LocalSearchEngine, load_documents
+
+BASE_LAT = 40.67836844973936
+BASE_LNG = -73.96550463805957
+SPREAD_DEGREES = 0.6  # ~40 mi across, so a 10 mi radius holds a realistic share
+
+CUISINES = {
+    "Italian": ["margherita pizza", "pepperoni pizza", "lasagna", "spaghetti carbonara", "tiramisu"],
+    "Japanese": ["salmon sushi", "spicy tuna roll", "ramen", "chicken teriyaki", "miso soup"],
+    "Mexican": ["chicken burrito", "beef tacos", "quesadilla", "nachos", "guacamole"],
+    "Indian": ["butter chicken", "chicken tikka masala", "garlic naan", "samosa", "lamb biryani"],
+    "American": ["cheeseburger", "fried chicken", "french fries", "buffalo wings", "milkshake"],
+    "Thai": ["pad thai", "green curry", "tom yum soup", "spring rolls", "mango sticky rice"],
+}
+NAME_WORDS = ["Golden", "Corner", "Little", "Spicy", "Happy", "Royal", "Fresh", "Urban", "Garden", "Lucky"]
+
+QUERIES = ["pizza", "sushi", "chiken", "burrito", "tikka masala", "ramen", "piza", "pad thai", "wings", ""]
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[max(0, int(math.ceil(pct / 100.0 * len(ordered))) - 1)], 3)
+
+
+def synthetic_documents(count, rng):
+    docs = []
+    for n in range(count):
+        cuisine = rng.choice(list(CUISINES))
+        dishes = rng.sample(CUISINES[cuisine], 4)
+        docs.append({
+            "userId": f"bench-{n:06d}",
+            "name": f"{rng.choice(NAME_WORDS)} {cuisine} {rng.choice(['Kitchen', 'House', 'Grill', 'Cafe'])}",
+            "email": f"bench-{n}@example.com",
+            "address": f"{n} Bench St",
+            "rating": round(rng.uniform(3, 5), 1),
+            "createdAt": "2024-01-01T00:00:00Z",
+            "location": {
+                "lat": BASE_LAT + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES) / 2,
+                "lon": BASE_LNG + rng.uniform(-SPREAD_DEGREES, SPREAD_DEGREES) / 2
+            },
+            "menu": [
+                {"name": dish.title(), "description": "", "category": cuisine, "item_id": f"{n}-{i}",
+                 "image_url": "", "price": f"{rng.uniform(5, 25):.2f}"}
+                for i, dish in enumerate(dishes)
+            ]
+        })
+    return docs
+
+
+def query_points(count, rng):
+    return [
+        (BASE_LAT + rng.uniform(-0.1, 0.1), BASE_LNG + rng.uniform(-0.1, 0.1), QUERIES[i % len(QUERIES)])
+        for i in range(count)
+    ]
+
+
+def bench_local(docs, points, size):
+    started = time.perf_counter()
+    engine = LocalSearchEngine(docs)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    latencies = []
+    returned = 0
+    for lat, lon, query in points:
+        started = time.perf_counter()
+        hits = engine.search(query, lat, lon, size=size)
+        latencies.append((time.perf_counter() - started) * 1000)
+        returned += len(hits)
+    return {
+        "backend": "local",
+        "restaurants": len(docs),
+        "build_ms": round(build_ms),
+        **engine.stats(),
+        "queries": len(points),
+        "avg_hits": round(returned / len(points), 1),
+        "latency_ms_p50": percentile(latencies, 50),
+        "latency_ms_p99": percentile(latencies, 99)
+    }
+
+
+def bench_opensearch(points, size, index_name):
+    from opensearch_client import get_client
+    client = get_client()
+    latencies = []
+    for lat, lon, query in points:
+        must = {"multi_match": {"query": query, "fields": ["name", "menu.name", "menu.category"],
+                                "fuzziness": "AUTO"}} if query else {"match_all": {}}
+        body = {
+            "size": size,
+            "_source": ["userId"],
+            "query": {"bool": {"must": must, "filter": {
+                "geo_distance": {"distance": "10mi", "location": {"lat": lat, "lon": lon}}}}},
+            "sort": [{"_geo_distance": {"location": {"lat": lat, "lon": lon}, "order": "asc", "unit": "mi"}}]
+        }
+        started = time.perf_counter()
+        client.request("POST", f"{index_name}/_search", body)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return {
+        "backend": "opensearch",
+        "queries": len(points),
+        "latency_ms_p50": percentile(latencies, 50),
+        "latency_ms_p99": percentile(latencies, 99)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local search engine latency baseline")
+    parser.add_argument("--restaurants", type=int, nargs="+", default=[10000, 50000, 100000])
+    parser.add_argument("--snapshot", help="indexer snapshot to benchmark instead of synthetic data")
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--size", type=int, default=20)
+    parser.add_argument("--opensearch", metavar="INDEX", help="also replay the queries against this index")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    points = query_points(args.queries, rng)
+
+    if args.snapshot:
+        print(json.dumps(bench_local(load_documents(args.snapshot), points, args.size)))
+    else:
+        for count in args.restaurants:
+            print(json.dumps(bench_local(synthetic_documents(count, rng), points, args.size)))
+    if args.opensearch:
+        print(json.dumps(bench_opensearch(points, args.size, args.opensearch)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Typeahead suggestions for the restaurants search box.
+
+Backed by the `suggest` completion field the indexer writes (see
+search_mapping.py there), filtered by a geo context around the caller, so a
+keystroke is a prefix walk over an in-memory FST rather than the nested fuzzy
+match the full search runs.
+
+Two things keep it cheap enough to call as the user types:
+- a per-prefix LRU keyed by (prefix, geo cell). Only exact prefixes are
+  served from it: the completion suggester returns one option per document
+  (and skip_duplicates collapses equal texts), so a short prefix's answer
+  doesn't list every input a longer prefix can match.
+- a hard latency budget: one attempt with a short read timeout. If OpenSearch
+  can't answer in time the caller gets an empty, uncached result flagged
+  timed_out rather than a slow one.
+"""
+import os
+import urllib3
+from search_cache import LocalCache, geo_cell, normalize_query
+
+SUGGEST_SIZE = int(os.environ.get("SUGGEST_SIZE", "10"))
+SUGGEST_MIN_PREFIX = int(os.environ.get("SUGGEST_MIN_PREFIX", "2"))
+SUGGEST_MAX_PREFIX = 50
+SUGGEST_BUDGET_MS = int(os.environ.get("SUGGEST_BUDGET_MS", "150"))
+SUGGEST_CACHE_TTL_SECONDS = float(os.environ.get("SUGGEST_CACHE_TTL_SECONDS", "120"))
+SUGGEST_CACHE_MAX_ENTRIES = int(os.environ.get("SUGGEST_CACHE_MAX_ENTRIES", "5000"))
+
+# Must match the geo context precision in the indexer's mapping
+SUGGEST_GEO_PRECISION = 5
+
+
+class Suggester:
+    def __init__(self, client, index_name, cache=None):
+        self.client = client
+        self.index_name = index_name
+        self.cache = cache or LocalCache(SUGGEST_CACHE_TTL_SECONDS, SUGGEST_CACHE_MAX_ENTRIES)
+        self.hits = 0
+        self.misses = 0
+        self.timeouts = 0
+
+    def suggest(self, prefix, lat, lon):
+        """Returns {"prefix", "suggestions": [...], "cached", "timed_out"}."""
+        prefix = normalize_query(prefix)[:SUGGEST_MAX_PREFIX]
+        if len(prefix) < SUGGEST_MIN_PREFIX:
+            return {"prefix": prefix, "suggestions": [], "cached": False, "timed_out": False}
+
+        cell_id, lat, lon = geo_cell(lat, lon)
+        cached = self.cache.get((cell_id, prefix))
+        if cached is not None:
+            self.hits += 1
+            return {"prefix": prefix, "suggestions": cached, "cached": True, "timed_out": False}
+
+        self.misses += 1
+        try:
+            suggestions = self._query(prefix, lat, lon)
+        except urllib3.exceptions.HTTPError as e:
+            # Over budget (or unreachable): answer empty now, the next keystroke tries again
+            print(f"Suggest for '{prefix}' gave up after {SUGGEST_BUDGET_MS}ms: {e}")
+            self.timeouts += 1
+            return {"prefix": prefix, "suggestions": [], "cached": False, "timed_out": True}
+
+        if suggestions is not None:
+            self.cache.set((cell_id, prefix), suggestions)
+        return {"prefix": prefix, "suggestions": suggestions or [], "cached": False, "timed_out": False}
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "timeouts": self.timeouts,
+            "entries": len(self.cache.entries)
+        }
+
+    def _query(self, prefix, lat, lon):
+        body = {
+            "size": 0,
+            "_source": ["userId", "name"],
+            "suggest": {
+                "restaurants": {
+                    "prefix": prefix,
+                    "completion": {
+                        "field": "suggest",
+                        "size": SUGGEST_SIZE,
+                        "skip_duplicates": True,
+                        "contexts": {
+                            "location": [
+                                {
+                                    "lat": lat,
+                                    "lon": lon,
+                                    "precision": SUGGEST_GEO_PRECISION,
+                                    # The cell plus its ring, so callers near an edge aren't cut off
+                                    "neighbours": [SUGGEST_GEO_PRECISION]
+                                }
+                            ]
+                        }
+                    }
+                }
+            }
+        }
+        response = self.client.request(
+            "POST", f"{self.index_name}/_search", body,
+            timeout=SUGGEST_BUDGET_MS / 1000.0, max_attempts=1
+        )
+        if response.status >= 400:
+            print(f"Suggest query failed: {response.status} {response.text}")
+            return None
+
+        options = response.json().get("suggest", {}).get("restaurants", [{}])[0].get("options", [])
+        return [
+            {
+                "text": option.get("text", ""),
+                "restaurantId": option.get("_source", {}).get("userId", ""),
+                "restaurantName": option.get("_source", {}).get("name", "")
+            }
+            for option in options
+        ]
@@ -0,0 +1,109 @@
+import os
+import sys
+import unittest
+
+import urllib3
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from suggest import SUGGEST_BUDGET_MS, Suggester  # noqa: E402
+
+
+class FakeResponse:
+    def __init__(self, status, payload):
+        self.status = status
+        self.payload = payload
+        self.text = str(payload)
+
+    def json(self):
+        return self.payload
+
+
+class FakeClient:
+    """Answers completion queries from a fixed list of (input, restaurant id, name)."""
+
+    def __init__(self, inputs, status=200, error=None):
+        self.inputs = inputs
+        self.status = status
+        self.error = error
+        self.requests = []
+
+    def request(self, method, path, body, timeout=None, max_attempts=None):
+        self.requests.append({"path": path, "body": body, "timeout": timeout, "max_attempts": max_attempts})
+        if self.error:
+            raise self.error
+        prefix = body["suggest"]["restaurants"]["prefix"]
+        size = body["suggest"]["restaurants"]["completion"]["size"]
+        options = []
+        seen = set()
+        for text, user_id, name in self.inputs:
+            # One option per document, like the completion suggester
+            if text.lower().startswith(prefix) and user_id not in seen:
+                seen.add(user_id)
+                options.append({"text": text, "_source": {"userId": user_id, "name": name}})
+        return FakeResponse(self.status, {"suggest": {"restaurants": [{"options": options[:size]}]}})
+
+
+PITA_PALACE = [("Pita Palace", "r1", "Pita Palace"), ("Pizza Margherita", "r1", "Pita Palace")]
+
+
+class SuggesterCacheTest(unittest.TestCase):
+    def test_repeat_prefix_is_served_from_cache(self):
+        client = FakeClient(PITA_PALACE)
+        suggester = Suggester(client, "restaurants")
+        first = suggester.suggest("pi", 40.7532, -73.9857)
+        second = suggester.suggest("PI ", 40.7538, -73.9862)
+        self.assertFalse(first["cached"])
+        self.assertTrue(second["cached"])
+        self.assertEqual(second["suggestions"], first["suggestions"])
+        self.assertEqual(len(client.requests), 1)
+        self.assertEqual(suggester.stats()["hits"], 1)
+        self.assertEqual(suggester.stats()["misses"], 1)
+
+    def test_longer_prefix_is_not_narrowed_from_a_shorter_one(self):
+        # "pi" only lists the restaurant once, under "Pita Palace"; "piz" must still find its pizza
+        client = FakeClient(PITA_PALACE)
+        suggester = Suggester(client, "restaurants")
+        self.assertEqual([s["text"] for s in suggester.suggest("pi", 40.7532, -73.9857)["suggestions"]], ["Pita Palace"])
+        result = suggester.suggest("piz", 40.7532, -73.9857)
+        self.assertFalse(result["cached"])
+        self.assertEqual(result["suggestions"],
+                         [{"text": "Pizza Margherita", "restaurantId": "r1", "restaurantName": "Pita Palace"}])
+        self.assertEqual(len(client.requests), 2)
+
+    def test_other_cells_do_not_share_entries(self):
+        client = FakeClient(PITA_PALACE)
+        suggester = Suggester(client, "restaurants")
+        suggester.suggest("pi", 40.7532, -73.9857)
+        self.assertFalse(suggester.suggest("pi", 34.05, -118.25)["cached"])
+        self.assertEqual(len(client.requests), 2)
+
+    def test_short_prefix_never_queries(self):
+        client = FakeClient(PITA_PALACE)
+        result = Suggester(client, "restaurants").suggest("p", 40.7532, -73.9857)
+        self.assertEqual(result["suggestions"], [])
+        self.assertEqual(client.requests, [])
+
+    def test_timeout_is_flagged_and_not_cached(self):
+        client = FakeClient(PITA_PALACE, error=urllib3.exceptions.ReadTimeoutError(None, "/", "timed out"))
+        suggester = Suggester(client, "restaurants")
+        result = suggester.suggest("pi", 40.7532, -73.9857)
+        self.assertTrue(result["timed_out"])
+        self.assertEqual(result["suggestions"], [])
+        self.assertEqual(client.requests[0]["timeout"], SUGGEST_BUDGET_MS / 1000.0)
+        self.assertEqual(client.requests[0]["max_attempts"], 1)
+
+        client.error = None
+        self.assertFalse(suggester.suggest("pi", 40.7532, -73.9857)["cached"])
+        self.assertEqual(suggester.stats()["timeouts"], 1)
+
+    def test_failed_query_is_not_cached(self):
+        client = FakeClient(PITA_PALACE, status=400)
+        suggester = Suggester(client, "restaurants")
+        self.assertEqual(suggester.suggest("pi", 40.7532, -73.9857)["suggestions"], [])
+        self.assertFalse(suggester.suggest("pi", 40.7532, -73.9857)["cached"])
+        self.assertEqual(len(client.requests), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,35 +1,49 @@
 import json
-import time
 import os
 import boto3
+from location_filter import LocationFilter
+from load_generator import SqsSink, run
 
 sqs = boto3.client("sqs")
 QUEUE_URL = os.environ['QUEUE_URL']
 
+# The stream consumer filters (and traces every point it drops), so dropping at the
+# producer is opt-in: it saves SQS messages but those points never reach the trace
+FILTER_AT_PRODUCER = os.environ.get('FILTER_AT_PRODUCER', 'false').lower() == 'true'
+location_filter = LocationFilter() if FILTER_AT_PRODUCER else None
+
 def lambda_handler(event, context):
     body = json.loads(event['body'])
     user_id = body['userId']
     route_coordinates = body['routeCoordinates']  # List of {'lat': ..., 'lng': ...}
+    interval_ms = int(body.get('intervalMs', 400))
+    speedup = float(body.get('speedup', 1))
 
-    print(f"Simulating movement for user: {user_id}")
+    # Optional context for the stream consumer: deliveryId keys the trace history,
+    # orderId/destination let it compute an ETA (defaults to the end of the route)
+    driver_fields = {k: body[k] for k in ('deliveryId', 'orderId') if body.get(k)}
+    if route_coordinates:
+        driver_fields['destination'] = body.get('destination') or route_coordinates[-1]
 
-    for point in route_coordinates:
-        message = {
-            "customerId": user_id,
-            "lat": point['lat'],
-            "lng": point['lng'],
-            "timestamp": int(time.time() * 1000)
-        }
+    print(f"Simulating movement for user: {user_id}")
 
-        response = sqs.send_message(
-            QueueUrl=QUEUE_URL,
-            MessageBody=json.dumps(message)
-        )
+    sink = SqsSink(QUEUE_URL, sqs_client=sqs)
+    report = run(
+        [route_coordinates],
+        sink,
+        [user_id],
+        interval_ms=interval_ms,
+        speedup=speedup,
+        driver_fields=[driver_fields],
+        point_filter=location_filter
+    )
+    report.update(sink.report())
 
-        print(f"Sent point to SQS: {message}")
-        time.sleep(0.4)
+    print("Simulation report:", report)
+    if location_filter:
+        print("Location filter stats:", location_filter.stats())
 
     return {
         'statusCode': 200,
-        'body': json.dumps({'message': 'Route simulation complete'})
+        'body': json.dumps({'message': 'Route simulation complete', 'report': report})
     }
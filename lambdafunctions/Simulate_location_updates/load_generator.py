@@ -0,0 +1,402 @@
+"""Load generator for the driver location tracking path.
+
+Simulates many drivers moving along synthetic or recorded routes at once and
+either pushes their points to the stream queue with SendMessageBatch, or feeds
+them straight into Grubdash_stream_location_updates against in-memory
+stand-ins for the connections table and the API Gateway management API.
+
+    python load_generator.py --drivers 2000 --points 120 --speedup 20 --mode direct
+    python load_generator.py --routes recorded.json --mode sqs --queue-url https://sqs...
+"""
+import argparse
+import heapq
+import importlib.util
+import json
+import math
+import os
+import random
+import sys
+import time
+import types
+import uuid
+
+SQS_BATCH_SIZE = 10  # SendMessageBatch hard limit
+LAMBDA_BATCH_SIZE = 10  # default SQS trigger batch size
+
+# Same base location the DP_Simulation seeder uses
+BASE_LAT = 40.67836844973936
+BASE_LNG = -73.96550463805957
+METERS_PER_DEG_LAT = 111320.0
+
+STREAM_FUNCTION_DIR = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "Grubdash_stream_location_updates"
+)
+
+
+def now_ms():
+    return int(time.time() * 1000)
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, int(math.ceil(pct / 100.0 * len(ordered))) - 1)
+    return round(ordered[rank], 3)
+
+
+# === Routes ===
+
+def synthetic_route(rng, points, step_m=20.0, spread_m=3000.0):
+    """Street-grid style random walk: mostly straight, with occasional turns."""
+    lat = BASE_LAT + rng.uniform(-spread_m, spread_m) / METERS_PER_DEG_LAT
+    lng = BASE_LNG + rng.uniform(-spread_m, spread_m) / (METERS_PER_DEG_LAT * math.cos(math.radians(BASE_LAT)))
+    heading = rng.choice([0.0, 90.0, 180.0, 270.0])
+    route = []
+    for _ in range(points):
+        route.append({"lat": lat, "lng": lng})
+        if rng.random() < 0.05:
+            heading = (heading + rng.choice([-90.0, 90.0])) % 360.0
+        jitter = rng.gauss(0, 3)
+        step = max(0.0, step_m + rng.gauss(0, step_m * 0.2))
+        rad = math.radians(heading + jitter)
+        lat += step * math.cos(rad) / METERS_PER_DEG_LAT
+        lng += step * math.sin(rad) / (METERS_PER_DEG_LAT * math.cos(math.radians(lat)))
+    return route
+
+
+def load_routes(path):
+    """Accepts a list of routes, a list of {"routeCoordinates": [...]} or a single such object."""
+    with open(path) as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = [data]
+    routes = []
+    for entry in data:
+        coords = entry.get("routeCoordinates", []) if isinstance(entry, dict) else entry
+        routes.append([{"lat": float(p["lat"]), "lng": float(p["lng"])} for p in coords])
+    return [r for r in routes if r]
+
+
+# === Sinks ===
+
+class SqsSink:
+    """Sends points to the stream queue in SendMessageBatch chunks."""
+
+    def __init__(self, queue_url, sqs_client=None):
+        import boto3
+        self.queue_url = queue_url
+        self.sqs = sqs_client or boto3.client("sqs")
+        self.send_latencies = []
+        self.failed = 0
+
+    def send(self, messages):
+        for start in range(0, len(messages), SQS_BATCH_SIZE):
+            chunk = messages[start:start + SQS_BATCH_SIZE]
+            entries = [
+                {"Id": str(i), "MessageBody": json.dumps(message)}
+                for i, message in enumerate(chunk)
+            ]
+            started = time.perf_counter()
+            response = self.sqs.send_message_batch(QueueUrl=self.queue_url, Entries=entries)
+            self.send_latencies.append((time.perf_counter() - started) * 1000)
+
+            # Retry throttled entries once before counting them as lost
+            retry = [e for e in entries if e["Id"] in {f["Id"] for f in response.get("Failed", [])}]
+            if retry:
+                response = self.sqs.send_message_batch(QueueUrl=self.queue_url, Entries=retry)
+                self.failed += len(response.get("Failed", []))
+
+    def report(self):
+        return {
+            "sqs_batches": len(self.send_latencies),
+            "sqs_failed": self.failed,
+            "sqs_send_ms_p50": percentile(self.send_latencies, 50),
+            "sqs_send_ms_p99": percentile(self.send_latencies, 99)
+        }
+
+
+class _InMemoryDynamoClient:
+    """Client-level query for the connection registry (Python types, like a resource's client)."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def query(self, IndexName=None, KeyConditionExpression=None, ExpressionAttributeNames=None,
+              ExpressionAttributeValues=None, **kwargs):
+        self.table.query_count += 1
+        key = ExpressionAttributeNames["#k"]
+        value = ExpressionAttributeValues[":v"]
+        return {"Items": [dict(i) for i in self.table.items.values() if i.get(key) == value]}
+
+
+class InMemoryConnectionsTable:
+    """Stand-in for the websocket connections table (query/put/delete only)."""
+
+    name = "loadtest-connections"
+
+    def __init__(self):
+        self.items = {}
+        self.query_count = 0
+        self.meta = types.SimpleNamespace(client=_InMemoryDynamoClient(self))
+
+    def put_item(self, Item, **kwargs):
+        self.items[Item["connectionId"]] = dict(Item)
+        return {}
+
+    def delete_item(self, Key, **kwargs):
+        self.items.pop(Key["connectionId"], None)
+        return {}
+
+    def get_item(self, Key, **kwargs):
+        item = self.items.get(Key["connectionId"])
+        return {"Item": dict(item)} if item else {}
+
+    def query(self, IndexName=None, KeyConditionExpression=None, **kwargs):
+        self.query_count += 1
+        key, value = KeyConditionExpression.get_expression()["values"]
+        return {"Items": [dict(i) for i in self.items.values() if i.get(key.name) == value]}
+
+
+class _GoneException(Exception):
+    pass
+
+
+class InMemoryManagementApi:
+    """Stand-in for apigatewaymanagementapi that timestamps every push."""
+
+    exceptions = types.SimpleNamespace(GoneException=_GoneException)
+
+    def __init__(self, table, recorder, post_latency_ms=0):
+        self.table = table
+        self.recorder = recorder
+        self.post_latency_ms = post_latency_ms
+        self.post_count = 0
+        self.bytes_sent = 0
+
+    def post_to_connection(self, ConnectionId, Data):
+        if self.post_latency_ms:
+            time.sleep(self.post_latency_ms / 1000.0)
+        item = self.table.items.get(ConnectionId)
+        if not item:
+            raise _GoneException(ConnectionId)
+        self.post_count += 1
+        self.bytes_sent += len(Data)
+        self.recorder.record_push(item.get("customerId"), json.loads(Data))
+        return {}
+
+
+class LatencyRecorder:
+    def __init__(self):
+        self.emitted = {}
+        self.latencies = []
+
+    def record_emit(self, message):
+        self.emitted[(message["customerId"], message["timestamp"])] = message["emittedAt"]
+
+    def record_push(self, customer_id, message):
+        pushed_at = now_ms()
+        if message.get("type") == "location_batch":
+            from location_codec import decode_batch_frame
+            timestamps = [ts for _, _, ts in decode_batch_frame(message)]
+        else:
+            timestamps = [message.get("timestamp")]
+        for timestamp in timestamps:
+            emitted_at = self.emitted.pop((customer_id, timestamp), None)
+            if emitted_at is not None:
+                self.latencies.append(pushed_at - emitted_at)
+
+    def report(self):
+        return {
+            "pushes_matched": len(self.latencies),
+            "latency_ms_p50": percentile(self.latencies, 50),
+            "latency_ms_p99": percentile(self.latencies, 99),
+            "latency_ms_max": max(self.latencies) if self.latencies else None
+        }
+
+
+def load_stream_handler(table, apigw):
+    """Imports Grubdash_stream_location_updates with its AWS clients swapped for stand-ins."""
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    os.environ.setdefault("WEBSOCKET_ENDPOINT", "https://localhost.invalid")
+    os.environ.setdefault("TABLE_NAME", "loadtest-connections")
+    sys.path.insert(0, STREAM_FUNCTION_DIR)
+    spec = importlib.util.spec_from_file_location(
+        "stream_location_updates", os.path.join(STREAM_FUNCTION_DIR, "lambda_function.py")
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.table = table
+    module.apigw = apigw
+    if hasattr(module, "connections"):
+        module.connections.table = table
+    return module
+
+
+class DirectSink:
+    """Invokes the stream handler in-process, one SQS-shaped event per batch."""
+
+    def __init__(self, customer_ids, recorder, post_latency_ms=0, lambda_batch_size=LAMBDA_BATCH_SIZE,
+                 wire_format="json"):
+        self.table = InMemoryConnectionsTable()
+        for customer_id in customer_ids:
+            item = {"connectionId": f"conn-{customer_id}", "customerId": customer_id}
+            if wire_format != "json":
+                item["format"] = wire_format
+            self.table.put_item(Item=item)
+        self.apigw = InMemoryManagementApi(self.table, recorder, post_latency_ms)
+        self.module = load_stream_handler(self.table, self.apigw)
+        self.lambda_batch_size = lambda_batch_size
+        self.invocations = 0
+        self.handler_ms = []
+
+    def send(self, messages):
+        for start in range(0, len(messages), self.lambda_batch_size):
+            records = [
+                {"messageId": str(uuid.uuid4()), "body": json.dumps(message)}
+                for message in messages[start:start + self.lambda_batch_size]
+            ]
+            started = time.perf_counter()
+            self.module.lambda_handler({"Records": records}, None)
+            self.handler_ms.append((time.perf_counter() - started) * 1000)
+            self.invocations += 1
+
+    def report(self):
+        report = {
+            "invocations": self.invocations,
+            "handler_ms_p50": percentile(self.handler_ms, 50),
+            "handler_ms_p99": percentile(self.handler_ms, 99),
+            "connection_queries": self.table.query_count,
+            "ws_posts": self.apigw.post_count,
+            "ws_bytes": self.apigw.bytes_sent
+        }
+        location_filter = getattr(self.module, "location_filter", None)
+        if location_filter is not None:
+            report["filter"] = location_filter.stats()
+        return report
+
+
+# === Driver scheduling ===
+
+def run(routes, sink, customer_ids, interval_ms=2000, speedup=1.0, recorder=None,
+        point_filter=None, driver_fields=None, rng=None, quiet=True):
+    """Replays every route concurrently, one point per driver every interval_ms
+    of simulated time. Wall-clock time runs speedup times faster.
+
+    driver_fields optionally holds a dict per driver merged into each of its
+    messages (partnerId, deliveryId, orderId, destination...). Messages only
+    carry emittedAt when a recorder is measuring latency, so simulated
+    production traffic keeps the consumer's message shape."""
+    rng = rng or random.Random()
+    driver_fields = driver_fields or [None] * len(routes)
+    sim_epoch = now_ms()
+    wall_start = time.perf_counter()
+
+    # (simulated offset ms, driver index, point index); start times are staggered
+    schedule = [(rng.uniform(0, interval_ms) if len(routes) > 1 else 0.0, d, 0) for d in range(len(routes))]
+    heapq.heapify(schedule)
+
+    emitted = filtered = 0
+    max_lag_ms = 0.0
+    while schedule:
+        due = schedule[0][0]
+        wall_due = wall_start + due / 1000.0 / speedup
+        delay = wall_due - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            max_lag_ms = max(max_lag_ms, -delay * 1000)
+
+        # Everything that is due by now goes out in the same flush
+        sim_now = (time.perf_counter() - wall_start) * 1000 * speedup
+        messages = []
+        while schedule and schedule[0][0] <= sim_now:
+            offset, driver, index = heapq.heappop(schedule)
+            point = routes[driver][index]
+            message = {
+                "customerId": customer_ids[driver],
+                "lat": point["lat"],
+                "lng": point["lng"],
+                "timestamp": sim_epoch + int(offset)
+            }
+            if recorder:
+                message["emittedAt"] = now_ms()
+            if driver_fields[driver]:
+                message.update(driver_fields[driver])
+            if index + 1 < len(routes[driver]):
+                heapq.heappush(schedule, (offset + interval_ms, driver, index + 1))
+
+            if point_filter and not point_filter.should_forward(
+                    message["customerId"], message["lat"], message["lng"], message["timestamp"]):
+                filtered += 1
+                continue
+            if recorder:
+                recorder.record_emit(message)
+            messages.append(message)
+
+        if messages:
+            sink.send(messages)
+            emitted += len(messages)
+            if not quiet:
+                print(f"Flushed {len(messages)} points ({emitted} total)")
+
+    elapsed = time.perf_counter() - wall_start
+    return {
+        "drivers": len(routes),
+        "points_emitted": emitted,
+        "points_filtered": filtered,
+        "wall_seconds": round(elapsed, 3),
+        "points_per_second": round(emitted / elapsed, 1) if elapsed else None,
+        "max_schedule_lag_ms": round(max_lag_ms, 1)
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Location tracking load generator")
+    parser.add_argument("--drivers", type=int, default=1000)
+    parser.add_argument("--points", type=int, default=60, help="points per synthetic route")
+    parser.add_argument("--routes", help="JSON file with recorded routes, reused round-robin")
+    parser.add_argument("--interval-ms", type=int, default=2000, help="simulated time between points")
+    parser.add_argument("--speedup", type=float, default=10.0, help="time compression factor")
+    parser.add_argument("--mode", choices=["direct", "sqs"], default="direct")
+    parser.add_argument("--queue-url", default=os.environ.get("QUEUE_URL"))
+    parser.add_argument("--format", choices=["json", "compact"], default="json",
+                        help="wire format negotiated by the simulated customers (direct mode)")
+    parser.add_argument("--post-latency-ms", type=float, default=0, help="simulated management API latency")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    if args.routes:
+        recorded = load_routes(args.routes)
+        routes = [recorded[i % len(recorded)] for i in range(args.drivers)]
+    else:
+        routes = [synthetic_route(rng, args.points) for _ in range(args.drivers)]
+
+    customer_ids = [f"loadtest-customer-{i:05d}" for i in range(len(routes))]
+    driver_fields = [
+        {"partnerId": f"loadtest-dp-{i:05d}", "destination": route[-1]}
+        for i, route in enumerate(routes)
+    ]
+    # End-to-end latency is only observable when the pushes come back in-process
+    recorder = None
+
+    if args.mode == "sqs":
+        if not args.queue_url:
+            parser.error("--queue-url (or QUEUE_URL) is required in sqs mode")
+        sink = SqsSink(args.queue_url)
+    else:
+        recorder = LatencyRecorder()
+        sink = DirectSink(customer_ids, recorder, args.post_latency_ms, wire_format=args.format)
+
+    report = run(routes, sink, customer_ids, args.interval_ms, args.speedup,
+                 recorder=recorder, driver_fields=driver_fields, rng=rng)
+    report.update(sink.report())
+    if recorder:
+        report.update(recorder.report())
+    print(json.dumps(report, indent=2))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import math
+import os
+from collections import OrderedDict
+
+EARTH_RADIUS_M = 6371000.0
+
+# Tunables (overridable per deployment)
+DEADBAND_METERS = float(os.environ.get("LOCATION_DEADBAND_METERS", "15"))
+MIN_INTERVAL_MS = int(os.environ.get("LOCATION_MIN_INTERVAL_MS", "1000"))
+HEADING_CHANGE_DEG = float(os.environ.get("LOCATION_HEADING_CHANGE_DEG", "30"))
+MAX_SILENCE_MS = int(os.environ.get("LOCATION_MAX_SILENCE_MS", "10000"))
+MAX_TRACKED = int(os.environ.get("LOCATION_FILTER_MAX_TRACKED", "5000"))
+
+# Below this a bearing is mostly GPS noise, so it can't count as a turn
+MIN_HEADING_DISTANCE_M = 3.0
+
+
+def haversine_m(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bearing_deg(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dlmb = math.radians(lng2 - lng1)
+    x = math.sin(dlmb) * math.cos(phi2)
+    y = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(dlmb)
+    return (math.degrees(math.atan2(x, y)) + 360.0) % 360.0
+
+
+def heading_delta(a, b):
+    diff = abs(a - b) % 360.0
+    return 360.0 - diff if diff > 180.0 else diff
+
+
+class LocationFilter:
+    """Per-driver dead-band / rate filter for location points.
+
+    A point is forwarded when at least MIN_INTERVAL_MS has passed since the
+    last forwarded point and the driver either moved DEADBAND_METERS, turned
+    by HEADING_CHANGE_DEG, or has been silent for MAX_SILENCE_MS. State lives
+    in an LRU bounded to MAX_TRACKED keys per warm container.
+    """
+
+    def __init__(self, deadband_m=DEADBAND_METERS, min_interval_ms=MIN_INTERVAL_MS,
+                 heading_change_deg=HEADING_CHANGE_DEG, max_silence_ms=MAX_SILENCE_MS,
+                 max_tracked=MAX_TRACKED):
+        self.deadband_m = deadband_m
+        self.min_interval_ms = min_interval_ms
+        self.heading_change_deg = heading_change_deg
+        self.max_silence_ms = max_silence_ms
+        self.max_tracked = max_tracked
+        self.last_sent = OrderedDict()  # key -> (lat, lng, timestamp, heading)
+        self.forwarded = 0
+        self.dropped = 0
+        self.evicted = 0
+
+    def should_forward(self, key, lat, lng, timestamp):
+        lat, lng = float(lat), float(lng)
+        timestamp = int(timestamp)
+        prev = self.last_sent.get(key)
+
+        if prev is None:
+            self._remember(key, lat, lng, timestamp, None)
+            self.forwarded += 1
+            return True
+
+        prev_lat, prev_lng, prev_ts, prev_heading = prev
+        elapsed = timestamp - prev_ts
+
+        # Out-of-order or duplicate delivery from SQS
+        if elapsed <= 0 or elapsed < self.min_interval_ms:
+            self.last_sent.move_to_end(key)
+            self.dropped += 1
+            return False
+
+        distance = haversine_m(prev_lat, prev_lng, lat, lng)
+        heading = prev_heading
+        turned = False
+        if distance >= MIN_HEADING_DISTANCE_M:
+            heading = bearing_deg(prev_lat, prev_lng, lat, lng)
+            turned = prev_heading is not None and heading_delta(prev_heading, heading) >= self.heading_change_deg
+
+        if distance >= self.deadband_m or turned or elapsed >= self.max_silence_ms:
+            self._remember(key, lat, lng, timestamp, heading)
+            self.forwarded += 1
+            return True
+
+        self.last_sent.move_to_end(key)
+        self.dropped += 1
+        return False
+
+    def forget(self, key):
+        self.last_sent.pop(key, None)
+
+    def stats(self):
+        return {
+            "forwarded": self.forwarded,
+            "dropped": self.dropped,
+            "evicted": self.evicted,
+            "tracked": len(self.last_sent)
+        }
+
+    def _remember(self, key, lat, lng, timestamp, heading):
+        self.last_sent[key] = (lat, lng, timestamp, heading)
+        self.last_sent.move_to_end(key)
+        while len(self.last_sent) > self.max_tracked:
+            self.last_sent.popitem(last=False)
+            self.evicted += 1
@@ -0,0 +1,131 @@
+"""Validation, dedup and packing of interaction events for Personalize.
+
+PutEvents takes up to MAX_EVENTS_PER_PUT events for one userId/sessionId per
+call, so events are grouped by user and session and packed into as few calls
+as that allows.
+
+Repeated clicks are collapsed: an event of a DEDUP_EVENT_TYPES type with the
+same user, session and item as one seen within DEDUP_WINDOW_SECONDS is
+dropped. Any event whose client-supplied eventId was already seen is dropped
+too. Other types are kept, since adding two dishes from the same restaurant
+logs the same itemId twice on purpose. The seen-set lives as long as the
+container, so it catches repeats across requests that land on it.
+"""
+import json
+import os
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+MAX_EVENTS_PER_PUT = 10  # PutEvents eventList limit
+MAX_EVENTS_PER_REQUEST = int(os.environ.get("MAX_EVENTS_PER_REQUEST", "100"))
+DEDUP_WINDOW_SECONDS = float(os.environ.get("DEDUP_WINDOW_SECONDS", "10"))
+DEDUP_EVENT_TYPES = set(os.environ.get("DEDUP_EVENT_TYPES", "CLICK").split(","))
+DEDUP_MAX_ENTRIES = int(os.environ.get("DEDUP_MAX_ENTRIES", "50000"))
+MAX_PROPERTIES_LENGTH = 1024  # Personalize limit on the properties JSON string
+
+
+class InvalidEvent(Exception):
+    pass
+
+
+def normalize(raw, now=None):
+    """Client event -> the flat dict queued and sent; InvalidEvent if it can't be sent."""
+    if not isinstance(raw, dict):
+        raise InvalidEvent("Event must be an object")
+    missing = [f for f in ("userId", "itemId", "eventType") if not raw.get(f)]
+    if missing:
+        raise InvalidEvent(f"Missing fields: {', '.join(missing)}")
+
+    sent_at = raw.get("sentAt")
+    if sent_at is None:
+        sent_at = now if now is not None else time.time()
+    elif isinstance(sent_at, (int, float)):
+        # Browsers send Date.now() in milliseconds
+        sent_at = sent_at / 1000.0 if sent_at > 1e11 else float(sent_at)
+    else:
+        try:
+            sent_at = datetime.fromisoformat(str(sent_at).replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            raise InvalidEvent(f"Invalid sentAt: {sent_at}")
+
+    properties = raw.get("properties")
+    if properties is not None and not isinstance(properties, str):
+        properties = json.dumps(properties)
+    if properties and len(properties) > MAX_PROPERTIES_LENGTH:
+        raise InvalidEvent(f"properties longer than {MAX_PROPERTIES_LENGTH} characters")
+
+    event = {
+        "userId": str(raw["userId"]),
+        "sessionId": str(raw.get("sessionId") or raw["userId"]),
+        "itemId": str(raw["itemId"]),
+        "eventType": str(raw["eventType"]),
+        "eventId": str(raw.get("eventId") or uuid.uuid4()),
+        "clientEventId": bool(raw.get("eventId")),
+        "sentAt": sent_at
+    }
+    if properties:
+        event["properties"] = properties
+    return event
+
+
+class Deduper:
+    def __init__(self, window_seconds=DEDUP_WINDOW_SECONDS, max_entries=DEDUP_MAX_ENTRIES, clock=time.monotonic):
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self.seen = OrderedDict()  # key -> expires_at
+        self.dropped = 0
+
+    def is_duplicate(self, event):
+        """Records the event and says whether an equivalent one was already seen."""
+        now = self.clock()
+        keys = self._keys(event)
+        duplicate = any(self.seen.get(k, 0) > now for k in keys)
+        for key in keys:
+            self.seen[key] = now + self.window_seconds
+            self.seen.move_to_end(key)
+        while len(self.seen) > self.max_entries:
+            self.seen.popitem(last=False)
+        if duplicate:
+            self.dropped += 1
+        return duplicate
+
+    def forget(self, event):
+        """Undoes is_duplicate's record for an event that was never delivered, so a retry isn't dropped."""
+        for key in self._keys(event):
+            self.seen.pop(key, None)
+
+    def _keys(self, event):
+        keys = []
+        if event["eventType"] in DEDUP_EVENT_TYPES:
+            keys.append(("repeat", event["userId"], event["sessionId"], event["itemId"], event["eventType"]))
+        if event.get("clientEventId"):
+            keys.append(("id", event["eventId"]))
+        return keys
+
+
+def pack(events):
+    """[(userId, sessionId, [event])] with at most MAX_EVENTS_PER_PUT events each, oldest first."""
+    groups = OrderedDict()
+    for event in events:
+        groups.setdefault((event["userId"], event["sessionId"]), []).append(event)
+    calls = []
+    for (user_id, session_id), group in groups.items():
+        group.sort(key=lambda e: e["sentAt"])
+        for start in range(0, len(group), MAX_EVENTS_PER_PUT):
+            calls.append((user_id, session_id, group[start:start + MAX_EVENTS_PER_PUT]))
+    return calls
+
+
+def to_personalize(event):
+    entry = {
+        "eventId": event["eventId"],
+        "eventType": event["eventType"],
+        "itemId": event["itemId"],
+        "sentAt": datetime.fromtimestamp(event["sentAt"], timezone.utc)
+    }
+    if event.get("properties"):
+        entry["properties"] = event["properties"]
+    return entry
@@ -1,49 +1,216 @@
 import boto3
 import json
 import os
-from datetime import datetime
+import time
+from interaction_batch import (
+    MAX_EVENTS_PER_REQUEST, Deduper, InvalidEvent, normalize, pack, to_personalize
+)
 
 personalize_events = boto3.client('personalize-events', region_name=os.environ['REGION'])
+sqs = boto3.client('sqs')
+
+# With a queue, POST /interactions only enqueues; this function's SQS trigger does the PutEvents
+INTERACTIONS_QUEUE_URL = os.environ.get('INTERACTIONS_QUEUE_URL')
+EVENTS_PER_MESSAGE = int(os.environ.get('EVENTS_PER_MESSAGE', '100'))
+SQS_BATCH_SIZE = 10  # SendMessageBatch entry limit
+# Events whose PutEvents failed are queued again on their own, up to this many times,
+# before their message is left to the queue's redrive policy
+MAX_REQUEUE_ATTEMPTS = int(os.environ.get('MAX_REQUEUE_ATTEMPTS', '3'))
+REQUEUE_DELAY_SECONDS = int(os.environ.get('REQUEUE_DELAY_SECONDS', '30'))
+
+# Repeats across requests that land on this container
+recent = Deduper()
+
+def respond(status_code, body):
+    return {
+        "statusCode": status_code,
+        "headers": {
+            "Access-Control-Allow-Origin": "*",
+            "Content-Type": "application/json"
+        },
+        "body": json.dumps(body)
+    }
+
+def put_events(events):
+    """Sends events packed per user/session; returns {eventId: error} for the calls that failed."""
+    failed = {}
+    for user_id, session_id, chunk in pack(events):
+        try:
+            personalize_events.put_events(
+                trackingId=os.environ['TRACKING_ID'],
+                userId=user_id,
+                sessionId=session_id,
+                eventList=[to_personalize(e) for e in chunk]
+            )
+        except Exception as e:
+            print(f"PutEvents failed for {user_id}/{session_id} ({len(chunk)} events): {e}")
+            for event in chunk:
+                failed[event["eventId"]] = e
+    return failed
+
+def enqueue(events, attempt=0):
+    """Queues events EVENTS_PER_MESSAGE to a message; returns {eventId: error} for the ones not queued.
+
+    attempt > 0 marks a requeue of events whose PutEvents failed; it rides along as
+    a message attribute and delays delivery.
+    """
+    messages = [events[i:i + EVENTS_PER_MESSAGE] for i in range(0, len(events), EVENTS_PER_MESSAGE)]
+    extra = {}
+    if attempt:
+        extra = {
+            "DelaySeconds": REQUEUE_DELAY_SECONDS,
+            "MessageAttributes": {"attempt": {"DataType": "Number", "StringValue": str(attempt)}}
+        }
+    failed = {}
+    for start in range(0, len(messages), SQS_BATCH_SIZE):
+        batch = messages[start:start + SQS_BATCH_SIZE]
+        try:
+            response = sqs.send_message_batch(
+                QueueUrl=INTERACTIONS_QUEUE_URL,
+                Entries=[{"Id": str(i), "MessageBody": json.dumps(m), **extra} for i, m in enumerate(batch)]
+            )
+            rejected = {int(f["Id"]): f.get("Message", f.get("Code")) for f in response.get("Failed", [])}
+        except Exception as e:
+            rejected = {i: str(e) for i in range(len(batch))}
+        for i, reason in rejected.items():
+            for event in batch[i]:
+                failed[event["eventId"]] = reason
+    return failed
+
+def ingest(raw_events):
+    """Per-event results for POST /interactions, in request order."""
+    now = time.time()
+    results = []
+    valid = []
+    for index, raw in enumerate(raw_events):
+        try:
+            event = normalize(raw, now)
+        except InvalidEvent as e:
+            results.append({"index": index, "status": "invalid", "error": str(e)})
+            continue
+        if recent.is_duplicate(event):
+            results.append({"index": index, "status": "duplicate"})
+            continue
+        results.append({"index": index, "status": None, "eventId": event["eventId"]})
+        valid.append(event)
+
+    failed = enqueue(valid) if INTERACTIONS_QUEUE_URL else put_events(valid)
+    done = "queued" if INTERACTIONS_QUEUE_URL else "accepted"
+    for event in valid:
+        if event["eventId"] in failed:
+            recent.forget(event)  # the client's retry must go through
+    for result in results:
+        if result["status"] is None:
+            error = failed.get(result["eventId"])
+            result["status"] = "failed" if error else done
+            if error:
+                result["error"] = str(error)
+    return results
+
+def consume(records):
+    """SQS trigger: sends every queued event in the batch and reports the messages to retry.
+
+    A message holds events for many users, so retrying it whole would resend the ones
+    that went through. Instead only the events that failed are queued again and the
+    message is acked; it is reported for retry only when that requeue fails or its
+    events have been requeued MAX_REQUEUE_ATTEMPTS times.
+    """
+    events = []
+    origin = {}  # eventId -> messageId
+    attempts = {}  # messageId -> requeue attempt the message came from
+    batch_dedup = Deduper()
+    poison = 0
+    for record in records:
+        # A message that can't be read would fail the same way on every redelivery, and
+        # failing the batch would resend every good event with it; log it and move on
+        try:
+            queued = json.loads(record["body"])
+            if not isinstance(queued, list):
+                raise ValueError("body is not a list of events")
+        except (KeyError, TypeError, ValueError) as e:
+            print(f"Dropping unreadable message {record.get('messageId')}: {e}")
+            poison += 1
+            continue
+        attempt = (record.get("messageAttributes") or {}).get("attempt", {}).get("stringValue")
+        attempts[record["messageId"]] = int(attempt or 0)
+        for raw in queued:
+            try:
+                # Queued events are already normalized; this re-checks them
+                event = normalize(raw)
+            except InvalidEvent as e:
+                print(f"Dropping invalid event in message {record.get('messageId')}: {e}")
+                poison += 1
+                continue
+            event["clientEventId"] = bool(raw.get("clientEventId"))
+            # Only within the batch: a redelivered message must not be deduped against its first attempt
+            if batch_dedup.is_duplicate(event):
+                continue
+            origin[event["eventId"]] = record["messageId"]
+            events.append(event)
+
+    failed = put_events(events)
+    retryable = [e for e in events if e["eventId"] in failed and _retryable(failed[e["eventId"]])]
+    dropped = len(failed) - len(retryable)
+
+    retry = set()
+    requeue = {}  # next attempt -> events
+    for event in retryable:
+        message_id = origin[event["eventId"]]
+        if attempts[message_id] >= MAX_REQUEUE_ATTEMPTS:
+            retry.add(message_id)
+        else:
+            requeue.setdefault(attempts[message_id] + 1, []).append(event)
+    requeued = 0
+    for attempt, group in requeue.items():
+        not_queued = enqueue(group, attempt)
+        retry.update(origin[event_id] for event_id in not_queued)
+        requeued += len(group) - len(not_queued)
+
+    print(f"Sent {len(events) - len(failed)} of {len(events)} events from {len(records)} message(s); "
+          f"{batch_dedup.dropped} duplicate(s), {dropped} rejected, {poison} malformed, "
+          f"{requeued} requeued, {len(retry)} message(s) to retry")
+    return {"batchItemFailures": [{"itemIdentifier": message_id} for message_id in sorted(retry)]}
+
+def _retryable(error):
+    # Malformed events would fail the same way again
+    code = getattr(error, "response", {}).get("Error", {}).get("Code", "")
+    return code not in ("InvalidInputException", "ValidationException")
 
 def lambda_handler(event, context):
+    records = event.get("Records") or []
+    if records and records[0].get("eventSource") == "aws:sqs":
+        return consume(records)
+
     try:
-        body = json.loads(event['body'])
-        user_id = body.get("userId")
-        item_id = body.get("itemId")
-        event_type = body.get("eventType")
-        session_id = user_id
-
-        if not user_id or not item_id or not event_type:
-            return { "statusCode": 400, "body": json.dumps({ "error": "Missing fields" }) }
-
-        personalize_events.put_events(
-            trackingId=os.environ['TRACKING_ID'],
-            userId=user_id,
-            sessionId=session_id,
-            eventList=[{
-                'eventType': event_type,
-                'itemId': item_id,
-                'sentAt': datetime.utcnow()
-            }]
-        )
-        print("Event sent to Personalize successfully")
-        print("EVENT PAYLOAD:", {
-            "userId": user_id,
-            "itemId": item_id,
-            "eventType": event_type
-        })
-
-        return {
-            "statusCode": 200,
-            "headers": {
-                "Access-Control-Allow-Origin": "*",
-                "Content-Type": "application/json"
-            },
-            "body": json.dumps({ "message": "Event sent" })
-        }
+        body = json.loads(event.get('body') or 'null')
+    except json.JSONDecodeError:
+        return respond(400, {"error": "Invalid JSON body"})
 
-    except Exception as e:
-        return {
-            "statusCode": 500,
-            "body": json.dumps({ "error": str(e) })
-        }
+    # A single event (the original shape), a list of events, or {"events": [...]}
+    single = isinstance(body, dict) and "events" not in body
+    raw_events = [body] if single else (body.get("events") if isinstance(body, dict) else body)
+    if not isinstance(raw_events, list) or not raw_events:
+        return respond(400, {"error": "Missing events"})
+    if len(raw_events) > MAX_EVENTS_PER_REQUEST:
+        return respond(400, {"error": f"At most {MAX_EVENTS_PER_REQUEST} events per request"})
+
+    results = ingest(raw_events)
+    statuses = {r["status"] for r in results}
+    print("EVENT RESULTS:", {s: sum(1 for r in results if r["status"] == s) for s in statuses})
+
+    if single:
+        result = results[0]
+        if result["status"] == "invalid":
+            return respond(400, {"error": result["error"]})
+        if result["status"] == "failed":
+            return respond(500, {"error": result["error"]})
+        return respond(200, {"message": "Event sent", "status": result["status"]})
+
+    if statuses == {"invalid"}:
+        return respond(400, {"error": "No valid events", "results": results})
+    if statuses == {"failed"}:
+        return respond(502, {"error": "No events could be sent", "results": results})
+    return respond(200, {
+        "accepted": sum(1 for r in results if r["status"] in ("accepted", "queued")),
+        "results": results
+    })